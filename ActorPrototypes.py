@@ -0,0 +1,50 @@
+from direct.actor.Actor import Actor
+
+from AssetCache import assetCache
+
+
+# Loading a character's model and its animations from disk is slow,
+# and doing it every time that an enemy spawns causes frame-hitches.
+# So instead we load each character just once, as a "prototype",
+# and give each new GameObject a copy of that prototype.
+#
+# A copied Actor gets its own joints (so that it can animate
+# independently of the others), but shares the prototype's
+# already-loaded geometry and animation-bundles.
+class ActorPrototypes:
+    def __init__(self):
+        # Our prototypes, keyed by the name of their model
+        self.prototypes = {}
+
+        # If this is False, every Actor is loaded from scratch,
+        # just as if we had no prototypes. (This is mostly
+        # useful for measuring what the prototypes save us.)
+        self.enabled = True
+
+    def makeActor(self, modelName, modelAnims):
+        # Load the compiled versions of the model and
+        # its animations, if we have them; see "AssetCache.py".
+        modelAnims = assetCache.getAnimNames(modelAnims)
+        if not self.enabled:
+            return Actor(assetCache.getModelName(modelName), modelAnims)
+
+        prototype = self.prototypes.get(modelName)
+        if prototype is None:
+            prototype = Actor(assetCache.getModelName(modelName), modelAnims)
+            # Actors usually load their animations only when
+            # they're first played; we want them loaded right now,
+            # so that no copy ever has to load them.
+            prototype.bindAllAnims()
+            self.prototypes[modelName] = prototype
+
+        return Actor(other=prototype)
+
+    def cleanup(self):
+        for prototype in self.prototypes.values():
+            prototype.cleanup()
+            prototype.removeNode()
+        self.prototypes = {}
+
+
+# The one set of prototypes used by all of our GameObjects
+actorPrototypes = ActorPrototypes()
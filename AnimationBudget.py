@@ -0,0 +1,95 @@
+import numpy as np
+
+
+# With a big horde, animating every enemy on every frame costs a lot--
+# and most of them are too far from the action for anyone to notice
+# whether they're animating smoothly. So we set a budget: only the
+# "fullRateCount" enemies nearest to the player animate on every frame.
+# The rest are posed only every "reducedRateInterval" frames (which
+# looks a little choppier, but plays at the same speed, and ends at
+# the same time). Traps that are standing still don't animate at all
+# until they start sliding.
+#
+# Dying enemies are included among the enemies; they still play
+# their "die" animation, but only the nearest do so smoothly.
+#
+# Setting "enabled" to False animates everything at full rate again.
+class AnimationBudget:
+    def __init__(self, fullRateCount=20, reducedRateInterval=4):
+        self.fullRateCount = fullRateCount
+        self.reducedRateInterval = reducedRateInterval
+        self.enabled = True
+
+        self.frameNumber = 0
+        self.nextStepPhase = 0
+
+        # How many actors were animated at full rate, at a reduced rate,
+        # and not at all on the last frame, and how many of those
+        # at a reduced rate were actually posed on that frame
+        self.numFullRate = 0
+        self.numReducedRate = 0
+        self.numFrozen = 0
+        self.numPosed = 0
+
+    # "enemies" and "deadEnemies" are collections of living and dying
+    # enemies, and "positions" an array whose rows hold their positions
+    # (at least x and y): first those of "enemies", then
+    # those of "deadEnemies", in the same order.
+    def update(self, playerPos, enemies, deadEnemies, positions, traps):
+        self.frameNumber += 1
+
+        numEnemies = len(enemies) + len(deadEnemies)
+        if not self.enabled or self.reducedRateInterval <= 1:
+            fullRate = [True] * numEnemies
+        elif numEnemies <= self.fullRateCount:
+            fullRate = [True] * numEnemies
+        else:
+            # Find the nearest enemies, without sorting the lot
+            offsets = positions[:, :2] - (playerPos.x, playerPos.y)
+            distancesSquared = np.einsum("ij,ij->i", offsets, offsets)
+            fullRate = np.zeros(numEnemies, dtype=bool)
+            if self.fullRateCount > 0:
+                nearest = np.argpartition(distancesSquared, self.fullRateCount - 1)[:self.fullRateCount]
+                fullRate[nearest] = True
+            fullRate = fullRate.tolist()
+
+        numFullRate = 0
+        numReducedRate = 0
+        numFrozen = 0
+        numPosed = 0
+        frameNumber = self.frameNumber
+        reducedRateInterval = self.reducedRateInterval
+
+        index = 0
+        for group in (enemies, deadEnemies):
+            for enemy in group:
+                animation = enemy.animation
+                if fullRate[index]:
+                    if animation.stepInterval != 1:
+                        animation.setStepInterval(1)
+                    numFullRate += 1
+                else:
+                    if animation.stepInterval != reducedRateInterval:
+                        animation.stepPhase = self.nextStepPhase
+                        self.nextStepPhase += 1
+                        animation.setStepInterval(reducedRateInterval)
+                    if animation.stepPose(frameNumber):
+                        numPosed += 1
+                    numReducedRate += 1
+                index += 1
+
+        for trap in traps:
+            animation = trap.animation
+            if trap.moveDirection != 0 or not self.enabled:
+                if animation.stepInterval != 1:
+                    animation.setStepInterval(1)
+                numFullRate += 1
+            else:
+                if animation.stepInterval != 0:
+                    animation.setStepInterval(0)
+                numFrozen += 1
+
+        self.numFullRate = numFullRate
+        self.numReducedRate = numReducedRate
+        self.numFrozen = numFrozen
+        self.numPosed = numPosed
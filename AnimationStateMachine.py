@@ -0,0 +1,137 @@
+from direct.showbase.ShowBaseGlobal import globalClock
+
+
+# Keeps track of which animation an Actor is playing, so that
+# we needn't keep asking the Actor.
+#
+# Asking an Actor "is this animation playing?" means looking up the
+# animation's control, and then asking that control--for every
+# animation we care about, for every character, on every frame.
+# Instead, we look up each control just once, and remember which
+# animation we last started. We only touch the Actor when we
+# actually change animation.
+#
+# For animations that play once and then stop (such as "spawn" or
+# "attack"), we know up front how many frames they have, and so when
+# they'll finish; the question "is it still playing?" is then just a
+# comparison against the clock. (We count in frames, just as Panda
+# does, so that we agree with Panda on exactly when an animation ends.)
+#
+# Since we know when each animation started, we also know which frame
+# it should be showing at any time. That lets us run an animation at
+# less than full rate: rather than letting Panda play it, we pose it
+# at the right frame only every few frames (or never, to freeze it).
+# Which actors are run this way is decided by "AnimationBudget.py".
+class AnimationStateMachine:
+    def __init__(self, actor):
+        self.actor = actor
+
+        # The control for each animation, how many frames it has,
+        # and how many of those it plays per second
+        self.controls = {}
+        self.numFrames = {}
+        self.frameRates = {}
+        for name in actor.getAnimNames():
+            control = actor.getAnimControl(name)
+            self.controls[name] = control
+            self.numFrames[name] = control.getNumFrames()
+            self.frameRates[name] = control.getFrameRate()
+
+        # The animation that we most recently started, if any,
+        # and the frame-time at which we started it...
+        self.state = None
+        self.stateStartTime = 0
+        # ... and, if it only plays once, that frame-time again
+        self.oneShotStartTime = None
+
+        # How often our pose is brought up to date: every frame (1),
+        # every "stepInterval" frames (more than 1), or never (0).
+        # "stepPhase" staggers which frames those are, so that not
+        # every slowed actor is posed on the same frame.
+        self.stepInterval = 1
+        self.stepPhase = 0
+
+    # Loops the given animation, unless it's already looping
+    def loop(self, name):
+        if self.state == name and self.oneShotStartTime is None:
+            return
+        self.stop()
+        if self.stepInterval == 1:
+            self.controls[name].loop(True)
+        else:
+            self.controls[name].pose(0)
+        self.state = name
+        self.stateStartTime = globalClock.getFrameTime()
+
+    # Plays the given animation once, from the start
+    def play(self, name):
+        self.stop()
+        if self.stepInterval == 1:
+            self.controls[name].play()
+        else:
+            self.controls[name].pose(0)
+        self.state = name
+        self.stateStartTime = globalClock.getFrameTime()
+        self.oneShotStartTime = self.stateStartTime
+
+    # Loops the given animation--but only once any
+    # animation that plays once has finished
+    def loopWhenFree(self, name):
+        if self.oneShotStartTime is not None:
+            if self.isOneShotPlaying():
+                return
+            self.oneShotStartTime = None
+        if self.state != name:
+            self.loop(name)
+
+    def isPlaying(self, name):
+        if self.state != name:
+            return False
+        return self.oneShotStartTime is None or self.isOneShotPlaying()
+
+    def isOneShotPlaying(self):
+        framesPlayed = (globalClock.getFrameTime() - self.oneShotStartTime) * self.frameRates[self.state]
+        return framesPlayed < self.numFrames[self.state]
+
+    # How long the given animation takes to play once through, in seconds
+    def getDuration(self, name):
+        return self.numFrames[name] / self.frameRates[name]
+
+    # The frame that our current animation should be showing right now
+    def getCurrentFrame(self):
+        frame = (globalClock.getFrameTime() - self.stateStartTime) * self.frameRates[self.state]
+        numFrames = self.numFrames[self.state]
+        if self.oneShotStartTime is None:
+            return frame % numFrames
+        return min(frame, numFrames - 1)
+
+    def setStepInterval(self, stepInterval):
+        if self.state is not None:
+            control = self.controls[self.state]
+            if stepInterval == 1:
+                # Have Panda carry on playing from wherever we should be
+                frame = self.getCurrentFrame()
+                control.pose(frame)
+                if self.oneShotStartTime is None:
+                    control.loop(False)
+                elif self.isOneShotPlaying():
+                    control.play(frame, self.numFrames[self.state] - 1)
+            elif self.stepInterval == 1:
+                control.stop()
+                control.pose(self.getCurrentFrame())
+        self.stepInterval = stepInterval
+
+    # Called on every frame for actors with a "stepInterval" of more than one;
+    # poses the actor if this is one of its frames to be updated.
+    # Returns whether it did so.
+    def stepPose(self, frameNumber):
+        if self.state is None or (frameNumber + self.stepPhase) % self.stepInterval != 0:
+            return False
+        self.controls[self.state].pose(self.getCurrentFrame())
+        return True
+
+    def stop(self):
+        if self.state is not None:
+            self.controls[self.state].stop()
+        self.state = None
+        self.oneShotStartTime = None
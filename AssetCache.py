@@ -0,0 +1,113 @@
+import json
+import os
+
+from panda3d.core import Filename
+
+
+# The folder (within the game's folder) that "buildAssets.py"
+# writes our compiled models and textures to, and the manifest
+# that it writes there
+CACHE_DIR_NAME = "assetCache"
+MANIFEST_NAME = "manifest.json"
+# Changed whenever the manifest's layout changes, so that
+# an old manifest is simply ignored (and rebuilt)
+MANIFEST_VERSION = 1
+
+
+# The size and modification-time of a file, by which we tell
+# (cheaply) whether it's changed since it was compiled
+def getFileStamp(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+# Parsing our ".egg" models (and decoding their PNG textures) is slow,
+# so "buildAssets.py" compiles them ahead of time into ".bam" models
+# and ".txo" textures. This looks up the compiled version of a model
+# by the name that the game loads it by (such as
+# "models/SimpleEnemy/simpleEnemy"), so that we load that instead.
+#
+# A compiled model is only used while the files that it was built
+# from are unchanged; otherwise (or if there's no compiled version
+# at all) we just load the source-model, as before.
+class AssetCache:
+    def __init__(self):
+        # If this is False, every model is loaded from its source,
+        # just as if we had no cache. (This is mostly useful for
+        # measuring what the cache saves us.)
+        self.enabled = True
+
+        self.gameDir = None
+        self.cacheDir = None
+        # The manifest's entries, keyed by model-name
+        self.assets = {}
+
+        # The names to load models by, once we've looked them up
+        self.resolvedNames = {}
+
+        # How many models were found compiled, and how many
+        # had a compiled version that was out of date
+        self.numCompiled = 0
+        self.numStale = 0
+
+    # Reads the manifest of the cache in the given
+    # game-folder, if there is one
+    def load(self, gameDir):
+        self.gameDir = gameDir
+        self.cacheDir = os.path.join(gameDir, CACHE_DIR_NAME)
+        self.assets = {}
+        self.resolvedNames = {}
+
+        path = os.path.join(self.cacheDir, MANIFEST_NAME)
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            print("Couldn't read the asset-cache manifest; loading source-models instead")
+            return
+        if manifest.get("version") == MANIFEST_VERSION:
+            self.assets = manifest["assets"]
+
+    # Whether the files that the given entry was built from
+    # are still as they were when it was built
+    def isFresh(self, entry):
+        for path, stamp in entry["stamps"].items():
+            try:
+                if getFileStamp(os.path.join(self.gameDir, path)) != stamp:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    # Returns the name by which to load the given model:
+    # its compiled version, if that's there and up to date,
+    # or the name as given, otherwise
+    def getModelName(self, modelName):
+        if not self.enabled:
+            return modelName
+
+        resolvedName = self.resolvedNames.get(modelName)
+        if resolvedName is None:
+            resolvedName = modelName
+            entry = self.assets.get(modelName)
+            if entry is not None:
+                outputPath = os.path.join(self.cacheDir, entry["output"].replace("/", os.sep))
+                if self.isFresh(entry) and os.path.exists(outputPath):
+                    resolvedName = Filename.fromOsSpecific(outputPath).getFullpath()
+                    self.numCompiled += 1
+                else:
+                    self.numStale += 1
+            self.resolvedNames[modelName] = resolvedName
+
+        return resolvedName
+
+    # As above, for a dictionary of animation-names
+    # and animation-models, as given to an Actor
+    def getAnimNames(self, modelAnims):
+        return {animName: self.getModelName(modelName) for animName, modelName in modelAnims.items()}
+
+
+# The one cache used by the whole game
+assetCache = AssetCache()
@@ -0,0 +1,98 @@
+import time
+
+
+# Deals with the collisions found for our traps.
+#
+# Panda's usual way of reporting collisions is to send an event, with
+# a name made from the names of the colliders involved ("trapEnemy-
+# into-wall", say), through the messenger to whoever has "accept"ed it.
+# That means building a string and going through the messenger for
+# every contact, and then asking the colliders for their owners.
+#
+# Instead, our traps' contacts are found without the traverser (see
+# "TrapLanes.py") and handed to "addContact", which passes each one
+# straight to a handler, looked up in a table by the names of the two
+# colliders, along with the objects involved.
+#
+# As with the events that Panda would send, a handler is only called
+# when a contact begins, not on every frame that it lasts; "dispatch"
+# is called once per frame, after all of that frame's contacts have
+# been added, to move on to the next frame.
+class CollisionDispatch:
+    def __init__(self):
+        # Keyed by (from-name, into-name); each handler is
+        # called with the owners of the two colliders.
+        self.handlers = {}
+
+        # The pairs of (from-owner, into-key) that were in
+        # contact on the last frame, and on this one
+        self.previousContacts = set()
+        self.currentContacts = set()
+
+        # For the last frame: how many contacts there were, how
+        # many of those were new (and so were handled), and how
+        # long it all took, in seconds
+        self.numContacts = 0
+        self.numNewContacts = 0
+        self.dispatchTime = 0
+
+        # The same, for the contacts added so far this frame
+        self.numFrameContacts = 0
+        self.numFrameNewContacts = 0
+        self.frameTime = 0
+
+    def addHandler(self, fromName, intoName, handler):
+        self.handlers[(fromName, intoName)] = handler
+
+    # Called once all of a frame's contacts have been added: this
+    # frame's contacts become last frame's contacts.
+    def dispatch(self):
+        startTime = time.perf_counter()
+
+        previousContacts = self.previousContacts
+        previousContacts.clear()
+        self.previousContacts = self.currentContacts
+        self.currentContacts = previousContacts
+
+        self.numContacts = self.numFrameContacts
+        self.numNewContacts = self.numFrameNewContacts
+        self.dispatchTime = time.perf_counter() - startTime + self.frameTime
+        self.numFrameContacts = 0
+        self.numFrameNewContacts = 0
+        self.frameTime = 0
+
+    # Hands over a contact, to be handled as soon as it's found. The
+    # contact is known by the owner of the "from" side and "intoKey"--
+    # anything that identifies what was hit--so that only new
+    # contacts are handled.
+    # This must be called before "dispatch" in the frame in question.
+    def addContact(self, fromName, intoName, fromOwner, intoOwner, intoKey):
+        startTime = time.perf_counter()
+
+        self.numFrameContacts += 1
+        contact = (fromOwner, intoKey)
+        if contact not in self.currentContacts:
+            self.currentContacts.add(contact)
+            if contact not in self.previousContacts:
+                handler = self.handlers.get((fromName, intoName))
+                if handler is not None:
+                    self.numFrameNewContacts += 1
+                    handler(fromOwner, intoOwner)
+
+        self.frameTime += time.perf_counter() - startTime
+
+    # Forgets the ongoing contacts of the given owner (on the "from"
+    # side), so that any that it's still in are handled once more,
+    # as if they'd only just begun.
+    # This must be called before "addContact" in the frame in question.
+    def forgetContacts(self, fromOwner):
+        self.previousContacts = {contact for contact in self.previousContacts
+                                 if contact[0] is not fromOwner}
+
+    # Forgets any ongoing contacts
+    def clear(self):
+        self.previousContacts.clear()
+        self.currentContacts.clear()
+        self.numFrameContacts = 0
+        self.numFrameNewContacts = 0
+        self.frameTime = 0
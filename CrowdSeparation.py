@@ -0,0 +1,124 @@
+import math
+
+import numpy as np
+
+
+# Cells are keyed by a single integer made from their coordinates;
+# these are large enough that no two cells in (or anywhere near)
+# the room share a key.
+CELL_OFFSET = 1 << 20
+CELL_STRIDE = 1 << 22
+
+# An angle that spreads out the directions in which enemies
+# standing in exactly the same place are pushed apart
+GOLDEN_ANGLE = math.pi * (3.0 - math.sqrt(5.0))
+
+# The (dx, dy) offsets of a cell and its eight neighbours
+NEIGHBOUR_CELLS = [(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)]
+
+
+# Keeps our walking enemies from piling up on top of one another.
+#
+# The walking enemies aren't given to the pusher, since having every
+# enemy test every other inside the collision-traverser would cost
+# O(n*n). Instead, once per frame, we push apart any two enemies
+# whose collision-spheres overlap, a little like the "separation"
+# rule of "boids".
+#
+# To find the pairs that overlap without testing every pair, we hash
+# the enemies into a grid of cells as wide as the spheres are across.
+# Two overlapping enemies must then be in the same cell or in
+# neighbouring ones, so each enemy need only be tested against the
+# enemies in its own cell and the eight around it. The whole pass
+# works on arrays of positions, as "HordeKinematics" does.
+class CrowdSeparation:
+    def __init__(self, radius, strength=0.5, roomLimit=None):
+        # The radius of each enemy's collision-sphere
+        self.radius = radius
+        self.cellSize = radius * 2.0
+
+        # How much of the overlap between two enemies to
+        # undo on each frame; less than all of it, so that
+        # a crowd eases apart rather than jittering
+        self.strength = strength
+
+        # If given, enemies aren't pushed further than this
+        # from the middle of the room, in x or y
+        self.roomLimit = roomLimit
+
+        # For the last call to "apply": how many pairs of enemies
+        # were tested, and how many of those overlapped
+        self.numPairsTested = 0
+        self.numOverlaps = 0
+
+    # Pushes apart the overlapping enemies among those at
+    # the given positions (an array of (x, y, z)), in place
+    def apply(self, positions):
+        numEnemies = len(positions)
+        self.numPairsTested = 0
+        self.numOverlaps = 0
+        if numEnemies < 2:
+            return
+
+        points = positions[:, :2]
+
+        # Hash each enemy into its cell, and sort the
+        # enemies by cell
+        cells = np.floor(points / self.cellSize).astype(np.int64) + CELL_OFFSET
+        keys = cells[:, 0]*CELL_STRIDE + cells[:, 1]
+        order = np.argsort(keys, kind="stable")
+        sortedKeys = keys[order]
+
+        # For each enemy and each of the nine cells around it, find
+        # the run of (sorted) enemies in that cell...
+        neighbourKeys = np.concatenate([keys + (dx*CELL_STRIDE + dy) for dx, dy in NEIGHBOUR_CELLS])
+        starts = np.searchsorted(sortedKeys, neighbourKeys, side="left")
+        counts = np.searchsorted(sortedKeys, neighbourKeys, side="right") - starts
+
+        # ... and from those, every pair (i, j) of enemies in
+        # neighbouring cells
+        numPairs = int(counts.sum())
+        firsts = np.repeat(np.tile(np.arange(numEnemies), len(NEIGHBOUR_CELLS)), counts)
+        runStarts = np.cumsum(counts) - counts
+        seconds = order[np.repeat(starts - runStarts, counts) + np.arange(numPairs)]
+
+        notSelf = firsts != seconds
+        firsts = firsts[notSelf]
+        seconds = seconds[notSelf]
+        self.numPairsTested = len(firsts)
+
+        offsets = points[firsts] - points[seconds]
+        distancesSquared = np.einsum("ij,ij->i", offsets, offsets)
+        touchDistance = self.radius * 2.0
+        overlapping = distancesSquared < touchDistance*touchDistance
+
+        firsts = firsts[overlapping]
+        seconds = seconds[overlapping]
+        offsets = offsets[overlapping]
+        distances = np.sqrt(distancesSquared[overlapping])
+        self.numOverlaps = len(firsts) // 2
+
+        if len(firsts) == 0:
+            return
+
+        # The direction from the second enemy of each pair to the
+        # first; two enemies in exactly the same place are sent
+        # opposite ways, in a direction chosen by the lower index.
+        directions = np.empty_like(offsets)
+        together = distances < 0.000001
+        apart = ~together
+        directions[apart] = offsets[apart] / distances[apart, None]
+        if together.any():
+            angles = np.minimum(firsts[together], seconds[together]) * GOLDEN_ANGLE
+            signs = np.where(firsts[together] < seconds[together], 1.0, -1.0)
+            directions[together, 0] = np.cos(angles)*signs
+            directions[together, 1] = np.sin(angles)*signs
+
+        # Each pair appears twice--once for each enemy--so each
+        # enemy moves by its share of the overlap
+        pushes = (touchDistance - distances) * (self.strength * 0.5)
+        positions[:, 0] += np.bincount(firsts, weights=directions[:, 0]*pushes, minlength=numEnemies)
+        positions[:, 1] += np.bincount(firsts, weights=directions[:, 1]*pushes, minlength=numEnemies)
+
+        if self.roomLimit is not None:
+            np.clip(positions[:, :2], -self.roomLimit, self.roomLimit, out=positions[:, :2])
@@ -0,0 +1,44 @@
+# Building a new enemy--and destroying it again when it dies--means
+# creating and deleting a whole set of scene-graph nodes for
+# every enemy that we spawn. So instead, once an enemy has finished
+# dying, we keep it around in this pool, and when next we want a new
+# enemy we simply reset one of the pooled ones.
+class EnemyPool:
+    def __init__(self, enemyClass, capacity):
+        self.enemyClass = enemyClass
+
+        # The most enemies that we'll keep around at once;
+        # any more than this are just cleaned up as before.
+        self.capacity = capacity
+
+        self.freeEnemies = []
+
+        # How many spawns were served from the pool ("hits"),
+        # and how many had to build a new enemy ("misses")
+        self.hits = 0
+        self.misses = 0
+
+    # Any further arguments are passed on to the enemy's
+    # "reset" or constructor, as the case may be
+    def acquire(self, pos, *args):
+        if len(self.freeEnemies) > 0:
+            enemy = self.freeEnemies.pop()
+            enemy.reset(pos, *args)
+            self.hits += 1
+        else:
+            enemy = self.enemyClass(pos, *args)
+            self.misses += 1
+
+        return enemy
+
+    def release(self, enemy):
+        if len(self.freeEnemies) < self.capacity:
+            enemy.deactivate()
+            self.freeEnemies.append(enemy)
+        else:
+            enemy.cleanup()
+
+    def cleanup(self):
+        for enemy in self.freeEnemies:
+            enemy.cleanup()
+        self.freeEnemies = []
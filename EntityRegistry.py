@@ -0,0 +1,36 @@
+# A collection of game-objects (such as our living enemies) that can
+# be added to and removed from cheaply, and looped over without
+# building any new lists.
+#
+# Each object remembers where it is in our list (its "registryIndex"),
+# so removing it means just moving the last object into its place--
+# rather than searching the list, or rebuilding it. (This does mean
+# that the order of the objects changes as they're removed.)
+#
+# An object may only be in one registry at a time.
+class EntityRegistry:
+    def __init__(self):
+        self.entities = []
+
+    def __len__(self):
+        return len(self.entities)
+
+    def __iter__(self):
+        return iter(self.entities)
+
+    def add(self, entity):
+        entity.registryIndex = len(self.entities)
+        self.entities.append(entity)
+
+    def remove(self, entity):
+        index = entity.registryIndex
+        lastEntity = self.entities.pop()
+        if lastEntity is not entity:
+            self.entities[index] = lastEntity
+            lastEntity.registryIndex = index
+        entity.registryIndex = None
+
+    def clear(self):
+        for entity in self.entities:
+            entity.registryIndex = None
+        self.entities.clear()
@@ -0,0 +1,433 @@
+import heapq
+import math
+import time
+
+import numpy as np
+
+
+# Costs of a step to a neighbouring cell: straight, and diagonal
+STRAIGHT_COST = 1.0
+DIAGONAL_COST = math.sqrt(2.0)
+
+# Two distances closer than this count as equal
+DISTANCE_TOLERANCE = 0.000001
+
+INFINITY = float("inf")
+
+# The eight neighbours of a cell, as (dx, dy, cost)
+NEIGHBOUR_OFFSETS = [
+    (1, 0, STRAIGHT_COST), (-1, 0, STRAIGHT_COST),
+    (0, 1, STRAIGHT_COST), (0, -1, STRAIGHT_COST),
+    (1, 1, DIAGONAL_COST), (-1, 1, DIAGONAL_COST),
+    (1, -1, DIAGONAL_COST), (-1, -1, DIAGONAL_COST)
+]
+
+
+# A single "flow field", shared by the whole horde, that tells each
+# walking enemy which way to go to reach the player without walking
+# into a stationary trap.
+#
+# The room is divided into a grid of square cells. For each cell we
+# keep the length of the shortest path from it to the player's cell,
+# going around any cells blocked by traps, and from those, the
+# direction from each cell to its neighbour nearest the player. An
+# enemy then needs only to look up the cell that it's in; however many
+# enemies there are, the paths are only worked out once.
+#
+# The distances are worked out afresh only when the player moves into
+# a new cell. When a trap stops (blocking cells) or starts moving
+# again (freeing them), only the distances that depend on those cells
+# are changed; see "blockCells" and "freeCells".
+#
+# An enemy with nothing in the way of the player--most of them,
+# most of the time--simply walks straight at the player, as before;
+# only those whose way is blocked follow the field's directions.
+class FlowField:
+    def __init__(self, halfSize, cellSize, clearance):
+        self.halfSize = halfSize
+        self.cellSize = cellSize
+        self.numCells = int(round(2.0 * halfSize / cellSize))
+
+        # How close to a trap's middle the middle of an enemy may come:
+        # the radii of a trap and an enemy together
+        self.clearance = clearance
+
+        numCells = self.numCells
+        size = numCells * numCells
+
+        # The positions of the middles of our cells
+        centres = (np.arange(numCells) + 0.5) * cellSize - halfSize
+        self.centresX = np.tile(centres, numCells)
+        self.centresY = np.repeat(centres, numCells)
+
+        # For each cell (by index: x + y*numCells), its neighbours, as
+        # (index, cost, first corner, second corner). A diagonal step may
+        # not cut the corner of a blocked cell, so for each diagonal
+        # neighbour we keep the two cells beside the step; for the
+        # others, both are -1.
+        self.neighbours = []
+        for index in range(size):
+            cellX = index % numCells
+            cellY = index // numCells
+            cellNeighbours = []
+            for dx, dy, cost in NEIGHBOUR_OFFSETS:
+                x = cellX + dx
+                y = cellY + dy
+                if 0 <= x < numCells and 0 <= y < numCells:
+                    if dx != 0 and dy != 0:
+                        corners = (x + cellY*numCells, cellX + y*numCells)
+                    else:
+                        corners = (-1, -1)
+                    cellNeighbours.append((x + y*numCells, cost, corners[0], corners[1]))
+            self.neighbours.append(cellNeighbours)
+
+        self.blocked = [False] * size
+        self.distances = [INFINITY] * size
+        self.goalCell = None
+
+        # The traps blocking each blocked cell, and for each
+        # stationary trap, its position and the cells that it blocks,
+        # as (x, y, cells)
+        self.cellBlockers = {}
+        self.trapCells = {}
+
+        # For each cell, the direction to follow as a pair of
+        # arrays (x, y), and whether the way from it to the
+        # player is clear (in which case, we go straight)
+        self.directionsX = np.zeros(size)
+        self.directionsY = np.zeros(size)
+        self.clearWay = np.ones(size, dtype=bool)
+
+        # For the last update: whether the field was worked out
+        # afresh, how many cells had their distances changed by
+        # traps stopping or starting, and how long it took
+        self.rebuilt = False
+        self.numCellsUpdated = 0
+        self.updateTime = 0
+
+        # Over the whole of the current game
+        self.numRebuilds = 0
+        self.numIncrementalUpdates = 0
+
+    def clear(self):
+        size = self.numCells * self.numCells
+        self.blocked = [False] * size
+        self.distances = [INFINITY] * size
+        self.goalCell = None
+        self.cellBlockers = {}
+        self.trapCells = {}
+        self.directionsX[:] = 0
+        self.directionsY[:] = 0
+        self.clearWay[:] = True
+        self.numRebuilds = 0
+        self.numIncrementalUpdates = 0
+
+    def getCell(self, x, y):
+        numCells = self.numCells
+        cellX = min(max(int(math.floor((x + self.halfSize) / self.cellSize)), 0), numCells - 1)
+        cellY = min(max(int(math.floor((y + self.halfSize) / self.cellSize)), 0), numCells - 1)
+        return cellX + cellY*numCells
+
+    def getCells(self, positions):
+        numCells = self.numCells
+        cells = np.floor((positions[:, :2] + self.halfSize) / self.cellSize).astype(int)
+        np.clip(cells, 0, numCells - 1, out=cells)
+        return cells[:, 0] + cells[:, 1]*numCells
+
+    # Called once per frame, before the enemies are updated
+    def update(self, playerPos, traps):
+        startTime = time.perf_counter()
+
+        # Find which cells the stationary traps block, and
+        # which of those have changed since the last update
+        trapCells = {}
+        for trap in traps:
+            if trap.moveDirection == 0 and trap.speed == 0:
+                pos = trap.actor.getPos()
+                trapCells[trap] = (pos.x, pos.y, self.getCellsUnder(pos.x, pos.y, trap.colliderRadius))
+        changedCells = set()
+        trapsChanged = False
+        for trap, (x, y, cells) in trapCells.items():
+            previous = self.trapCells.get(trap)
+            if previous is None or previous[:2] != (x, y):
+                trapsChanged = True
+            if previous is None or previous[2] != cells:
+                for cell in self.trapCells.pop(trap, (0, 0, ()))[2]:
+                    self.removeBlocker(cell, trap, changedCells)
+                for cell in cells:
+                    self.addBlocker(cell, trap, changedCells)
+        for trap in [trap for trap in self.trapCells if trap not in trapCells]:
+            trapsChanged = True
+            for cell in self.trapCells.pop(trap)[2]:
+                self.removeBlocker(cell, trap, changedCells)
+        self.trapCells = trapCells
+
+        goalCell = self.getCell(playerPos.x, playerPos.y)
+
+        self.rebuilt = False
+        self.numCellsUpdated = 0
+        if goalCell != self.goalCell:
+            self.goalCell = goalCell
+            self.rebuild()
+            self.rebuilt = True
+            self.numRebuilds += 1
+        elif len(changedCells) > 0:
+            # (A cell may have been freed by one trap and blocked by
+            #  another, so it's only what it ends up as that counts.)
+            cellBlockers = self.cellBlockers
+            self.numCellsUpdated = (
+                self.blockCells([cell for cell in changedCells if cell in cellBlockers]) +
+                self.freeCells([cell for cell in changedCells if cell not in cellBlockers]))
+            self.numIncrementalUpdates += 1
+        elif trapsChanged:
+            # (A trap may have moved without changing which cells it
+            #  blocks, but the clear ways past it may still change.)
+            self.updateClearWay()
+            self.updateTime = time.perf_counter() - startTime
+            return
+        else:
+            self.updateTime = time.perf_counter() - startTime
+            return
+
+        self.updateDirections()
+        self.updateClearWay()
+        self.updateTime = time.perf_counter() - startTime
+
+    # The cells overlapped by a trap of the given radius at (x, y),
+    # as a tuple of indices. (As in "SpatialGrid.insert", that's
+    # the cells overlapped by the square around the trap.)
+    def getCellsUnder(self, x, y, radius):
+        cellSize = self.cellSize
+        halfSize = self.halfSize
+        numCells = self.numCells
+        minCellX = max(int(math.floor((x - radius + halfSize) / cellSize)), 0)
+        maxCellX = min(int(math.floor((x + radius + halfSize) / cellSize)), numCells - 1)
+        minCellY = max(int(math.floor((y - radius + halfSize) / cellSize)), 0)
+        maxCellY = min(int(math.floor((y + radius + halfSize) / cellSize)), numCells - 1)
+        return tuple(cellX + cellY*numCells
+                     for cellY in range(minCellY, maxCellY + 1)
+                     for cellX in range(minCellX, maxCellX + 1))
+
+    def addBlocker(self, cell, trap, changedCells):
+        blockers = self.cellBlockers.get(cell)
+        if blockers is None:
+            self.cellBlockers[cell] = {trap}
+            changedCells.add(cell)
+        else:
+            blockers.add(trap)
+
+    def removeBlocker(self, cell, trap, changedCells):
+        blockers = self.cellBlockers[cell]
+        blockers.discard(trap)
+        if len(blockers) == 0:
+            del self.cellBlockers[cell]
+            changedCells.add(cell)
+
+    # Works out the distance from every cell to the player's cell
+    def rebuild(self):
+        size = self.numCells * self.numCells
+        blocked = self.blocked
+        for cell in range(size):
+            blocked[cell] = cell in self.cellBlockers and cell != self.goalCell
+
+        distances = [INFINITY] * size
+        distances[self.goalCell] = 0.0
+        self.distances = distances
+        self.propagate([(0.0, self.goalCell)])
+
+    # Spreads shorter distances outwards from the given
+    # (distance, cell) pairs; returns how many cells were changed
+    def propagate(self, heap):
+        distances = self.distances
+        blocked = self.blocked
+        neighbours = self.neighbours
+        heappush = heapq.heappush
+        heappop = heapq.heappop
+        numChanged = 0
+
+        heapq.heapify(heap)
+        while heap:
+            distance, cell = heappop(heap)
+            if distance > distances[cell]:
+                continue
+            numChanged += 1
+            for other, cost, corner1, corner2 in neighbours[cell]:
+                if blocked[other] or (corner1 >= 0 and (blocked[corner1] or blocked[corner2])):
+                    continue
+                newDistance = distance + cost
+                if newDistance < distances[other] - DISTANCE_TOLERANCE:
+                    distances[other] = newDistance
+                    heappush(heap, (newDistance, other))
+
+        return numChanged
+
+    # The shortest distance to the player by way of one of
+    # a cell's neighbours that isn't among "excluded"
+    def getBestNeighbourDistance(self, cell, excluded):
+        distances = self.distances
+        blocked = self.blocked
+        best = INFINITY
+        for other, cost, corner1, corner2 in self.neighbours[cell]:
+            if blocked[other] or other in excluded:
+                continue
+            if corner1 >= 0 and (blocked[corner1] or blocked[corner2]):
+                continue
+            best = min(best, distances[other] + cost)
+        return best
+
+    # Blocks the given cells. The cells whose shortest paths
+    # went through them--and only those--are then found, and
+    # given new distances from their unaffected neighbours.
+    def blockCells(self, cells):
+        cells = [cell for cell in cells if cell != self.goalCell and not self.blocked[cell]]
+        if len(cells) == 0:
+            return 0
+
+        distances = self.distances
+        blocked = self.blocked
+        neighbours = self.neighbours
+
+        # The blocked cells' neighbours, and theirs in turn, may have
+        # lost their paths. We look at them nearest-first, so that by
+        # the time we look at a cell, we know which of the cells that
+        # it might have reached the player by have lost their paths.
+        heap = []
+        for cell in cells:
+            blocked[cell] = True
+            for other, cost, corner1, corner2 in neighbours[cell]:
+                heap.append((distances[other], other))
+        heapq.heapify(heap)
+
+        affected = set(cells)
+        while len(heap) > 0:
+            distance, cell = heapq.heappop(heap)
+            if cell in affected or blocked[cell] or distance == INFINITY or cell == self.goalCell:
+                continue
+            if self.getBestNeighbourDistance(cell, affected) <= distance + DISTANCE_TOLERANCE:
+                continue
+            affected.add(cell)
+            for other, cost, corner1, corner2 in neighbours[cell]:
+                if distances[other] > distance:
+                    heapq.heappush(heap, (distances[other], other))
+
+        # Give the affected cells what distances they can get from
+        # their unaffected neighbours, and spread those outwards
+        heap = []
+        for cell in affected:
+            distances[cell] = INFINITY
+        for cell in affected:
+            if not blocked[cell]:
+                distance = self.getBestNeighbourDistance(cell, affected)
+                if distance < INFINITY:
+                    distances[cell] = distance
+                    heap.append((distance, cell))
+        self.propagate(heap)
+
+        return len(affected)
+
+    # Frees the given cells, and spreads any
+    # shorter paths through them outwards
+    def freeCells(self, cells):
+        cells = [cell for cell in cells if self.blocked[cell]]
+        if len(cells) == 0:
+            return 0
+
+        distances = self.distances
+        blocked = self.blocked
+        heap = []
+        for cell in cells:
+            blocked[cell] = False
+        # (Freeing a cell may also open up diagonal steps
+        #  past it, so its neighbours are looked at too.)
+        for cell in cells:
+            for other in [cell] + [neighbour[0] for neighbour in self.neighbours[cell]]:
+                if blocked[other]:
+                    continue
+                distance = self.getBestNeighbourDistance(other, ())
+                if other == self.goalCell:
+                    distance = 0.0
+                if distance < distances[other] - DISTANCE_TOLERANCE:
+                    distances[other] = distance
+                    heap.append((distance, other))
+        return self.propagate(heap)
+
+    # Points each cell towards its neighbour with the shortest
+    # way to the player (or, for a blocked cell, towards the
+    # nearest way out of it)
+    def updateDirections(self):
+        numCells = self.numCells
+        distances = np.full((numCells + 2, numCells + 2), INFINITY)
+        distances[1:-1, 1:-1] = np.array(self.distances).reshape(numCells, numCells)
+        blocked = np.ones((numCells + 2, numCells + 2), dtype=bool)
+        blocked[1:-1, 1:-1] = np.array(self.blocked).reshape(numCells, numCells)
+
+        # The cost of reaching the player by way of each neighbour
+        # (Rows of these arrays are y, and columns x.)
+        costs = np.empty((len(NEIGHBOUR_OFFSETS), numCells, numCells))
+        for index, (dx, dy, cost) in enumerate(NEIGHBOUR_OFFSETS):
+            rows = slice(1 + dy, numCells + 1 + dy)
+            columns = slice(1 + dx, numCells + 1 + dx)
+            neighbourCosts = distances[rows, columns] + cost
+            neighbourCosts[blocked[rows, columns]] = INFINITY
+            if dx != 0 and dy != 0:
+                corners = (blocked[1:-1, columns] |
+                           blocked[rows, 1:-1])
+                neighbourCosts[corners] = INFINITY
+            costs[index] = neighbourCosts
+
+        # (Rounded, so that ties between neighbours are broken the same
+        #  way, however the distances were arrived at.)
+        costs = np.round(costs, 6)
+        best = np.argmin(costs, axis=0).ravel()
+        reachable = np.min(costs, axis=0).ravel() < INFINITY
+
+        offsets = np.array([(dx, dy) for dx, dy, cost in NEIGHBOUR_OFFSETS], dtype=float)
+        offsets /= np.sqrt((offsets*offsets).sum(axis=1))[:, None]
+        self.directionsX = np.where(reachable, offsets[best, 0], 0.0)
+        self.directionsY = np.where(reachable, offsets[best, 1], 0.0)
+
+        # The player's own cell simply points at the player
+        self.directionsX[self.goalCell] = 0.0
+        self.directionsY[self.goalCell] = 0.0
+
+    # Finds the cells from whose middles a straight line to the middle
+    # of the player's cell passes no stationary trap
+    def updateClearWay(self):
+        clearWay = np.ones(self.numCells * self.numCells, dtype=bool)
+        if len(self.trapCells) > 0:
+            goalX = self.centresX[self.goalCell]
+            goalY = self.centresY[self.goalCell]
+            segmentsX = goalX - self.centresX
+            segmentsY = goalY - self.centresY
+            lengthsSquared = np.maximum(segmentsX*segmentsX + segmentsY*segmentsY, DISTANCE_TOLERANCE)
+            # The nearest point to each trap on each line
+            # (Rows are cells, and columns traps.)
+            trapPositions = np.array([(x, y) for x, y, cells in self.trapCells.values()])
+            toTrapsX = trapPositions[:, 0] - self.centresX[:, None]
+            toTrapsY = trapPositions[:, 1] - self.centresY[:, None]
+            along = (toTrapsX*segmentsX[:, None] + toTrapsY*segmentsY[:, None]) / lengthsSquared[:, None]
+            np.clip(along, 0.0, 1.0, out=along)
+            offsetsX = toTrapsX - segmentsX[:, None]*along
+            offsetsY = toTrapsY - segmentsY[:, None]*along
+            offsetsSquared = offsetsX*offsetsX + offsetsY*offsetsY
+            clearWay = offsetsSquared.min(axis=1) >= self.clearance * self.clearance
+        # A cell that the field can't lead out of might as well
+        # head straight for the player
+        clearWay |= (self.directionsX == 0) & (self.directionsY == 0)
+        self.clearWay = clearWay
+
+    # The direction for an enemy at (x, y) to follow, or
+    # None if it should head straight for the player
+    def getDirection(self, x, y):
+        cell = self.getCell(x, y)
+        if self.clearWay[cell]:
+            return None
+        return self.directionsX[cell], self.directionsY[cell]
+
+    # As "getDirection", for many enemies at once: returns a
+    # mask of those that should follow the field (rather than
+    # head straight for the player), and their directions
+    def getDirections(self, positions):
+        cells = self.getCells(positions)
+        following = ~self.clearWay[cells]
+        return following, self.directionsX[cells], self.directionsY[cells]
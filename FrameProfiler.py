@@ -0,0 +1,161 @@
+import collections
+import csv
+import time
+
+from panda3d.core import PStatCollector
+from panda3d.core import LightAttrib, RenderState, TransformState
+
+
+# Times the phases of each frame of our game.
+#
+# Each phase gets a PStatCollector, so that when PStats is running
+# (see "--pstats" in "main.py") our phases show up in its graphs,
+# nested under "App:Game". Connecting to PStats needs a server,
+# however, so we also keep our own timings of each phase; if asked
+# to, we write those out to a CSV-file, one row per frame.
+# That's handy for long play-sessions: when things start to stutter
+# we can look back and see which phase was to blame.
+#
+# A phase is timed by calling "begin" and "end" around it. A phase
+# may be begun and ended more than once in a frame; its times are
+# added together.
+class FrameProfiler:
+    def __init__(self, phaseNames):
+        self.phaseNames = list(phaseNames)
+
+        self.collectors = {}
+        for name in self.phaseNames:
+            self.collectors[name] = PStatCollector("App:Game:" + name)
+
+        # How long each phase has taken so far this frame, in seconds,
+        # and when each phase that's currently running began
+        self.phaseTimes = dict.fromkeys(self.phaseNames, 0.0)
+        self.phaseStartTimes = dict.fromkeys(self.phaseNames, 0.0)
+
+        self.frameNumber = 0
+
+        self.csvFile = None
+        self.csvWriter = None
+
+    def begin(self, name):
+        self.collectors[name].start()
+        self.phaseStartTimes[name] = time.perf_counter()
+
+    def end(self, name):
+        self.phaseTimes[name] += time.perf_counter() - self.phaseStartTimes[name]
+        self.collectors[name].stop()
+
+    # Starts writing each frame's timings to the given file.
+    # "counterNames" are the names of any extra values that
+    # the game will hand us at the end of each frame (such as
+    # the number of enemies), to be written alongside the timings.
+    def startRecording(self, fileName, counterNames=()):
+        self.stopRecording()
+
+        self.counterNames = list(counterNames)
+        self.csvFile = open(fileName, "w", newline="")
+        self.csvWriter = csv.writer(self.csvFile)
+        self.csvWriter.writerow(["frame", "frameTime", "dt"] +
+                                [name + "Ms" for name in self.phaseNames] +
+                                ["totalMs"] + self.counterNames)
+
+    def stopRecording(self):
+        if self.csvFile is not None:
+            self.csvFile.close()
+            self.csvFile = None
+            self.csvWriter = None
+
+    def isRecording(self):
+        return self.csvWriter is not None
+
+    # Called once at the end of every frame: records this frame's
+    # timings (if we're recording), and starts afresh for the next.
+    # "counters" is a dictionary holding the values named
+    # in "startRecording".
+    def endFrame(self, frameTime, dt, counters=None):
+        if self.csvWriter is not None:
+            phaseMs = [self.phaseTimes[name] * 1000.0 for name in self.phaseNames]
+            row = [self.frameNumber, "{0:.4f}".format(frameTime), "{0:.4f}".format(dt)]
+            row += ["{0:.4f}".format(ms) for ms in phaseMs]
+            row.append("{0:.4f}".format(sum(phaseMs)))
+            if counters is not None:
+                row += [counters.get(name, "") for name in self.counterNames]
+            self.csvWriter.writerow(row)
+
+        self.frameNumber += 1
+        for name in self.phaseNames:
+            self.phaseTimes[name] = 0.0
+
+
+# How many RenderStates and TransformStates Panda is holding in its
+# caches, and how many of those are no longer used by anything.
+# Every distinct colour, light-set, position and so on that's ever
+# applied to a node makes one of these; if these numbers keep on
+# climbing during a long fight, something is making new states
+# on every frame.
+def getStateCacheSizes():
+    return {
+        "renderStates": RenderState.getNumStates(),
+        "unusedRenderStates": RenderState.getNumUnusedStates(),
+        "transformStates": TransformState.getNumStates(),
+        "unusedTransformStates": TransformState.getNumUnusedStates()
+    }
+
+
+# Counts the changes that make Panda generate new shaders: changes to
+# the set of lights on the scene as a whole, and the shaders themselves.
+#
+# With "setShaderAuto", every new combination of render-states (most
+# notably, of lights) calls for a shader of its own, which is
+# generated and compiled on the spot--a likely cause of hitches.
+# So once a frame we look at the scene's lights, to see whether they've
+# changed, and at how many shaders the graphics-state-guardian has
+# been given, to see whether any new ones have been made.
+#
+# Both are given as rates: how many there were in the last second.
+class RenderChangeMonitor:
+    def __init__(self, scene):
+        self.scene = scene
+        self.lightAttrib = scene.getState().getAttrib(LightAttrib)
+        # How many shaders had been prepared as of the last frame
+        # (or None if we haven't been able to look yet)
+        self.numShaders = None
+
+        # The totals so far
+        self.numLightChanges = 0
+        self.numShadersGenerated = 0
+
+        # The frames of the last second that had any changes:
+        # (frame-time, light-changes, shaders generated)
+        self.recentChanges = collections.deque()
+        self.lightChangesPerSecond = 0
+        self.shadersPerSecond = 0
+
+    # Called once at the end of every frame, with the
+    # graphics-state-guardian (if there is one)
+    def update(self, frameTime, gsg):
+        lightChanges = 0
+        lightAttrib = self.scene.getState().getAttrib(LightAttrib)
+        if lightAttrib != self.lightAttrib:
+            self.lightAttrib = lightAttrib
+            lightChanges = 1
+
+        newShaders = 0
+        if gsg is not None:
+            preparedObjects = gsg.getPreparedObjects()
+            numShaders = preparedObjects.getNumPreparedShaders() + preparedObjects.getNumQueuedShaders()
+            if self.numShaders is not None:
+                newShaders = max(0, numShaders - self.numShaders)
+            self.numShaders = numShaders
+
+        self.numLightChanges += lightChanges
+        self.numShadersGenerated += newShaders
+
+        if lightChanges > 0 or newShaders > 0:
+            self.recentChanges.append((frameTime, lightChanges, newShaders))
+            self.lightChangesPerSecond += lightChanges
+            self.shadersPerSecond += newShaders
+        while len(self.recentChanges) > 0 and self.recentChanges[0][0] <= frameTime - 1.0:
+            oldTime, oldLightChanges, oldShaders = self.recentChanges.popleft()
+            self.lightChangesPerSecond -= oldLightChanges
+            self.shadersPerSecond -= oldShaders
@@ -1,48 +1,94 @@
 from panda3d.core import Vec4, Vec3, Vec2
 from direct.actor.Actor import Actor
 from panda3d.core import CollisionSphere, CollisionNode
-from direct.showbase.ShowBase import ShowBase
-from panda3d.core import CollisionRay, CollisionHandlerQueue
 from panda3d.core import BitMask32
 
 import math
 import random
+from SpatialGrid import rayHitsCapsule
 from panda3d.core import Plane, Point3
-from panda3d.core import CollisionSegment
-from direct.gui.OnscreenText import OnscreenText
-from direct.gui.OnscreenImage import OnscreenImage
-from panda3d.core import TextNode
-from panda3d.core import PointLight 
 from panda3d.core import AudioSound
+from panda3d.core import ColorScaleAttrib
+from direct.showbase.ShowBaseGlobal import globalClock
+
+from ActorPrototypes import actorPrototypes
+from AnimationStateMachine import AnimationStateMachine
 
 
 FRICTION = 150.0
 
-class GameObject(ShowBase):
-    def __init__(self, pos, modelName, modelAnims, maxHealth, maxSpeed, colliderName):
-        self.actor = Actor(modelName, modelAnims)
+# Rather than tinting our walking enemies by exactly how much health
+# they have left--which, under the laser, would give Panda a brand-new
+# colour, and so a brand-new render-state, on every frame--we use one
+# of a fixed set of tints, made once and shared by every enemy.
+HEALTH_TINT_LEVELS = 16
+healthTints = []
+for level in range(HEALTH_TINT_LEVELS):
+    brightness = level / (HEALTH_TINT_LEVELS - 1)
+    healthTints.append(ColorScaleAttrib.make(Vec4(brightness, brightness, brightness, 1)))
+
+# The base of everything in the game that has a model, health and a
+# collider. (This isn't a "ShowBase"--the game itself is that, and is
+# reached through the global "base"--so it's a plain, light object.)
+#
+# Each of our classes lists the attributes that its objects have in
+# "__slots__", so that an object is only as big as those attributes,
+# rather than carrying a dictionary of them. Anything that's the
+# same for every object of a type--its model, its speed, its sounds
+# and so on--is kept once, on the class, rather than in every object.
+class GameObject:
+    __slots__ = ("actor", "animation", "maxHealth", "health", "velocity", "walking",
+                 "registryIndex", "deathCallback", "collider")
+
+    # Set by each type of object
+    modelName = None
+    modelAnims = None
+    defaultMaxHealth = 1
+    maxSpeed = 0
+    colliderName = None
+
+    acceleration = 300.0
+
+    colliderRadius = 0.3
+
+    # The name of the sound that will play when an enemy dies, if any.
+    # This is played (via the game's sound-bank) in the alterHealth method
+    deathSoundName = None
+
+    # The bits of our collider's "into"-mask, which the
+    # game's spatial grid also uses; see "SpatialGrid.py".
+    collideMaskBits = 0
+
+    def __init__(self, pos):
+        # Rather than loading the model and its animations afresh,
+        # we copy them from a prototype that has already loaded them.
+        self.actor = actorPrototypes.makeActor(self.modelName, self.modelAnims)
         self.actor.reparentTo(render)
         self.actor.setPos(pos)
 
-        # initializing the sound that will play when an enemy dies as None
-        # This is updated in the alterHealth method
-        self.deathSound = None
+        # Animations are started and stopped through this,
+        # rather than through the Actor; see "AnimationStateMachine.py".
+        self.animation = AnimationStateMachine(self.actor)
 
-        self.maxHealth = maxHealth
-        self.health = maxHealth
-
-        self.maxSpeed = maxSpeed
+        self.maxHealth = self.defaultMaxHealth
+        self.health = self.maxHealth
 
         self.velocity = Vec3(0, 0, 0)
-        self.acceleration = 300.0
 
         self.walking = False
 
-        colliderNode = CollisionNode(colliderName)
-        colliderNode.addSolid(CollisionSphere(0, 0, 0, 0.3))
+        # Our place in whichever of the game's EntityRegistries
+        # we're in, if any; see "EntityRegistry.py"
+        self.registryIndex = None
+
+        # If set, this is called (with this object) at
+        # the moment that our health drops to zero
+        self.deathCallback = None
+
+        colliderNode = CollisionNode(self.colliderName)
+        colliderNode.addSolid(CollisionSphere(0, 0, 0, self.colliderRadius))
+        colliderNode.setIntoCollideMask(BitMask32(self.collideMaskBits))
         self.collider = self.actor.attachNewNode(colliderNode)
-        # See below for an explanation of this!
-        self.collider.setPythonTag("owner", self)
 
     def update(self, dt):
         # If we're going faster than our maximum speed,
@@ -77,14 +123,37 @@ class GameObject(ShowBase):
         if self.health > self.maxHealth:
             self.health = self.maxHealth
 
-        if previousHealth > 0 and self.health <= 0 and self.deathSound is not None:
-            self.deathSound.play()
+        if previousHealth > 0 and self.health <= 0:
+            if self.deathSoundName is not None:
+                base.soundBank.play(self.deathSoundName, self)
+            if self.deathCallback is not None:
+                self.deathCallback(self)
+
+    # Takes this object out of the game without destroying it,
+    # so that it can be brought back later via "reset".
+    def deactivate(self):
+        self.animation.stop()
+        self.actor.detachNode()
+        # A stashed collider is ignored by the traverser
+        self.collider.stash()
+
+    # Brings a deactivated object back into the game,
+    # as good as new, at the given position.
+    def reset(self, pos):
+        self.actor.reparentTo(render)
+        self.actor.setPos(pos)
+        self.actor.setH(0)
+        self.collider.unstash()
+
+        self.maxHealth = self.defaultMaxHealth
+        self.health = self.maxHealth
+        self.velocity.set(0, 0, 0)
+        self.walking = False
 
     def cleanup(self):
-        # Remove various nodes, and clear the Python-tag--see below!
+        # Remove various nodes, and forget our collider
 
         if self.collider is not None and not self.collider.isEmpty():
-            self.collider.clearPythonTag("owner")
             base.cTrav.removeCollider(self.collider)
             base.pusher.removeCollider(self.collider)
 
@@ -96,96 +165,79 @@ class GameObject(ShowBase):
         self.collider = None
 
 class Player(GameObject):
+    __slots__ = ("scoreUI", "laserSoundNoHit", "laserSoundHit", "beamModel",
+                 "rayOrigin", "rayDirection", "lastMousePos", "aimPos", "groundPlane",
+                 "score", "healthIcons", "beamHitModel", "beamHitPulseStartTime",
+                 "beamHitLight", "beamHitLightNodePath", "beamHitLightOn",
+                 "damageTakenModel", "damageTakenModelTimer", "damageTakenModelStartTime",
+                 "numBeamHitLightToggles", "beamHitPulseTimer", "prefab")
+
+    modelName = "models/panda_chan/act_p3d_chan"
+    modelAnims = {
+        "stand" : "models/panda_chan/a_p3d_chan_idle",
+        "walk" : "models/panda_chan/a_p3d_chan_run"
+    }
+    defaultMaxHealth = 5
+    maxSpeed = 10
+    colliderName = "player"
+
+    # adding a BitMask on the Player character with a value of 1 (For 'from' and 'into' masks).
+    # Later, a BitMask of a different value is added to the ray (so the both don't collide)
+    # (The "into"-mask is the important one for preventing ray-collisions.)
+    collideMaskBits = BitMask32.bit(1).getWord()
+
+    # adding a BitMask on the ray with a different value than the bit mask of Player.
+    # Note that we set a different bit here!
+    # This means that the ray's mask and
+    # the collider's mask don't match, and
+    # so the ray won't collide with the
+    # collider.
+    rayMaskBits = BitMask32.bit(2).getWord()
+
+    damagePerSecond = -5.0
+
+    # This vector is used to calculate the orientation for
+    # the character's model. Since the character faces along
+    # the y-direction, we use the y-axis.
+    yVector = Vec2(0, 1)
+
+    beamHitPulseRate = 0.15
+    # The beam-hit light's colour when it's on; see below.
+    beamHitLightColour = Vec4(0.1, 1.0, 0.2, 1)
+
+    damageTakenModelDuration = 0.15
+
     def __init__(self):
-        GameObject.__init__(self,
-                            Vec3(0, 0, 0),
-                            "models/panda_chan/act_p3d_chan",
-                              {
-                                  "stand" : "models/panda_chan/a_p3d_chan_idle",
-                                  "walk" : "models/panda_chan/a_p3d_chan_run"
-                              },
-                            5,
-                            10,
-                            "player")
-
-        self.scoreUI = OnscreenText(text="0",
-                                    pos=(-1.3, 0.825),
-                                    mayChange=True,
-                                    align=TextNode.ALeft,
-                                    font=base.font)
+        GameObject.__init__(self, Vec3(0, 0, 0))
+
+        # Our laser-beam, its hit-flash and light, our hurt-flash and
+        # our HUD are built just once, and kept by the game for
+        # whichever Player is current; see "PlayerPrefab.py".
+        self.prefab = base.playerPrefab
+        self.beamModel = self.prefab.beamModel
+        self.beamHitModel = self.prefab.beamHitModel
+        self.beamHitLight = self.prefab.beamHitLight
+        self.beamHitLightNodePath = self.prefab.beamHitLightNodePath
+        self.damageTakenModel = self.prefab.damageTakenModel
+        self.scoreUI = self.prefab.scoreUI
+        self.healthIcons = self.prefab.healthIcons
 
         # Panda-chan faces "backwards", so we just turn
         # the first sub-node of our Actor-NodePath
         # to have it face as we want.
         self.actor.getChild(0).setH(180)
 
-        self.laserSoundNoHit = loader.loadSfx("sounds/laserNoHit.ogg")
-        self.laserSoundNoHit.setLoop(True)
-        self.laserSoundHit = loader.loadSfx("sounds/laserHit.ogg")
-        self.laserSoundHit.setLoop(True)
-
-        self.hurtSound = loader.loadSfx("sounds/FemaleDmgNoise.ogg")
+        # There's only ever one player, so we simply
+        # take the sound-bank's (looping) laser-sounds for our own.
+        self.laserSoundNoHit = base.soundBank.getSound("laserNoHit")
+        self.laserSoundHit = base.soundBank.getSound("laserHit")
 
         # Since our "Game" object is the "ShowBase" object,
         # we can access it via the global "base" variable.
         base.pusher.addCollider(self.collider, self.actor)
         base.cTrav.addCollider(self.collider, base.pusher)
 
-        # adding a BitMask on the Player character with a value of 1 (For 'from' and 'into' masks).
-        # Later, a BitMask of a different value is added to the ray (so the both don't collide)
-        mask = BitMask32()
-        mask.setBit(1)
-
-        # This is the important one for preventing ray-collisions.
-        self.collider.node().setIntoCollideMask(mask)
-
-        mask = BitMask32()
-        mask.setBit(1)
-
-        self.collider.node().setFromCollideMask(mask)
-
-        # A nice laser-beam model to show our laser
-        self.beamModel = loader.loadModel("models/BambooLaser/bambooLaser")
-        self.beamModel.reparentTo(self.actor)
-        self.beamModel.setZ(1.5)
-        # This prevents lights from affecting this particular node
-        self.beamModel.setLightOff()
-        # We don't start out firing the laser, so
-        # we have it initially hidden.
-        self.beamModel.hide()
-
-        # death ray
-        self.ray = CollisionRay(0, 0, 0, 0, 1, 0)
-
-        rayNode = CollisionNode("playerRay")
-        rayNode.addSolid(self.ray)
-
-        self.rayNodePath = render.attachNewNode(rayNode)
-        self.rayQueue = CollisionHandlerQueue()
-
-        # We want this ray to collide with things, so
-        # tell our traverser about it. However, note that,
-        # unlike with "CollisionHandlerPusher", we don't
-        # have to tell our "CollisionHandlerQueue" about it.
-        base.cTrav.addCollider(self.rayNodePath, self.rayQueue)
-
-        # adding a BitMask on the ray with a different value than the bit mask of Player.
-        mask = BitMask32()
-
-        # Note that we set a different bit here!
-        # This means that the ray's mask and
-        # the collider's mask don't match, and
-        # so the ray won't collide with the
-        # collider.
-        mask.setBit(2)
-        rayNode.setFromCollideMask(mask)
-
-        mask = BitMask32()
-        rayNode.setIntoCollideMask(mask)
-
-        self.damagePerSecond = -5.0
-
-        self.actor.loop("stand")
+        self.collider.node().setFromCollideMask(BitMask32(self.collideMaskBits))
 
         # This stores the previous position of the mouse,
         # as a fall-back in case we don't get a good position
@@ -195,63 +247,46 @@ class Player(GameObject):
         # Construct a plane facing upwards, and centred at (0, 0, 0)
         self.groundPlane = Plane(Vec3(0, 0, 1), Vec3(0, 0, 0))
 
-        # This vector is used to calculate the orientation for
-        # the character's model. Since the character faces along
-        # the y-direction, we use the y-axis.
-        self.yVector = Vec2(0, 1)
+        self.beamHitPulseTimer = None
+        self.beginGame()
+
+    # Sets up everything that starts afresh with each game, whether
+    # we've just been made, or are being re-used via "reset"
+    def beginGame(self):
+        self.prefab.attach(self)
+
+        # death ray
+        # Rather than have the collision-traverser test a ray on every
+        # frame, we only look for what the ray hits while we're
+        # actually firing, by asking the game's spatial grid
+        # (and checking the walls ourselves).
+        self.rayOrigin = Point3(0, 0, 0)
+        self.rayDirection = Vec3(0, 1, 0)
+
+        self.animation.loop("stand")
+
+        # The point on the ground that we aimed at on our
+        # last update (kept for recordings of our games)
+        self.aimPos = Point3(0, 0, 0)
 
-        # Displaying Player's health.
-        # Player's health will be displayed as a row of heart icons.
         self.score = 0
 
-        self.scoreUI = OnscreenText(text="0",
-                                    pos=(-1.3, 0.825),
-                                    mayChange=True,
-                                    align=TextNode.ALeft)
-
-        self.healthIcons = []
-        for i in range(self.maxHealth):
-            icon = OnscreenImage(image="models/UI/health.png",
-                                 pos=(-1.275 + i * 0.075, 0, 0.95),
-                                 scale=0.04)
-            # Since our icons have transparent regions,
-            # we'll activate transparency.
-            icon.setTransparency(True)
-            self.healthIcons.append(icon)
-
-            # A hit-flash will appear when the walking enemy will get hit with the laser.
-            self.beamHitModel = loader.loadModel("models/BambooLaser/bambooLaserHit")
-            self.beamHitModel.reparentTo(render)
-            self.beamHitModel.setZ(1.5)
-            self.beamHitModel.setLightOff()
-            self.beamHitModel.hide()
+        # When the current pulse of the beam-hit model began
+        self.beamHitPulseStartTime = 0
+
+        # The beam-hit light starts out "off"; see "PlayerPrefab.py"
+        # for why it's never removed from the scene.
+        self.beamHitLightOn = False
+        # How many times the beam-hit light has been turned on or off
+        self.numBeamHitLightToggles = 0
+
+        # The scheduler's timer for hiding the damage-model, if it's showing,
+        # and the frame-time at which it was shown
+        self.damageTakenModelTimer = None
+        self.damageTakenModelStartTime = 0
 
-            self.beamHitPulseRate = 0.15
-            self.beamHitTimer = 0
-
-            self.beamHitLight = PointLight("beamHitLight")
-            self.beamHitLight.setColor(Vec4(0.1, 1.0, 0.2, 1))
-            # These "attenuation" values govern how the light
-            # fades with distance. They are, respectively,
-            # the constant, linear, and quadratic coefficients
-            # of the light's falloff equation.
-            # I experimented until I found values that
-            # looked nice.
-            self.beamHitLight.setAttenuation((1.0, 0.1, 0.5))
-            self.beamHitLightNodePath = render.attachNewNode(self.beamHitLight)
-            # Note that we haven't yet applied the light to
-            # a NodePath, and so it won't yet illuminate
-            # anything.
-
-            # displaying damage taken by the Player
-            self.damageTakenModel = loader.loadModel("models/BambooLaser/playerHit")
-            self.damageTakenModel.setLightOff()
-            self.damageTakenModel.setZ(1.0)
-            self.damageTakenModel.reparentTo(self.actor)
-            self.damageTakenModel.hide()
-
-            self.damageTakenModelTimer = 0
-            self.damageTakenModelDuration = 0.15
+        # Start the beam-hit model pulsing
+        self.pulseBeamHit()
 
     def update(self, keys, dt):
         GameObject.update(self, dt)
@@ -274,39 +309,27 @@ class Player(GameObject):
             self.velocity.addX(self.acceleration * dt)
 
         # Run the appropriate animation for our current state.
+        # (This does nothing if that animation is already running.)
         if self.walking:
-            standControl = self.actor.getAnimControl("stand")
-            if standControl.isPlaying():
-                standControl.stop()
-
-            walkControl = self.actor.getAnimControl("walk")
-            if not walkControl.isPlaying():
-                self.actor.loop("walk")
+            self.animation.loop("walk")
         else:
-            standControl = self.actor.getAnimControl("stand")
-            if not standControl.isPlaying():
-                self.actor.stop("walk")
-                self.actor.loop("stand")
+            self.animation.loop("stand")
 
         # If we're pressing the "shoot" button, check
         # whether the ray has hit anything, and if so,
         # examine the collision-entry for the first hit.
-        # If the thing hit has an "owner" Python-tag, then
+        # If the thing hit has an owner, then
         # it's a GameObject, and should try to take damage--
         # with the exception if "TrapEnemies",
         # which are invulnerable.
         if keys["shoot"]:
-            if self.rayQueue.getNumEntries() > 0:
+            hitObject, hitDistance = self.castRay()
+            if hitDistance is not None:
                 scoredHit = False
 
-                self.rayQueue.sortEntries()
-                rayHit = self.rayQueue.getEntry(0)
-                hitPos = rayHit.getSurfacePoint(render)
+                hitPos = self.rayOrigin + self.rayDirection*hitDistance
 
-                hitNodePath = rayHit.getIntoNodePath()
-                print(hitNodePath)
-                if hitNodePath.hasPythonTag("owner"):
-                    hitObject = hitNodePath.getPythonTag("owner")
+                if hitObject is not None:
                     if not isinstance(hitObject, TrapEnemy):
                         hitObject.alterHealth(self.damagePerSecond * dt)
                         scoredHit = True
@@ -331,11 +354,8 @@ class Player(GameObject):
                     self.beamHitModel.setPos(hitPos)
                     self.beamHitLightNodePath.setPos(hitPos + Vec3(0, 0, 0.5))
 
-                    # If the light hasn't already been set here, set it
-                    if not render.hasLight(self.beamHitLightNodePath):
-                        # Apply the light to the scene, so that it
-                        # illuminates things
-                        render.setLight(self.beamHitLightNodePath)
+                    # Turn the light on, so that it illuminates things
+                    self.setBeamHitLightOn(True)
                 else:
                     # We're firing, but hitting nothing, so
                     # stop the "hit something" sound, and play
@@ -345,12 +365,9 @@ class Player(GameObject):
                     if self.laserSoundNoHit.status() != AudioSound.PLAYING:
                         self.laserSoundNoHit.play()
 
-                    # If the light has been set here, remove it
-                    # See explanation in the tutorial-text below...
-                    if render.hasLight(self.beamHitLightNodePath):
-                        # Clear the light from the scene, so that it
-                        # no longer illuminates anything
-                        render.clearLight(self.beamHitLightNodePath)
+                    # Turn the light off, so that it
+                    # no longer illuminates anything
+                    self.setBeamHitLightOn(False)
 
                     self.beamHitModel.hide()
         else:
@@ -366,12 +383,103 @@ class Player(GameObject):
             if self.laserSoundHit.status() == AudioSound.PLAYING:
                 self.laserSoundHit.stop()
 
-            if render.hasLight(self.beamHitLightNodePath):
-                # Clear the light from the scene, so that it
-                # no longer illuminates anything
-                render.clearLight(self.beamHitLightNodePath)
+            self.setBeamHitLightOn(False)
+
 
+        # If the game is telling us where to aim (such as
+        # when running headless), do that; otherwise
+        # aim wherever the mouse is pointing.
+        if base.aimPoint is not None:
+            mousePos3D = Point3(base.aimPoint)
+        else:
+            mousePos3D = self.getMouseGroundPoint()
+        self.aimPos = mousePos3D
 
+        # constructing a vector from the player’s position to the point, and take just the horizontal part of it,
+        # since we’re not interested in any difference in z-position
+        firingVector = Vec3(mousePos3D - self.actor.getPos())
+        firingVector2D = firingVector.getXy()
+        firingVector2D.normalize()
+        firingVector.normalize()
+
+        # find the angle that it makes with the positive y-axis –
+        # this is the angle at which to face our player-character
+        heading = self.yVector.signedAngleDeg(firingVector2D)
+
+        self.actor.setH(heading)
+
+        if firingVector.length() > 0.001:
+            self.rayOrigin = self.actor.getPos()
+            self.rayDirection = firingVector
+
+
+        # Use the time left in the current pulse in a sine-function
+        # to pulse the scale of the beam-hit model.
+        # (See "pulseBeamHit" for the start of each pulse.)
+        frameTime = globalClock.getFrameTime()
+        beamHitTimeLeft = self.beamHitPulseRate - (frameTime - self.beamHitPulseStartTime)
+        self.beamHitModel.setScale(math.sin(beamHitTimeLeft * 3.142 / self.beamHitPulseRate) * 0.4 + 0.9)
+
+        # altering damage taken by the Player.
+        # (See "hideDamageTakenModel" for when this ends.)
+        if self.damageTakenModelTimer is not None:
+            timeShown = frameTime - self.damageTakenModelStartTime
+            self.damageTakenModel.setScale(1.0 + timeShown / self.damageTakenModelDuration)
+
+    # Turns the beam-hit light on or off, by changing its colour.
+    # (See "PlayerPrefab.py" for why we don't remove it instead.)
+    def setBeamHitLightOn(self, on):
+        if on == self.beamHitLightOn:
+            return
+        self.beamHitLightOn = on
+        self.numBeamHitLightToggles += 1
+        if on:
+            self.beamHitLight.setColor(self.beamHitLightColour)
+        else:
+            self.beamHitLight.setColor(Vec4(0, 0, 0, 1))
+
+    # Called by the scheduler at the start of each pulse of the beam-hit
+    # model (when its scale is at its lowest): randomise the beam-hit
+    # model's rotation, and wait for the next pulse.
+    def pulseBeamHit(self):
+        self.beamHitPulseStartTime = globalClock.getFrameTime()
+        self.beamHitModel.setH(random.uniform(0.0, 360.0))
+        self.beamHitPulseTimer = base.scheduler.schedule(self.beamHitPulseRate, self.pulseBeamHit)
+
+    def hideDamageTakenModel(self):
+        self.damageTakenModel.hide()
+        self.damageTakenModelTimer = None
+
+    # Finds the first thing that our ray hits: either a wall or one of
+    # the objects in the game's spatial grid. Returns the object hit
+    # (or None for a wall) and how far along the ray it is
+    # (or None if nothing at all was hit).
+    def castRay(self):
+        ox = self.rayOrigin.x
+        oy = self.rayOrigin.y
+        dx = self.rayDirection.x
+        dy = self.rayDirection.y
+
+        # The walls bound the arena, so we needn't look past them.
+        wallDistance = None
+        for ax, ay, bx, by, radius in base.walls:
+            t = rayHitsCapsule(ox, oy, dx, dy, ax, ay, bx, by, radius)
+            if t is not None and (wallDistance is None or t < wallDistance):
+                wallDistance = t
+
+        if wallDistance is None:
+            maxDistance = 100.0
+        else:
+            maxDistance = wallDistance
+
+        hitObject, hitDistance = base.entityGrid.queryRay(ox, oy, dx, dy, maxDistance, self.rayMaskBits)
+        if hitObject is None:
+            return None, wallDistance
+
+        return hitObject, hitDistance
+
+    # Finds the point on the ground that the mouse is pointing at
+    def getMouseGroundPoint(self):
         # It's possible that we'll find that we
         # don't have the mouse--such as if the pointer
         # is outside of the game-window. In that case,
@@ -400,41 +508,9 @@ class Player(GameObject):
                                         render.getRelativePoint(base.camera, nearPoint),
                                         render.getRelativePoint(base.camera, farPoint))
 
-        # constructing a vector from the player’s position to the point, and take just the horizontal part of it,
-        # since we’re not interested in any difference in z-position
-        firingVector = Vec3(mousePos3D - self.actor.getPos())
-        firingVector2D = firingVector.getXy()
-        firingVector2D.normalize()
-        firingVector.normalize()
-
-        # find the angle that it makes with the positive y-axis –
-        # this is the angle at which to face our player-character
-        heading = self.yVector.signedAngleDeg(firingVector2D)
-
-        self.actor.setH(heading)
-
-        if firingVector.length() > 0.001:
-            self.ray.setOrigin(self.actor.getPos())
-            self.ray.setDirection(firingVector)
-
         self.lastMousePos = mousePos
 
-        # run a timer, and use the timer in a sine-function
-        # to pulse the scale of the beam-hit model. When the timer
-        # runs down (and the scale is at its lowest), reset the timer
-        # and randomise the beam-hit model's rotation.
-        self.beamHitTimer -= dt
-        if self.beamHitTimer <= 0:
-            self.beamHitTimer = self.beamHitPulseRate
-            self.beamHitModel.setH(random.uniform(0.0, 360.0))
-        self.beamHitModel.setScale(math.sin(self.beamHitTimer * 3.142 / self.beamHitPulseRate) * 0.4 + 0.9)
-
-        # altering damage taken by the Player.
-        if self.damageTakenModelTimer > 0:
-            self.damageTakenModelTimer -= dt
-            self.damageTakenModel.setScale(2.0 - self.damageTakenModelTimer / self.damageTakenModelDuration)
-            if self.damageTakenModelTimer <= 0:
-                self.damageTakenModel.hide()
+        return mousePos3D
 
     # Updating the score
     def updateScore(self):
@@ -442,12 +518,16 @@ class Player(GameObject):
 
     # modifying player's health after taking damage.
     def alterHealth(self, dHealth):
-        self.hurtSound.play()
+        base.soundBank.play("playerHurt", self)
 
         # altering the Player's health based on the damage taken.
         self.damageTakenModel.show()
         self.damageTakenModel.setH(random.uniform(0.0, 360.0))
-        self.damageTakenModelTimer = self.damageTakenModelDuration
+        self.damageTakenModelStartTime = globalClock.getFrameTime()
+        if self.damageTakenModelTimer is not None:
+            base.scheduler.cancel(self.damageTakenModelTimer)
+        self.damageTakenModelTimer = base.scheduler.schedule(self.damageTakenModelDuration,
+                                                             self.hideDamageTakenModel)
 
         GameObject.alterHealth(self, dHealth)
 
@@ -462,34 +542,57 @@ class Player(GameObject):
                 icon.hide()
 
 
-    # Overriding the cleanup() method of the GameObject class
-    def cleanup(self):
-        # Cleaning up the health after quitting the game.
+    # Stops everything that we have going in the current game
+    def endGame(self):
         self.laserSoundHit.stop()
         self.laserSoundNoHit.stop()
 
-        self.scoreUI.removeNode()
-        for icon in self.healthIcons:
-            icon.removeNode()
+        if self.beamHitPulseTimer is not None:
+            base.scheduler.cancel(self.beamHitPulseTimer)
+            self.beamHitPulseTimer = None
+        if self.damageTakenModelTimer is not None:
+            base.scheduler.cancel(self.damageTakenModelTimer)
+            self.damageTakenModelTimer = None
 
-        self.beamHitModel.removeNode()
+        # Hand our models and HUD back, for the next game
+        self.prefab.detach()
 
-        base.cTrav.removeCollider(self.rayNodePath)
+    # When the game restarts, we're kept and re-used, rather than
+    # being destroyed and built again; see "Game.startGame".
+    def deactivate(self):
+        self.endGame()
+        GameObject.deactivate(self)
 
-        render.clearLight(self.beamHitLightNodePath)
-        self.beamHitLightNodePath.removeNode()
+    def reset(self, pos):
+        GameObject.reset(self, pos)
+        self.beginGame()
+
+    # Overriding the cleanup() method of the GameObject class
+    def cleanup(self):
+        # Cleaning up the health after quitting the game.
+        self.endGame()
 
         GameObject.cleanup(self)
 
 class Enemy(GameObject):
-    def __init__(self, pos, modelName, modelAnims, maxHealth, maxSpeed, colliderName):
-        GameObject.__init__(self, pos, modelName, modelAnims, maxHealth, maxSpeed, colliderName)
+    __slots__ = ("hordeIndex",)
+
+    # This is the number of points to award
+    # if the enemy is killed.
+    scoreValue = 1
+
+    def __init__(self, pos):
+        GameObject.__init__(self, pos)
 
-        # This is the number of points to award
-        # if the enemy is killed.
-        self.scoreValue = 1
+        # Our place in the game's batched horde, if we're in it
+        self.hordeIndex = None
 
     def update(self, player, dt):
+        self.updateLogic(player, dt)
+
+        self.updateAnimation()
+
+    def updateLogic(self, player, dt):
         # In short, update as a GameObject, then
         # run whatever enemy-specific logic is to be done.
         # The use of a separate "runLogic" method
@@ -500,102 +603,95 @@ class Enemy(GameObject):
 
         self.runLogic(player, dt)
 
+    def updateAnimation(self):
         # As with the player, play the appropriate animation.
+        # When standing, we let any "spawn" or "attack"
+        # animation finish first.
         if self.walking:
-            walkingControl = self.actor.getAnimControl("walk")
-            if not walkingControl.isPlaying():
-                self.actor.loop("walk")
+            self.animation.loop("walk")
         else:
-            spawnControl = self.actor.getAnimControl("spawn")
-            if spawnControl is None or not spawnControl.isPlaying():
-                attackControl = self.actor.getAnimControl("attack")
-                if attackControl is None or not attackControl.isPlaying():
-                    standControl = self.actor.getAnimControl("stand")
-                    if not standControl.isPlaying():
-                        self.actor.loop("stand")
+            self.animation.loopWhenFree("stand")
 
 
     def runLogic(self, player, dt):
         pass
 
 class WalkingEnemy(Enemy):
-    def __init__(self, pos):
-        Enemy.__init__(self, pos,
-                       "models/SimpleEnemy/simpleEnemy",
-                       {
-                        "stand" : "models/SimpleEnemy/simpleEnemy-stand",
-                        "walk" : "models/SimpleEnemy/simpleEnemy-walk",
-                        "attack" : "models/SimpleEnemy/simpleEnemy-attack",
-                        "die" : "models/SimpleEnemy/simpleEnemy-die",
-                        "spawn" : "models/SimpleEnemy/simpleEnemy-spawn"
-                        },
-                       3.0,
-                       7.0,
-                       "walkingEnemy")
-
-        self.actor.play("spawn")
-
-        # This "deathSound" is the one that will be used by the logic
-        self.deathSound = loader.loadSfx("sounds/enemyDie.ogg")
-        self.attackSound = loader.loadSfx("sounds/enemyAttack.ogg")
-
-        self.attackDistance = 0.75
-
-        self.acceleration = 100.0
-
-        # A reference vector, used to determine
-        # which way to face the Actor.
-        # Since the character faces along
-        # the y-direction, we use the y-axis.
-        self.yVector = Vec2(0, 1)
-
-        # Note that this is the same bit as we used for the ray!
-        mask = BitMask32()
-        mask.setBit(2)
-
-        self.collider.node().setIntoCollideMask(mask)
-
-        # Creating a "melee attack" for the walking enemy.
-        # The Player will take damage from this attack.
-
-        self.attackSegment = CollisionSegment(0, 0, 0, 1, 0, 0)
+    __slots__ = ("attackWait", "attackTimer", "healthTintLevel")
+
+    modelName = "models/SimpleEnemy/simpleEnemy"
+    modelAnims = {
+        "stand" : "models/SimpleEnemy/simpleEnemy-stand",
+        "walk" : "models/SimpleEnemy/simpleEnemy-walk",
+        "attack" : "models/SimpleEnemy/simpleEnemy-attack",
+        "die" : "models/SimpleEnemy/simpleEnemy-die",
+        "spawn" : "models/SimpleEnemy/simpleEnemy-spawn"
+    }
+    defaultMaxHealth = 3.0
+    maxSpeed = 7.0
+    colliderName = "walkingEnemy"
+
+    # This "deathSoundName" is the one that will be used by the logic
+    deathSoundName = "enemyDie"
+
+    attackDistance = 0.75
+
+    acceleration = 100.0
+
+    # A reference vector, used to determine
+    # which way to face the Actor.
+    # Since the character faces along
+    # the y-direction, we use the y-axis.
+    yVector = Vec2(0, 1)
+
+    # Note that this is the same bit as we used for the ray!
+    collideMaskBits = BitMask32.bit(2).getWord()
+
+    # Creating a "melee attack" for the walking enemy.
+    # The Player will take damage from this attack.
+    #
+    # The attack is a short line-segment, pointing forwards from
+    # the enemy, that we check against the game's spatial grid
+    # at the moment that the attack lands.
+    # Its mask matches the player's, so that
+    # the enemy's attack will hit the player-character,
+    # but not the enemy-character (or other enemies)
+    attackMaskBits = BitMask32.bit(1).getWord()
+
+    # How much damage the enemy's attack does
+    # That is, this results in the player-character's
+    # health being reduced by one.
+    attackDamage = -1
+
+    # The delay between the start of an attack,
+    # and the attack (potentially) landing
+    attackDelay = 0.3
 
-        segmentNode = CollisionNode("enemyAttackSegment")
-        segmentNode.addSolid(self.attackSegment)
-
-        # A mask that matches the player's, so that
-        # the enemy's attack will hit the player-character,
-        # but not the enemy-character (or other enemies)
-        mask = BitMask32()
-        mask.setBit(1)
-
-        segmentNode.setFromCollideMask(mask)
+    def __init__(self, pos):
+        Enemy.__init__(self, pos)
 
-        mask = BitMask32()
+        self.animation.play("spawn")
 
-        segmentNode.setIntoCollideMask(mask)
+        # How long to wait after the current attack
+        # before starting the next one
+        self.attackWait = 0
 
-        self.attackSegmentNodePath = render.attachNewNode(segmentNode)
-        self.segmentQueue = CollisionHandlerQueue()
+        # Our attacks are run by the game's scheduler: this is the
+        # timer for the next step of our attack, if we're attacking.
+        self.attackTimer = None
 
-        base.cTrav.addCollider(self.attackSegmentNodePath, self.segmentQueue)
+        # Which of the shared "healthTints" we're using
+        self.healthTintLevel = None
 
-        # How much damage the enemy's attack does
-        # That is, this results in the player-character's
-        # health being reduced by one.
-        self.attackDamage = -1
+    def isSpawning(self):
+        return self.animation.isPlaying("spawn")
 
-        # The delay between the start of an attack,
-        # and the attack (potentially) landing
-        self.attackDelay = 0.3
-        self.attackDelayTimer = 0
-        # How long to wait between attacks
-        self.attackWaitTimer = 0
+    def isAttacking(self):
+        return self.animation.isPlaying("attack")
 
     def runLogic(self, player, dt):
         # if the spawn animation is playing, we skip the other behaviour in runLogic
-        spawnControl = self.actor.getAnimControl("spawn")
-        if spawnControl is not None and spawnControl.isPlaying():
+        if self.isSpawning():
             return
         # In short: find the vector between
         # this enemy and the player.
@@ -604,69 +700,93 @@ class WalkingEnemy(Enemy):
         # Otherwise, just stop for now.
         # Finally, face the player.
 
-        vectorToPlayer = player.actor.getPos() - self.actor.getPos()
+        pos = self.actor.getPos()
+        vectorToPlayer = player.actor.getPos() - pos
 
         vectorToPlayer2D = vectorToPlayer.getXy()
         distanceToPlayer = vectorToPlayer2D.length()
 
         vectorToPlayer2D.normalize()
 
+        # If a trap is in the way, go around it, following
+        # the game's flow-field (see "FlowField.py")
+        flowDirection = base.flowField.getDirection(pos.x, pos.y)
+        if flowDirection is not None:
+            vectorToPlayer2D = Vec2(*flowDirection)
+
         heading = self.yVector.signedAngleDeg(vectorToPlayer2D)
 
         if distanceToPlayer > self.attackDistance*0.9:
-            attackControl = self.actor.getAnimControl("attack")
-            if not attackControl.isPlaying():
+            if not self.isAttacking():
                 self.walking = True
-                vectorToPlayer.setZ(0)
-                vectorToPlayer.normalize()
-                self.velocity += vectorToPlayer*self.acceleration*dt
-                self.attackWaitTimer = 0.2
-                self.attackDelayTimer = 0
+                self.velocity += Vec3(vectorToPlayer2D, 0)*self.acceleration*dt
+                self.cancelAttack()
         else:
             self.walking = False
             self.velocity.set(0, 0, 0)
 
-            # If we're waiting for an attack to land...
-            if self.attackDelayTimer > 0:
-                self.attackDelayTimer -= dt
-                # If the time has come for the attack to land...
-                if self.attackDelayTimer <= 0:
-                    # Check for a hit..
-                    if self.segmentQueue.getNumEntries() > 0:
-                        self.segmentQueue.sortEntries()
-                        segmentHit = self.segmentQueue.getEntry(0)
-
-                        hitNodePath = segmentHit.getIntoNodePath()
-                        if hitNodePath.hasPythonTag("owner"):
-                            # Apply damage!
-                            hitObject = hitNodePath.getPythonTag("owner")
-                            hitObject.alterHealth(self.attackDamage)
-                            self.attackWaitTimer = 1.0
-
-            # If we're instead waiting to be allowed to attack...
-            elif self.attackWaitTimer > 0:
-                self.attackWaitTimer -= dt
-                # If the wait has ended...
-                if self.attackWaitTimer <= 0:
-                    # Start an attack!
-                    # (And set the wait-timer to a random amount,
-                    #  to vary things a little bit.)
-                    self.attackWaitTimer = random.uniform(0.5, 0.7)
-                    self.attackDelayTimer = self.attackDelay
-                    self.actor.play("attack")
-                    self.attackSound.play()
+            self.runAttackLogic()
 
         self.actor.setH(heading)
 
-        # Set the segment's start- and end- points.
+    # Called on every frame on which we're standing next to the player.
+    # If we aren't already attacking, we start waiting to do so.
+    def runAttackLogic(self):
+        if self.attackTimer is None:
+            self.attackTimer = base.scheduler.schedule(0.2, self.startAttack)
+
+    # Called by the scheduler when the wait before an attack is over
+    def startAttack(self):
+        # Start an attack!
+        # (And decide how long to wait after it, at a random
+        #  amount, to vary things a little bit.)
+        self.attackWait = random.uniform(0.5, 0.7)
+        self.attackTimer = base.scheduler.schedule(self.attackDelay, self.landAttack)
+        self.animation.play("attack")
+        base.soundBank.play("enemyAttack", self)
+
+    # Called by the scheduler when the time has come for the attack to land
+    def landAttack(self):
+        # Check for a hit..
         # "getQuat" returns a quaternion--a representation
         # of orientation or rotation--that represents the
         # NodePath's orientation. This is useful here,
         # because Panda's quaternion class has methods to get
         # forward, right, and up vectors for that orientation.
         # Thus, what we're doing is making the segment point "forwards".
-        self.attackSegment.setPointA(self.actor.getPos())
-        self.attackSegment.setPointB(self.actor.getPos() + self.actor.getQuat().getForward() * self.attackDistance)
+        pos = self.actor.getPos()
+        attackEnd = pos + self.actor.getQuat().getForward() * self.attackDistance
+        hitObject, hitFraction = base.entityGrid.querySegment(pos.x, pos.y,
+                                                              attackEnd.x, attackEnd.y,
+                                                              self.attackMaskBits)
+        if hitObject is not None:
+            # Apply damage!
+            hitObject.alterHealth(self.attackDamage)
+            self.attackWait = 1.0
+
+        # Wait, then attack again
+        self.attackTimer = base.scheduler.schedule(self.attackWait, self.startAttack)
+
+    # Stops any attack that we're waiting to start or to land
+    def cancelAttack(self):
+        if self.attackTimer is not None:
+            base.scheduler.cancel(self.attackTimer)
+            self.attackTimer = None
+
+    def reset(self, pos):
+        Enemy.reset(self, pos)
+
+        self.updateHealthVisual()
+
+        self.animation.play("spawn")
+
+    def deactivate(self):
+        self.cancelAttack()
+        Enemy.deactivate(self)
+
+    def cleanup(self):
+        self.cancelAttack()
+        Enemy.cleanup(self)
 
     def alterHealth(self, dHealth):
         Enemy.alterHealth(self, dHealth)
@@ -676,35 +796,64 @@ class WalkingEnemy(Enemy):
         perc = self.health / self.maxHealth
         if perc < 0:
             perc = 0
-        # The parameters here are red, green, blue, and alpha
-        self.actor.setColorScale(perc, perc, perc, 1)
-
-    def cleanup(self):
-        base.cTrav.removeCollider(self.attackSegmentNodePath)
-        self.attackSegmentNodePath.removeNode()
+        # Pick the nearest of our tints, and only
+        # change our colour if it's a different one.
+        level = int(perc * (HEALTH_TINT_LEVELS - 1) + 0.5)
+        if level != self.healthTintLevel:
+            self.healthTintLevel = level
+            self.actor.setAttrib(healthTints[level])
 
-        GameObject.cleanup(self)
 class TrapEnemy(Enemy):
-    def __init__(self, pos):
-        Enemy.__init__(self, pos,
-                       "models/SlidingTrap/trap",
-                       {
-                           "stand": "models/SlidingTrap/trap-stand",
-                           "walk": "models/SlidingTrap/trap-walk",
-                       },
-                       100.0,
-                       10.0,
-                       "trapEnemy")
-
-        self.impactSound = loader.loadSfx("sounds/trapHitsSomething.ogg")
-        self.stopSound = loader.loadSfx("sounds/trapStop.ogg")
-        self.movementSound = loader.loadSfx("sounds/trapSlide.ogg")
-        self.movementSound.setLoop(True)
-
-        base.pusher.addCollider(self.collider, self.actor)
-        base.cTrav.addCollider(self.collider, base.pusher)
-
-        self.moveInX = False
+    __slots__ = ("moveInX", "lanePos", "alongPos", "previousAlongPos", "speed",
+                 "moveDirection", "ignorePlayer")
+
+    modelName = "models/SlidingTrap/trap"
+    modelAnims = {
+        "stand": "models/SlidingTrap/trap-stand",
+        "walk": "models/SlidingTrap/trap-walk",
+    }
+    defaultMaxHealth = 100.0
+    maxSpeed = 10.0
+    colliderName = "trapEnemy"
+
+    # Trap-enemies should hit both the player and "walking" enemies,
+    # so we set _both_ bits here!
+    #
+    # These bits are used by the game's spatial grid (so that the
+    # laser, for one, is stopped by us), and to tell what we can hit
+    # (see "TrapLanes.py"), which works out all of our collisions.
+    collideMaskBits = BitMask32.bit(1).getWord() | BitMask32.bit(2).getWord()
+    hitMaskBits = collideMaskBits
+
+    # The only bit left on our collider's "into"-mask: the player's,
+    # so that the player's pusher still stops the player from
+    # walking through us. (Nothing else that the traverser tests
+    # needs to hit us.)
+    intoMaskBits = BitMask32.bit(1).getWord()
+
+    def __init__(self, pos, moveInX=False):
+        Enemy.__init__(self, pos)
+
+        self.collider.node().setIntoCollideMask(BitMask32(self.intoMaskBits))
+
+        self.placeInLane(pos, moveInX)
+
+    def placeInLane(self, pos, moveInX):
+        # We only ever slide back and forth along our "lane"--a line
+        # along the x-axis if "moveInX" is set, or along the y-axis
+        # otherwise. So rather than a position and velocity in 3D, we
+        # keep where our lane is ("lanePos", across it), where we are
+        # along it, and our speed along it. (The game's "TrapLanes"
+        # handles our collisions.)
+        self.moveInX = moveInX
+        if moveInX:
+            self.lanePos = pos.y
+            self.alongPos = pos.x
+        else:
+            self.lanePos = pos.x
+            self.alongPos = pos.y
+        self.previousAlongPos = self.alongPos
+        self.speed = 0
 
         self.moveDirection = 0
 
@@ -712,45 +861,58 @@ class TrapEnemy(Enemy):
         # collisions with the player during movement
         self.ignorePlayer = False
 
-        # Trap-enemies should hit both the player and "walking" enemies,
-        # so we set _both_ bits here!
-        mask = BitMask32()
-        mask.setBit(2)
-        mask.setBit(1)
-
-        self.collider.node().setIntoCollideMask(mask)
+    # Much as GameObject.update and our "runLogic" once did, but
+    # along our lane only. We don't move our Actor here: "TrapLanes"
+    # does that, once it's checked what we've run into.
+    def updateLogic(self, player, dt):
+        speed = self.speed
+        if speed > self.maxSpeed:
+            speed = self.maxSpeed
+        elif speed < -self.maxSpeed:
+            speed = -self.maxSpeed
 
-        mask = BitMask32()
-        mask.setBit(2)
-        mask.setBit(1)
+        if not self.walking:
+            frictionVal = FRICTION*dt
+            if frictionVal > abs(speed):
+                speed = 0
+            else:
+                speed -= math.copysign(frictionVal, speed)
 
-        self.collider.node().setFromCollideMask(mask)
+        self.previousAlongPos = self.alongPos
+        self.alongPos += speed*dt
 
-    def runLogic(self, player, dt):
         if self.moveDirection != 0:
             self.walking = True
-            if self.moveInX:
-                self.velocity.addX(self.moveDirection * self.acceleration * dt)
-            else:
-                self.velocity.addY(self.moveDirection * self.acceleration * dt)
+            speed += self.moveDirection * self.acceleration * dt
         else:
             self.walking = False
-            diff = player.actor.getPos() - self.actor.getPos()
-            if self.moveInX:
-                detector = diff.y
-                movement = diff.x
-            else:
-                detector = diff.x
-                movement = diff.y
 
-            if abs(detector) < 0.5:
-                self.moveDirection = math.copysign(1, movement)
-                self.movementSound.play()
+        self.speed = speed
+
+    # Called by "TrapLanes" when the player steps into our lane
+    def startSliding(self, direction):
+        self.moveDirection = direction
+        base.soundBank.play("trapSlide", self)
+
+    # Puts our Actor where we are in our lane
+    def applyLanePosition(self):
+        if self.moveInX:
+            self.actor.setPos(self.alongPos, self.lanePos, 0)
+        else:
+            self.actor.setPos(self.lanePos, self.alongPos, 0)
 
     def alterHealth(self, dHealth):
         pass
 
+    def reset(self, pos, moveInX=False):
+        Enemy.reset(self, pos)
+        self.placeInLane(pos, moveInX)
+
+    def deactivate(self):
+        base.soundBank.stop("trapSlide", self)
+        Enemy.deactivate(self)
+
     def cleanup(self):
-        self.movementSound.stop()
+        base.soundBank.stop("trapSlide", self)
 
         Enemy.cleanup(self)
\ No newline at end of file
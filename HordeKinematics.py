@@ -0,0 +1,178 @@
+import numpy as np
+
+from GameObject import FRICTION
+
+
+# Updating each walking enemy on its own means running a fair bit
+# of Python--and building a handful of temporary vectors--for every
+# enemy on every frame. Instead, we keep the position, velocity and
+# so on of every live walking enemy in a set of NumPy arrays, and
+# move the whole horde at once.
+#
+# The results are the same as those of "Enemy.updateLogic"--that is,
+# "GameObject.update" followed by "WalkingEnemy.runLogic"; only the
+# bookkeeping is different. (As with "updateLogic", animations
+# are left for the game to update afterwards.)
+# While an enemy is part of the horde, these arrays--not the enemy's
+# own "velocity" and "walking"--hold its movement-state.
+#
+# If we're given a flow-field (see "FlowField.py"), enemies whose way
+# to the player is blocked by a trap follow it, just as in "runLogic".
+# If we're given a crowd-separation (see "CrowdSeparation.py"), the
+# enemies are pushed apart once they've moved.
+class HordeKinematics:
+    def __init__(self, flowField=None, separation=None, capacity=32):
+        self.flowField = flowField
+        self.separation = separation
+        self.enemies = []
+
+        self.positions = np.zeros((capacity, 3))
+        self.velocities = np.zeros((capacity, 3))
+        self.maxSpeeds = np.zeros(capacity)
+        self.accelerations = np.zeros(capacity)
+        self.attackDistances = np.zeros(capacity)
+        self.walking = np.zeros(capacity, dtype=bool)
+
+    def __len__(self):
+        return len(self.enemies)
+
+    def grow(self):
+        capacity = len(self.maxSpeeds) * 2
+        self.positions = np.resize(self.positions, (capacity, 3))
+        self.velocities = np.resize(self.velocities, (capacity, 3))
+        self.maxSpeeds = np.resize(self.maxSpeeds, capacity)
+        self.accelerations = np.resize(self.accelerations, capacity)
+        self.attackDistances = np.resize(self.attackDistances, capacity)
+        self.walking = np.resize(self.walking, capacity)
+
+    def add(self, enemy):
+        index = len(self.enemies)
+        if index == len(self.maxSpeeds):
+            self.grow()
+
+        self.enemies.append(enemy)
+        enemy.hordeIndex = index
+
+        self.positions[index] = enemy.actor.getPos()
+        self.velocities[index] = enemy.velocity
+        self.maxSpeeds[index] = enemy.maxSpeed
+        self.accelerations[index] = enemy.acceleration
+        self.attackDistances[index] = enemy.attackDistance
+        self.walking[index] = enemy.walking
+
+    def remove(self, enemy):
+        index = enemy.hordeIndex
+        lastIndex = len(self.enemies) - 1
+
+        # Hand our movement-state back to the enemy itself
+        enemy.velocity.set(*self.velocities[index])
+        enemy.walking = bool(self.walking[index])
+        enemy.hordeIndex = None
+
+        # Move the last enemy into the gap that's left,
+        # so that our arrays stay packed.
+        if index != lastIndex:
+            lastEnemy = self.enemies[lastIndex]
+            self.enemies[index] = lastEnemy
+            lastEnemy.hordeIndex = index
+
+            self.positions[index] = self.positions[lastIndex]
+            self.velocities[index] = self.velocities[lastIndex]
+            self.maxSpeeds[index] = self.maxSpeeds[lastIndex]
+            self.accelerations[index] = self.accelerations[lastIndex]
+            self.attackDistances[index] = self.attackDistances[lastIndex]
+            self.walking[index] = self.walking[lastIndex]
+
+        self.enemies.pop()
+
+    def update(self, player, dt):
+        numEnemies = len(self.enemies)
+        if numEnemies == 0:
+            return
+
+        positions = self.positions[:numEnemies]
+        velocities = self.velocities[:numEnemies]
+        maxSpeeds = self.maxSpeeds[:numEnemies]
+        walking = self.walking[:numEnemies]
+
+        # First, as "GameObject.update" does:
+        # Limit our speeds to our maximum speeds...
+        speeds = np.sqrt(np.einsum("ij,ij->i", velocities, velocities))
+        tooFast = speeds > maxSpeeds
+        velocities[tooFast] *= (maxSpeeds[tooFast] / speeds[tooFast])[:, None]
+        speeds[tooFast] = maxSpeeds[tooFast]
+
+        # ... apply friction to those that aren't walking...
+        frictionVal = FRICTION*dt
+        stopping = ~walking & (frictionVal > speeds)
+        slowing = ~walking & ~stopping & (speeds > 0)
+        velocities[stopping] = 0
+        velocities[slowing] *= (1.0 - frictionVal / speeds[slowing])[:, None]
+
+        # ... and move.
+        positions += velocities*dt
+
+        # Next, as "WalkingEnemy.runLogic" does, find
+        # the vector from each enemy to the player.
+        playerPos = player.actor.getPos()
+        vectorsToPlayer = np.array((playerPos.x, playerPos.y)) - positions[:, :2]
+        distancesToPlayer = np.sqrt(np.einsum("ij,ij->i", vectorsToPlayer, vectorsToPlayer))
+        directions = np.zeros_like(vectorsToPlayer)
+        np.divide(vectorsToPlayer, distancesToPlayer[:, None], out=directions,
+                  where=distancesToPlayer[:, None] > 0)
+
+        # Those with a trap in the way go around it instead
+        if self.flowField is not None:
+            following, flowX, flowY = self.flowField.getDirections(positions)
+            directions[following, 0] = flowX[following]
+            directions[following, 1] = flowY[following]
+
+        # This is the same angle that "Vec2.signedAngleDeg"
+        # finds between the y-axis and our direction
+        headings = np.degrees(np.arctan2(-directions[:, 0], directions[:, 1]))
+
+        farFromPlayer = distancesToPlayer > self.attackDistances[:numEnemies]*0.9
+
+        # Which enemies are busy spawning or attacking is a
+        # question for their animations, so we ask each enemy.
+        spawning = np.zeros(numEnemies, dtype=bool)
+        attacking = np.zeros(numEnemies, dtype=bool)
+        for index, enemy in enumerate(self.enemies):
+            if enemy.isSpawning():
+                spawning[index] = True
+            elif farFromPlayer[index]:
+                attacking[index] = enemy.isAttacking()
+
+        # Those that are far from the player, and not
+        # in the middle of an attack, walk towards the player.
+        chasing = ~spawning & farFromPlayer & ~attacking
+        walking[chasing] = True
+        velocities[chasing, :2] += directions[chasing]*(self.accelerations[:numEnemies][chasing]*dt)[:, None]
+
+        # Those that are close to the player stop, and attack.
+        attackingPlayer = ~spawning & ~farFromPlayer
+        walking[attackingPlayer] = False
+        velocities[attackingPlayer] = 0
+
+        # Keep the enemies from piling up on one another
+        if self.separation is not None:
+            self.separation.apply(positions)
+
+        # Finally, hand the results back to the enemies
+        # and their Actors.
+        for index, (x, y, z), heading, isSpawning, isChasing, isAttackingPlayer, isWalking in zip(
+                range(numEnemies), positions.tolist(), headings.tolist(),
+                spawning.tolist(), chasing.tolist(), attackingPlayer.tolist(), walking.tolist()):
+            enemy = self.enemies[index]
+            enemy.walking = isWalking
+
+            if isSpawning:
+                enemy.actor.setPos(x, y, z)
+            else:
+                enemy.actor.setPosHpr(x, y, z, heading, 0, 0)
+
+                if isChasing:
+                    if enemy.attackTimer is not None:
+                        enemy.cancelAttack()
+                elif isAttackingPlayer:
+                    enemy.runAttackLogic()
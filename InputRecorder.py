@@ -0,0 +1,95 @@
+import struct
+import zlib
+
+from panda3d.core import Point3
+
+
+# Recording a game, so that it can be played back exactly.
+#
+# Everything that makes one game differ from another is:
+#  - the random seed (which decides spawn-points, trap-slots and so on),
+#  - when each frame happened (which decides "dt", and how far along
+#    each animation is),
+#  - which keys were held, and
+#  - where the player was aiming.
+# So we record the seed once, at the start of a game, and then the
+# rest once per frame. Played back with the same code, the game
+# then unfolds exactly as it did the first time--slowdowns and all.
+#
+# The file is a small header followed by one fixed-size record per
+# frame, the whole compressed with zlib (since most frames are
+# much like the one before).
+
+MAGIC = b"HRDR"
+VERSION = 1
+
+# Magic, version, seed, and the frame-time at which the game started
+HEADER_FORMAT = "<4sHQd"
+# Frame-time, dt, held keys (one bit each), and the point aimed at
+FRAME_FORMAT = "<ddBfff"
+
+# The order of the bits in each frame's "held keys"
+KEY_NAMES = ["up", "down", "left", "right", "shoot"]
+
+
+class InputRecorder:
+    def __init__(self, fileName):
+        self.fileName = fileName
+        self.data = None
+        self.numFrames = 0
+
+    def isRecording(self):
+        return self.data is not None
+
+    # Starts a new recording, discarding any that wasn't saved
+    def begin(self, seed, startFrameTime):
+        self.data = bytearray(struct.pack(HEADER_FORMAT, MAGIC, VERSION, seed, startFrameTime))
+        self.numFrames = 0
+
+    def recordFrame(self, frameTime, dt, keyMap, aimPos):
+        keyBits = 0
+        for bit, name in enumerate(KEY_NAMES):
+            if keyMap[name]:
+                keyBits |= 1 << bit
+        self.data += struct.pack(FRAME_FORMAT, frameTime, dt, keyBits, aimPos.x, aimPos.y, aimPos.z)
+        self.numFrames += 1
+
+    # Writes the recording to our file, and stops recording
+    def save(self):
+        if self.data is None:
+            return
+        with open(self.fileName, "wb") as f:
+            f.write(zlib.compress(bytes(self.data)))
+        self.data = None
+
+
+class InputReplay:
+    def __init__(self, fileName):
+        with open(fileName, "rb") as f:
+            data = zlib.decompress(f.read())
+
+        headerSize = struct.calcsize(HEADER_FORMAT)
+        magic, version, self.seed, self.startFrameTime = struct.unpack_from(HEADER_FORMAT, data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(fileName + " is not a recording that we can play back")
+
+        # Each frame is a tuple of (frame-time, dt, key-bits, aim-x, aim-y, aim-z)
+        self.frames = list(struct.iter_unpack(FRAME_FORMAT, data[headerSize:]))
+        self.nextFrameIndex = 0
+
+    def __len__(self):
+        return len(self.frames)
+
+    def isFinished(self):
+        return self.nextFrameIndex >= len(self.frames)
+
+    # Returns the next frame, as a tuple of
+    # (frame-time, dt, key-map, point aimed at)
+    def nextFrame(self):
+        frameTime, dt, keyBits, aimX, aimY, aimZ = self.frames[self.nextFrameIndex]
+        self.nextFrameIndex += 1
+
+        keyMap = {}
+        for bit, name in enumerate(KEY_NAMES):
+            keyMap[name] = keyBits & (1 << bit) != 0
+        return frameTime, dt, keyMap, Point3(aimX, aimY, aimZ)
@@ -0,0 +1,133 @@
+from panda3d.core import PointLight, TextNode, Vec4
+from direct.gui.OnscreenText import OnscreenText
+from direct.gui.OnscreenImage import OnscreenImage
+
+from AssetCache import assetCache
+
+
+# The models, light and HUD that go with the player-character: the
+# laser-beam, the beam's hit-flash and its light, the flash shown when
+# the player is hurt, the score and the row of health-icons.
+#
+# There's only ever one player at a time, so rather than building all
+# of this afresh for every game (and having to be sure of removing all
+# of it again afterwards), we build it just once, and each new Player
+# borrows it via "attach" and hands it back via "detach".
+class PlayerPrefab:
+    def __init__(self, numHealthIcons):
+        # A nice laser-beam model to show our laser
+        self.beamModel = loader.loadModel(assetCache.getModelName("models/BambooLaser/bambooLaser"))
+        self.beamModel.setZ(1.5)
+        # This prevents lights from affecting this particular node
+        self.beamModel.setLightOff()
+
+        # A hit-flash will appear when the walking enemy will get hit with the laser.
+        self.beamHitModel = loader.loadModel(assetCache.getModelName("models/BambooLaser/bambooLaserHit"))
+        self.beamHitModel.setZ(1.5)
+        self.beamHitModel.setLightOff()
+
+        self.beamHitLight = PointLight("beamHitLight")
+        # These "attenuation" values govern how the light
+        # fades with distance. They are, respectively,
+        # the constant, linear, and quadratic coefficients
+        # of the light's falloff equation.
+        # I experimented until I found values that
+        # looked nice.
+        self.beamHitLight.setAttenuation((1.0, 0.1, 0.5))
+        self.beamHitLightNodePath = render.attachNewNode(self.beamHitLight)
+
+        # Apply the beam-hit light to the scene once, for good.
+        #
+        # Adding a light to--or removing a light from--the scene changes
+        # the set of lights on everything in it, and with "setShaderAuto"
+        # each new set of lights may mean new shaders being generated.
+        # Doing that every time the laser starts or stops hitting
+        # something (or every time that a game starts) causes hitches.
+        # So instead, the light stays in the scene, and we turn it
+        # "off" by making it black.
+        self.beamHitLight.setColor(Vec4(0, 0, 0, 1))
+        render.setLight(self.beamHitLightNodePath)
+
+        # displaying damage taken by the Player
+        self.damageTakenModel = loader.loadModel(assetCache.getModelName("models/BambooLaser/playerHit"))
+        self.damageTakenModel.setLightOff()
+        self.damageTakenModel.setZ(1.0)
+
+        # Displaying Player's score and health.
+        # Player's health will be displayed as a row of heart icons.
+        self.scoreUI = OnscreenText(text="0",
+                                    pos=(-1.3, 0.825),
+                                    mayChange=True,
+                                    align=TextNode.ALeft,
+                                    font=base.font)
+
+        self.healthIcons = []
+        for i in range(numHealthIcons):
+            icon = OnscreenImage(image="models/UI/health.png",
+                                 pos=(-1.275 + i * 0.075, 0, 0.95),
+                                 scale=0.04)
+            # Since our icons have transparent regions,
+            # we'll activate transparency.
+            icon.setTransparency(True)
+            self.healthIcons.append(icon)
+
+        # The Player that has us, if any
+        self.player = None
+
+        self.detach()
+
+    # Hands everything to the given Player, as it would be
+    # at the start of a game
+    def attach(self, player):
+        if self.player is not None:
+            self.detach()
+        self.player = player
+
+        self.beamModel.reparentTo(player.actor)
+        self.beamModel.setSy(1)
+        # We don't start out firing the laser, so
+        # we have it initially hidden.
+        self.beamModel.hide()
+
+        self.beamHitModel.reparentTo(render)
+        self.beamHitModel.hide()
+
+        self.beamHitLight.setColor(Vec4(0, 0, 0, 1))
+
+        self.damageTakenModel.reparentTo(player.actor)
+        self.damageTakenModel.setScale(1)
+        self.damageTakenModel.hide()
+
+        self.scoreUI.setText("0")
+        self.scoreUI.show()
+        for icon in self.healthIcons:
+            icon.show()
+
+    # Takes everything back out of the game, until
+    # the next Player is attached
+    def detach(self):
+        self.player = None
+
+        self.beamModel.detachNode()
+        self.beamHitModel.detachNode()
+        self.beamHitLight.setColor(Vec4(0, 0, 0, 1))
+        self.damageTakenModel.detachNode()
+
+        self.scoreUI.hide()
+        for icon in self.healthIcons:
+            icon.hide()
+
+    def cleanup(self):
+        self.player = None
+
+        self.beamModel.removeNode()
+        self.beamHitModel.removeNode()
+        self.damageTakenModel.removeNode()
+
+        render.clearLight(self.beamHitLightNodePath)
+        self.beamHitLightNodePath.removeNode()
+
+        self.scoreUI.destroy()
+        for icon in self.healthIcons:
+            icon.destroy()
+        self.healthIcons = []
@@ -0,0 +1,117 @@
+from direct.showbase.ShowBaseGlobal import globalClock
+
+
+# All of the game's countdowns--when to spawn the next enemy, when an
+# enemy's attack lands, when a corpse can be cleared away, and so on--
+# are kept here, rather than being counted down by hand, every frame,
+# by every object that has one.
+#
+# Instead, whoever wants something done later hands us the time at
+# which it should happen, and a method to call then. We keep these
+# "timers" in a "timer-wheel": a ring of slots, each covering a short
+# span of time ("resolution" seconds), into which each timer is put
+# according to when it's due. Each frame, we look only in the slots
+# whose time has come, so the cost of a frame depends on how many
+# timers are due, not on how many there are.
+#
+# A timer more than a full turn of the wheel away simply waits in its
+# slot for another turn or so; with the default settings, a turn of
+# the wheel is a little over eight seconds, which is longer than
+# almost all of our timers.
+class Scheduler:
+    def __init__(self, resolution=1.0 / 60.0, numSlots=512):
+        self.resolution = resolution
+        self.slots = [[] for i in range(numSlots)]
+
+        # The first slot that we haven't yet finished with. (The slot
+        # holding the current time is looked at again on the next update,
+        # since timers later in its span of time may not yet be due.)
+        self.nextTick = None
+
+        # How many timers are waiting to go off, and how many
+        # went off during the last update
+        self.numPending = 0
+        self.numFired = 0
+
+    # Calls "callback(*args)" once "delay" seconds have passed.
+    # Returns the timer, which may be handed to "cancel".
+    def schedule(self, delay, callback, *args):
+        return self.scheduleAt(globalClock.getFrameTime() + delay, callback, *args)
+
+    # Calls "callback(*args)" on the first update at or after "time"
+    def scheduleAt(self, time, callback, *args):
+        # Each timer is a list of [time, callback, args];
+        # a cancelled timer has no callback.
+        timer = [time, callback, args]
+
+        tick = int(time // self.resolution)
+        # If that slot's time has already passed, the
+        # timer goes in the next slot that we'll look at.
+        if self.nextTick is not None and tick < self.nextTick:
+            tick = self.nextTick
+        self.slots[tick % len(self.slots)].append(timer)
+
+        self.numPending += 1
+        return timer
+
+    # Whether a timer has yet to go off (that is, it's
+    # neither gone off already nor been cancelled)
+    def isPending(self, timer):
+        return timer[1] is not None
+
+    # Stops a timer from going off. (It stays in its slot until
+    # we next look there, but is then simply dropped.)
+    def cancel(self, timer):
+        if self.isPending(timer):
+            timer[1] = None
+            timer[2] = None
+            self.numPending -= 1
+
+    # Calls the callbacks of all timers that are due by "now"
+    def update(self, now):
+        currentTick = int(now // self.resolution)
+        if self.nextTick is None:
+            self.nextTick = currentTick
+
+        numSlots = len(self.slots)
+        # If a lot of time has passed, we needn't look at
+        # any slot more than once.
+        firstTick = max(self.nextTick, currentTick - numSlots + 1)
+
+        # Timers scheduled by the callbacks below for a time that's
+        # already past go into the current slot, to be called next update.
+        self.nextTick = currentTick
+
+        numFired = 0
+        for tick in range(firstTick, currentTick + 1):
+            index = tick % numSlots
+            slot = self.slots[index]
+            if len(slot) == 0:
+                continue
+
+            self.slots[index] = []
+            for timer in slot:
+                time, callback, args = timer
+                if callback is None:
+                    continue
+                if time <= now:
+                    timer[1] = None
+                    timer[2] = None
+                    self.numPending -= 1
+                    numFired += 1
+                    callback(*args)
+                else:
+                    self.slots[index].append(timer)
+
+        self.numFired = numFired
+
+    # Forgets all timers
+    def clear(self):
+        for slot in self.slots:
+            for timer in slot:
+                timer[1] = None
+                timer[2] = None
+            slot.clear()
+        self.nextTick = None
+        self.numPending = 0
+        self.numFired = 0
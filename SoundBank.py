@@ -0,0 +1,71 @@
+from direct.showbase.ShowBaseGlobal import globalClock
+from panda3d.core import AudioSound
+
+
+# Rather than having every enemy and trap load its own copies
+# of its sound-effects, all of our sounds are loaded once, here.
+#
+# Each sound gets a small, fixed number of "voices"--sound-objects
+# that can play at the same time. If all of a sound's voices are
+# already playing when we ask for another, we cut off the voice that
+# started playing the longest time ago, and use that one. This way,
+# twenty enemies attacking at once still only play a handful of
+# attack-sounds, and spawning more enemies loads no more sounds.
+class SoundBank:
+    def __init__(self, loader):
+        self.loader = loader
+
+        # For each sound-name, a list of voices. Each voice is a list of
+        # [sound-object, owner, time at which it started playing]
+        self.voices = {}
+
+    def register(self, name, fileName, numVoices=1, loop=False):
+        voices = []
+        for i in range(numVoices):
+            # The audio-manager keeps the decoded data for each file,
+            # so only the first of these actually decodes anything.
+            sound = self.loader.loadSfx(fileName)
+            sound.setLoop(loop)
+            voices.append([sound, None, 0])
+        self.voices[name] = voices
+
+    # Returns the first voice of the given sound--useful for things
+    # like GUI-buttons, which want a sound-object of their own to play
+    def getSound(self, name):
+        return self.voices[name][0][0]
+
+    # Plays the given sound on behalf of "owner", which may be used
+    # later to stop that sound (for example, a looping sound).
+    def play(self, name, owner=None):
+        voices = self.voices[name]
+
+        chosenVoice = None
+        for voice in voices:
+            if voice[0].status() != AudioSound.PLAYING:
+                chosenVoice = voice
+                break
+
+        if chosenVoice is None:
+            # All of our voices are busy, so cut off the oldest one
+            chosenVoice = voices[0]
+            for voice in voices:
+                if voice[2] < chosenVoice[2]:
+                    chosenVoice = voice
+            chosenVoice[0].stop()
+
+        chosenVoice[1] = owner
+        chosenVoice[2] = globalClock.getFrameTime()
+        chosenVoice[0].play()
+
+    # Stops any voices of the given sound that are playing on behalf
+    # of "owner". If a voice has since been taken over by someone else,
+    # it's left alone.
+    def stop(self, name, owner=None):
+        for voice in self.voices[name]:
+            if voice[1] is owner and voice[0].status() == AudioSound.PLAYING:
+                voice[0].stop()
+
+    def stopAll(self):
+        for voices in self.voices.values():
+            for voice in voices:
+                voice[0].stop()
@@ -0,0 +1,239 @@
+import math
+
+
+# A uniform grid of square cells, each holding the entities whose
+# collision-spheres overlap it. We rebuild it once per frame, after
+# which questions like "what does this short line hit?" only need
+# to look at the handful of entities in the cells that the line
+# passes through, rather than at every entity in the game.
+#
+# As with Panda's collision-system, every entity has an "into"-mask,
+# and each query has a "from"-mask; a query only finds those
+# entities whose mask shares at least one bit with its own.
+# (These masks are plain integers, with the same bits as the
+# BitMask32s on our colliders.)
+class SpatialGrid:
+    def __init__(self, cellSize):
+        self.cellSize = cellSize
+
+        # Keyed by (cell-x, cell-y); each cell is a list of
+        # entries of the form (owner, x, y, radius, mask)
+        self.cells = {}
+
+        # How many queries have been made, and how many
+        # entities those queries have tested, since the last "clear"
+        self.numQueries = 0
+        self.numTests = 0
+
+    def clear(self):
+        self.cells.clear()
+        self.numQueries = 0
+        self.numTests = 0
+
+    def insert(self, owner, x, y, radius, mask):
+        entry = (owner, x, y, radius, mask)
+
+        cellSize = self.cellSize
+        minCellX = math.floor((x - radius) / cellSize)
+        maxCellX = math.floor((x + radius) / cellSize)
+        minCellY = math.floor((y - radius) / cellSize)
+        maxCellY = math.floor((y + radius) / cellSize)
+
+        cells = self.cells
+        for cellX in range(minCellX, maxCellX + 1):
+            for cellY in range(minCellY, maxCellY + 1):
+                cell = cells.get((cellX, cellY))
+                if cell is None:
+                    cells[(cellX, cellY)] = [entry]
+                else:
+                    cell.append(entry)
+
+    # Returns all of the entries in the cells overlapped by the
+    # given rectangle, without repeats
+    def entriesInRect(self, minX, minY, maxX, maxY):
+        cellSize = self.cellSize
+        minCellX = math.floor(minX / cellSize)
+        maxCellX = math.floor(maxX / cellSize)
+        minCellY = math.floor(minY / cellSize)
+        maxCellY = math.floor(maxY / cellSize)
+
+        if minCellX == maxCellX and minCellY == maxCellY:
+            return self.cells.get((minCellX, minCellY), ())
+
+        entries = []
+        seen = set()
+        for cellX in range(minCellX, maxCellX + 1):
+            for cellY in range(minCellY, maxCellY + 1):
+                for entry in self.cells.get((cellX, cellY), ()):
+                    if id(entry) not in seen:
+                        seen.add(id(entry))
+                        entries.append(entry)
+        return entries
+
+    # Finds the nearest entity whose sphere is touched by the
+    # line-segment from (ax, ay) to (bx, by).
+    # Returns the owner of that entity and the fraction of the way
+    # along the segment at which it was hit, or (None, None).
+    def querySegment(self, ax, ay, bx, by, mask):
+        self.numQueries += 1
+
+        dx = bx - ax
+        dy = by - ay
+
+        entries = self.entriesInRect(min(ax, bx), min(ay, by), max(ax, bx), max(ay, by))
+
+        nearestOwner = None
+        nearestT = None
+        for owner, x, y, radius, entryMask in entries:
+            if entryMask & mask == 0:
+                continue
+            self.numTests += 1
+
+            t = segmentHitsCircle(ax, ay, dx, dy, x, y, radius)
+            if t is not None and t <= 1.0 and (nearestT is None or t < nearestT):
+                nearestOwner = owner
+                nearestT = t
+
+        return nearestOwner, nearestT
+
+    # Finds the nearest entity whose sphere is hit by the ray from
+    # (ox, oy) in the (normalised) direction (dx, dy), no further
+    # away than "maxDistance".
+    # Returns the owner of that entity and its distance along
+    # the ray, or (None, None).
+    def queryRay(self, ox, oy, dx, dy, maxDistance, mask):
+        self.numQueries += 1
+
+        cellSize = self.cellSize
+        cellX = math.floor(ox / cellSize)
+        cellY = math.floor(oy / cellSize)
+
+        # We walk along the ray one cell at a time. "tMaxX" is how far
+        # along the ray we go before crossing into the next column of
+        # cells, and "tDeltaX" how far it is across a whole column;
+        # likewise for "tMaxY", "tDeltaY" and rows.
+        if dx > 0:
+            stepX = 1
+            tMaxX = ((cellX + 1) * cellSize - ox) / dx
+            tDeltaX = cellSize / dx
+        elif dx < 0:
+            stepX = -1
+            tMaxX = (cellX * cellSize - ox) / dx
+            tDeltaX = -cellSize / dx
+        else:
+            stepX = 0
+            tMaxX = math.inf
+            tDeltaX = math.inf
+
+        if dy > 0:
+            stepY = 1
+            tMaxY = ((cellY + 1) * cellSize - oy) / dy
+            tDeltaY = cellSize / dy
+        elif dy < 0:
+            stepY = -1
+            tMaxY = (cellY * cellSize - oy) / dy
+            tDeltaY = -cellSize / dy
+        else:
+            stepY = 0
+            tMaxY = math.inf
+            tDeltaY = math.inf
+
+        nearestOwner = None
+        nearestT = None
+        cells = self.cells
+        while True:
+            for owner, x, y, radius, entryMask in cells.get((cellX, cellY), ()):
+                if entryMask & mask == 0:
+                    continue
+                self.numTests += 1
+
+                t = segmentHitsCircle(ox, oy, dx, dy, x, y, radius)
+                if t is not None and t <= maxDistance and (nearestT is None or t < nearestT):
+                    nearestOwner = owner
+                    nearestT = t
+
+            # Anything that we haven't yet found is further along the
+            # ray than the end of this cell, so if we've already
+            # found something before that point, we're done.
+            cellExit = min(tMaxX, tMaxY)
+            if (nearestT is not None and nearestT <= cellExit) or cellExit > maxDistance:
+                break
+
+            if tMaxX < tMaxY:
+                cellX += stepX
+                tMaxX += tDeltaX
+            else:
+                cellY += stepY
+                tMaxY += tDeltaY
+
+        return nearestOwner, nearestT
+
+
+# Where along the line "(ax, ay) + t*(dx, dy)" the line first
+# touches the given circle, or None if it never does for t >= 0.
+# If the line starts inside the circle, that's a hit at t = 0.
+def segmentHitsCircle(ax, ay, dx, dy, x, y, radius):
+    fx = ax - x
+    fy = ay - y
+
+    a = dx*dx + dy*dy
+    c = fx*fx + fy*fy - radius*radius
+    if c <= 0:
+        return 0.0
+    if a == 0:
+        return None
+
+    b = fx*dx + fy*dy
+    discriminant = b*b - a*c
+    if discriminant < 0:
+        return None
+
+    t = (-b - math.sqrt(discriminant)) / a
+    if t < 0:
+        return None
+    return t
+
+
+# Where along the ray from (ox, oy) in the (normalised) direction
+# (dx, dy) the ray first touches a "capsule"--a line-segment from
+# (ax, ay) to (bx, by), thickened by "radius"--or None if it never does.
+# (Seen from above, this is what a CollisionTube looks like.)
+def rayHitsCapsule(ox, oy, dx, dy, ax, ay, bx, by, radius):
+    nearestT = None
+
+    # The capsule's rounded ends...
+    for x, y in ((ax, ay), (bx, by)):
+        t = segmentHitsCircle(ox, oy, dx, dy, x, y, radius)
+        if t is not None and (nearestT is None or t < nearestT):
+            nearestT = t
+
+    # ... and its two straight sides
+    sx = bx - ax
+    sy = by - ay
+    length = math.sqrt(sx*sx + sy*sy)
+    if length > 0:
+        sx /= length
+        sy /= length
+        # The normal to the segment
+        nx = -sy
+        ny = sx
+
+        # How far the ray's origin is from the segment's line,
+        # and how quickly the ray approaches that line
+        distance = (ox - ax)*nx + (oy - ay)*ny
+        approach = dx*nx + dy*ny
+        if abs(distance) <= radius:
+            # We start between the sides; if we're also
+            # between the ends, we start inside the capsule.
+            along = (ox - ax)*sx + (oy - ay)*sy
+            if 0 <= along <= length:
+                return 0.0
+        elif approach != 0:
+            side = radius if distance > 0 else -radius
+            t = (side - distance) / approach
+            if t >= 0:
+                along = (ox + dx*t - ax)*sx + (oy + dy*t - ay)*sy
+                if 0 <= along <= length and (nearestT is None or t < nearestT):
+                    nearestT = t
+
+    return nearestT
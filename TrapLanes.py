@@ -0,0 +1,388 @@
+import bisect
+import math
+
+
+# A little closer than this counts as touching
+TOUCH_TOLERANCE = 0.0001
+
+
+# Our traps only ever slide back and forth along fixed "lanes", each
+# a line across the room--along the x-axis or the y-axis--that's set
+# when the trap is placed. So rather than handing every trap to the
+# collision-traverser, we keep the traps sorted by lane, and by where
+# they are along their lanes, and work out what they touch directly:
+#
+# * A trap in the player's lane is found by looking up the player's
+#   position in our sorted list of lanes.
+# * Two traps in the same lane can't pass each other, so a trap can
+#   only run into the next trap along, or (at the ends) a wall.
+# * A trap can also run into a trap in a crossing lane, or in a lane
+#   alongside its own that's close enough for the two to touch; these
+#   lanes are again found in our sorted lists.
+# * The player and walking enemies that a trap sweeps over
+#   are found in the game's spatial grid.
+#
+# Each contact is handed to the game's collision-dispatch, which calls
+# the game's handlers for it, just as for the traverser's contacts.
+class TrapLanes:
+    def __init__(self, dispatch, grid, wallDistance, playerRange=0.5):
+        self.dispatch = dispatch
+        self.grid = grid
+
+        # How far the inside faces of the walls are from
+        # the middle of the room
+        self.wallDistance = wallDistance
+
+        # How close to a trap's lane the player must come
+        # for the trap to start sliding
+        self.playerRange = playerRange
+
+        # Two sets of lanes: [0] for traps that move in x (whose lanes
+        # are known by their y-positions), and [1] for those that move
+        # in y (whose lanes are known by their x-positions). Each has
+        # its lanes' positions, in order, and for each of those, its
+        # traps, in order along the lane.
+        self.lanePositions = ([], [])
+        self.laneTraps = ([], [])
+
+        self.traps = []
+        self.trapSet = set()
+        self.maxTrapRadius = 0
+
+        # Pairs of traps in different lanes that were touching on
+        # the last frame; we check that they still are, even if
+        # neither has moved.
+        self.laneContacts = []
+
+        # Traps that were held still by something that they touched
+        # while trying to slide, and so were stopped, by the direction
+        # in which they were held. Such a trap isn't started off in
+        # that direction again until it's no longer touching anything.
+        self.heldTraps = {}
+
+        # For the last update: how many traps moved, and how many
+        # walking enemies (or the player) were tested against them
+        self.numMovingTraps = 0
+        self.numEntityTests = 0
+
+    def add(self, trap):
+        # A trap placed partly inside a wall is moved out of it
+        limit = self.wallDistance - trap.colliderRadius
+        trap.lanePos = min(max(trap.lanePos, -limit), limit)
+        trap.alongPos = min(max(trap.alongPos, -limit), limit)
+        self.separate(trap)
+        trap.previousAlongPos = trap.alongPos
+        trap.applyLanePosition()
+
+        axis = 0 if trap.moveInX else 1
+        positions = self.lanePositions[axis]
+        lanes = self.laneTraps[axis]
+
+        index = bisect.bisect_left(positions, trap.lanePos)
+        if index == len(positions) or positions[index] != trap.lanePos:
+            positions.insert(index, trap.lanePos)
+            lanes.insert(index, [])
+
+        lane = lanes[index]
+        laneIndex = 0
+        while laneIndex < len(lane) and lane[laneIndex].alongPos < trap.alongPos:
+            laneIndex += 1
+        lane.insert(laneIndex, trap)
+
+        self.traps.append(trap)
+        self.trapSet.add(trap)
+        self.maxTrapRadius = max(self.maxTrapRadius, trap.colliderRadius)
+
+    # Traps may be placed overlapping one another (as in neighbouring
+    # slots along a side of the room, or in a corner), and each would
+    # then hold the other still. So a trap that overlaps any that we
+    # already have is moved along its lane, towards the middle of the
+    # room, until it no more than touches them.
+    def separate(self, trap):
+        direction = -1 if trap.alongPos > 0 else 1
+        moved = True
+        while moved:
+            moved = False
+            for other in self.traps:
+                otherX, otherY = getLanePoint(other)
+                if trap.moveInX:
+                    otherPos, offset = otherX, otherY - trap.lanePos
+                else:
+                    otherPos, offset = otherY, otherX - trap.lanePos
+                touchDistance = trap.colliderRadius + other.colliderRadius
+                if abs(offset) >= touchDistance - TOUCH_TOLERANCE:
+                    continue
+                halfWidth = math.sqrt(touchDistance*touchDistance - offset*offset)
+                if abs(otherPos - trap.alongPos) < halfWidth - TOUCH_TOLERANCE:
+                    trap.alongPos = otherPos + direction * halfWidth
+                    moved = True
+
+    def clear(self):
+        for axis in (0, 1):
+            self.lanePositions[axis].clear()
+            self.laneTraps[axis].clear()
+        self.traps.clear()
+        self.trapSet.clear()
+        self.maxTrapRadius = 0
+        self.laneContacts = []
+        self.heldTraps = {}
+
+    def update(self, player, dt):
+        for trap in self.traps:
+            trap.updateLogic(player, dt)
+
+        # Start any standing traps in the player's lanes
+        # sliding towards the player
+        playerPos = player.actor.getPos()
+        self.startTraps(0, playerPos.y, playerPos.x)
+        self.startTraps(1, playerPos.x, playerPos.y)
+
+        # Stop any traps that have run into walls or other traps,
+        # noting what's touching what as we go
+        contacts = []
+        heldTraps = []
+        for axis in (0, 1):
+            for lane in self.laneTraps[axis]:
+                self.resolveLane(lane, contacts, heldTraps)
+
+        laneContacts = []
+        movingTraps = []
+        for trap in self.traps:
+            if trap.alongPos != trap.previousAlongPos:
+                self.resolveOtherLanes(trap, laneContacts, heldTraps)
+                if trap.alongPos != trap.previousAlongPos:
+                    movingTraps.append(trap)
+        self.recheckLaneContacts(laneContacts)
+        self.laneContacts = laneContacts
+
+        # Anything swept over by a moving trap is hit by it...
+        self.numEntityTests = 0
+        for trap in movingTraps:
+            self.sweepEntities(trap)
+
+        # ... before any trap is stopped by what it ran into.
+        # A trap that's trying to slide, but is held still by something
+        # that it was already touching, has its contacts handled afresh,
+        # so that it's stopped just as if it had only now run into them.
+        dispatch = self.dispatch
+        for trap, direction in heldTraps:
+            if trap.moveDirection != 0:
+                dispatch.forgetContacts(trap)
+                self.heldTraps[trap] = direction
+        for trap, other, otherKey in contacts:
+            if other is None:
+                dispatch.addContact("trapEnemy", "wall", trap, None, otherKey)
+            else:
+                dispatch.addContact("trapEnemy", "trapEnemy", trap, other, other)
+        for trap, other in laneContacts:
+            dispatch.addContact("trapEnemy", "trapEnemy", trap, other, other)
+            dispatch.addContact("trapEnemy", "trapEnemy", other, trap, trap)
+
+        for trap in movingTraps:
+            trap.applyLanePosition()
+
+        # Any held trap that's no longer touching anything
+        # is free to start off in either direction again
+        if len(self.heldTraps) > 0:
+            touchingTraps = {trap for trap, other, otherKey in contacts}
+            for trap, other in laneContacts:
+                touchingTraps.add(trap)
+                touchingTraps.add(other)
+            self.heldTraps = {trap: direction for trap, direction in self.heldTraps.items()
+                              if trap in touchingTraps}
+
+        self.numMovingTraps = len(movingTraps)
+
+    def startTraps(self, axis, playerLanePos, playerAlongPos):
+        positions = self.lanePositions[axis]
+        first = bisect.bisect_right(positions, playerLanePos - self.playerRange)
+        last = bisect.bisect_left(positions, playerLanePos + self.playerRange)
+        for index in range(first, last):
+            for trap in self.laneTraps[axis][index]:
+                if trap.moveDirection == 0:
+                    direction = math.copysign(1, playerAlongPos - trap.alongPos)
+                    if self.heldTraps.get(trap) != direction:
+                        trap.startSliding(direction)
+
+    # Keeps the traps in a lane from passing through each other or the
+    # walls at its ends, and notes which are touching. A trap that's
+    # run into something is stopped just where it touches; one that
+    # can't move at all is noted in "heldTraps", with its direction.
+    def resolveLane(self, lane, contacts, heldTraps):
+        wallDistance = self.wallDistance
+        numTraps = len(lane)
+
+        # Traps moving towards the positive end: those nearest that end
+        # first, so that each is stopped by where the next will be...
+        for index in range(numTraps - 1, -1, -1):
+            trap = lane[index]
+            if trap.alongPos > trap.previousAlongPos:
+                if index + 1 < numTraps:
+                    other = lane[index + 1]
+                    stop = other.alongPos - other.colliderRadius - trap.colliderRadius
+                else:
+                    stop = wallDistance - trap.colliderRadius
+                if trap.alongPos > stop:
+                    trap.alongPos = max(stop, trap.previousAlongPos)
+                    trap.speed = 0
+                    if trap.alongPos == trap.previousAlongPos:
+                        heldTraps.append((trap, 1))
+
+        # ... and likewise for those moving towards the negative end
+        for index in range(numTraps):
+            trap = lane[index]
+            if trap.alongPos < trap.previousAlongPos:
+                if index > 0:
+                    other = lane[index - 1]
+                    stop = other.alongPos + other.colliderRadius + trap.colliderRadius
+                else:
+                    stop = -wallDistance + trap.colliderRadius
+                if trap.alongPos < stop:
+                    trap.alongPos = min(stop, trap.previousAlongPos)
+                    trap.speed = 0
+                    if trap.alongPos == trap.previousAlongPos:
+                        heldTraps.append((trap, -1))
+
+        first = lane[0]
+        if first.alongPos - first.colliderRadius <= -wallDistance + TOUCH_TOLERANCE:
+            contacts.append((first, None, -1))
+        last = lane[-1]
+        if last.alongPos + last.colliderRadius >= wallDistance - TOUCH_TOLERANCE:
+            contacts.append((last, None, 1))
+
+        for index in range(numTraps - 1):
+            trap = lane[index]
+            other = lane[index + 1]
+            gap = other.alongPos - trap.alongPos - trap.colliderRadius - other.colliderRadius
+            if gap <= TOUCH_TOLERANCE:
+                contacts.append((trap, other, other))
+                contacts.append((other, trap, trap))
+
+    # Stops a moving trap where it first touches a trap in another
+    # lane--a crossing lane, or a neighbouring lane alongside ours--
+    # if it does (noting it in "heldTraps" if it can't move at all)
+    def resolveOtherLanes(self, trap, laneContacts, heldTraps):
+        startPos = trap.previousAlongPos
+        endPos = trap.alongPos
+        direction = 1 if endPos > startPos else -1
+        reach = trap.colliderRadius + self.maxTrapRadius
+        hitTrap = None
+
+        # Crossing lanes within reach of the stretch
+        # that we've moved over...
+        axis = 0 if trap.moveInX else 1
+        positions = self.lanePositions[1 - axis]
+        lanes = self.laneTraps[1 - axis]
+        first = bisect.bisect_left(positions, min(startPos, endPos) - reach)
+        last = bisect.bisect_right(positions, max(startPos, endPos) + reach)
+        for index in range(first, last):
+            for other in lanes[index]:
+                stop = self.findStop(trap, startPos, endPos, direction, other,
+                                     positions[index], other.alongPos - trap.lanePos)
+                if stop is not None:
+                    endPos = stop
+                    hitTrap = other
+
+        # ... and lanes alongside ours that are within reach
+        positions = self.lanePositions[axis]
+        lanes = self.laneTraps[axis]
+        first = bisect.bisect_left(positions, trap.lanePos - reach)
+        last = bisect.bisect_right(positions, trap.lanePos + reach)
+        for index in range(first, last):
+            if positions[index] == trap.lanePos:
+                continue
+            for other in lanes[index]:
+                stop = self.findStop(trap, startPos, endPos, direction, other,
+                                     other.alongPos, positions[index] - trap.lanePos)
+                if stop is not None:
+                    endPos = stop
+                    hitTrap = other
+
+        if hitTrap is not None:
+            if endPos != trap.alongPos:
+                trap.alongPos = endPos
+                trap.speed = 0
+                if endPos == startPos:
+                    heldTraps.append((trap, direction))
+            laneContacts.append((trap, hitTrap))
+
+    # How far along its lane a trap moving from "startPos" towards
+    # "endPos" can get before touching another trap, which is at
+    # "otherPos" along our lane and "offset" to one side of it.
+    # Returns None if the trap doesn't get as far as touching it, or
+    # would only graze it in passing (being a touch-distance or more
+    # to one side of it).
+    def findStop(self, trap, startPos, endPos, direction, other, otherPos, offset):
+        touchDistance = trap.colliderRadius + other.colliderRadius
+        if abs(offset) >= touchDistance - TOUCH_TOLERANCE:
+            return None
+        # Anything behind us can't be run into
+        if (otherPos - startPos) * direction < 0:
+            return None
+
+        halfWidth = math.sqrt(max(0.0, touchDistance*touchDistance - offset*offset))
+        stop = otherPos - direction * halfWidth
+        if (endPos - stop) * direction < -TOUCH_TOLERANCE:
+            return None
+        # If we started out overlapping it, we simply stay put
+        if (stop - startPos) * direction < 0:
+            stop = startPos
+        return stop
+
+    # Keeps last frame's contacts between traps in different
+    # lanes that still hold, and that haven't already been
+    # found this frame
+    def recheckLaneContacts(self, laneContacts):
+        found = set(laneContacts)
+        for trap, other in self.laneContacts:
+            if (trap, other) in found or (other, trap) in found:
+                continue
+            trapX, trapY = getLanePoint(trap)
+            otherX, otherY = getLanePoint(other)
+            dx = otherX - trapX
+            dy = otherY - trapY
+            touchDistance = trap.colliderRadius + other.colliderRadius
+            if dx*dx + dy*dy <= (touchDistance + TOUCH_TOLERANCE) ** 2:
+                laneContacts.append((trap, other))
+
+    # Hits the player and walking enemies that a trap
+    # passed over as it moved along its lane
+    def sweepEntities(self, trap):
+        radius = trap.colliderRadius
+        lanePos = trap.lanePos
+        minPos = min(trap.previousAlongPos, trap.alongPos)
+        maxPos = max(trap.previousAlongPos, trap.alongPos)
+        if trap.moveInX:
+            entries = self.grid.entriesInRect(minPos - radius, lanePos - radius,
+                                              maxPos + radius, lanePos + radius)
+        else:
+            entries = self.grid.entriesInRect(lanePos - radius, minPos - radius,
+                                              lanePos + radius, maxPos + radius)
+
+        hitMask = trap.hitMaskBits
+        trapSet = self.trapSet
+        dispatch = self.dispatch
+        for owner, x, y, entryRadius, mask in entries:
+            if mask & hitMask == 0 or owner in trapSet:
+                continue
+            self.numEntityTests += 1
+
+            if trap.moveInX:
+                offset = y - lanePos
+                alongPos = x
+            else:
+                offset = x - lanePos
+                alongPos = y
+            touchDistance = radius + entryRadius
+            if abs(offset) >= touchDistance:
+                continue
+            halfWidth = math.sqrt(touchDistance*touchDistance - offset*offset)
+            if alongPos + halfWidth > minPos and alongPos - halfWidth < maxPos:
+                dispatch.addContact("trapEnemy", owner.colliderName, trap, owner, owner)
+
+
+# Where a trap is, seen from above
+def getLanePoint(trap):
+    if trap.moveInX:
+        return trap.alongPos, trap.lanePos
+    return trap.lanePos, trap.alongPos
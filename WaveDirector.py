@@ -0,0 +1,255 @@
+import json
+import random
+import time
+
+from direct.showbase.ShowBaseGlobal import globalClock
+
+
+# Decides when enemies are spawned, how many there may be, and of
+# which kinds--all according to a config-file (see "waves.json"),
+# rather than to numbers written into the game.
+#
+# The config-file gives:
+#  - "spawnInterval" and "maxEnemies": how often we try to spawn an
+#    enemy, and how many may be alive at once, each as a "curve"
+#    over the time since the game started (see "evaluateCurve"),
+#  - "enemyMix": which kinds of enemy to spawn, each with a weight
+#    (and, optionally, the time from which it may appear),
+#  - "bursts": waves of enemies to spawn all at once, at given times,
+#    regardless of "maxEnemies", and
+#  - "spawnBudget": how much spawning we'll do in any one frame.
+#
+# Spawning isn't done the moment that it's called for: instead, each
+# spawn is put into a queue, and each frame we build enemies from
+# the front of that queue until we've built "maxPerFrame" of them or
+# spent "maxMs" milliseconds doing so (but always at least one).
+# A burst of hundreds of enemies is thus spread over several frames,
+# rather than all landing on one.
+class WaveDirector:
+    def __init__(self, scheduler, spawnPoints, spawnEnemy, countEnemies):
+        self.scheduler = scheduler
+        self.spawnPoints = spawnPoints
+
+        # "spawnEnemy(enemyType, spawnPoint)" builds an enemy;
+        # "countEnemies()" says how many are alive
+        self.spawnEnemy = spawnEnemy
+        self.countEnemies = countEnemies
+
+        self.curves = {}
+        self.enemyMix = []
+        self.bursts = []
+        self.maxSpawnsPerFrame = 1
+        self.maxSpawnMs = 0
+
+        # When recording or playing back a game, we don't want how
+        # quickly this machine spawns enemies to change when they
+        # appear, so the time-budget can be turned off, leaving
+        # only "maxSpawnsPerFrame".
+        self.useTimeBudget = True
+
+        # Our queue of spawns to be built: each is a list of
+        # [enemy-type, spawn-point, frame-time when it was asked for,
+        #  whether it counts towards "maxEnemies"]
+        self.queue = []
+        self.queueStart = 0
+        # How many of the queued spawns count towards "maxEnemies"
+        self.numQueuedRegular = 0
+
+        self.startTime = 0
+        self.spawnTimer = None
+        self.burstTimers = []
+
+        # For the last update: how many spawns were built, how long
+        # that took (in seconds, of real time), the longest and average
+        # time that those spawns had waited in the queue (in seconds,
+        # of game-time), and how many spawns were still waiting after.
+        self.numSpawned = 0
+        self.spawnTime = 0
+        self.maxLatency = 0
+        self.meanLatency = 0
+        self.queueDepth = 0
+
+        # Over the whole of the current game
+        self.totalSpawned = 0
+        self.peakQueueDepth = 0
+        self.peakLatency = 0
+
+    def loadConfig(self, fileName):
+        with open(fileName) as f:
+            self.configure(json.load(f))
+
+    def configure(self, config):
+        self.curves = {
+            "spawnInterval": config["spawnInterval"],
+            "maxEnemies": config["maxEnemies"]
+        }
+        self.enemyMix = config.get("enemyMix", [{"type": "walkingEnemy", "weight": 1}])
+        self.bursts = config.get("bursts", [])
+
+        budget = config.get("spawnBudget", {})
+        self.maxSpawnsPerFrame = max(1, budget.get("maxPerFrame", 1))
+        self.maxSpawnMs = budget.get("maxMs", 0)
+
+    # Replaces one of our curves--a number will do, for
+    # a value that shouldn't change over time
+    def setCurve(self, name, curve):
+        self.curves[name] = curve
+
+    def getValue(self, name, now=None):
+        if now is None:
+            now = globalClock.getFrameTime()
+        return evaluateCurve(self.curves[name], now - self.startTime)
+
+    # The most enemies that we might have at once,
+    # for sizing our enemy-pools
+    def getPeakEnemies(self):
+        peak = getCurvePeak(self.curves["maxEnemies"])
+        for burst in self.bursts:
+            peak += burst["count"]
+        return int(peak)
+
+    def start(self):
+        self.stop()
+
+        self.startTime = globalClock.getFrameTime()
+        self.spawnTimer = self.scheduler.schedule(self.getValue("spawnInterval"), self.spawnTick)
+        for burst in self.bursts:
+            self.burstTimers.append(self.scheduler.schedule(burst["time"], self.launchBurst, burst))
+
+        self.totalSpawned = 0
+        self.peakQueueDepth = 0
+        self.peakLatency = 0
+
+    def stop(self):
+        if self.spawnTimer is not None:
+            self.scheduler.cancel(self.spawnTimer)
+            self.spawnTimer = None
+        for timer in self.burstTimers:
+            self.scheduler.cancel(timer)
+        self.burstTimers = []
+
+        self.queue = []
+        self.queueStart = 0
+        self.numQueuedRegular = 0
+        self.queueDepth = 0
+
+    # Called by the scheduler every "spawnInterval" seconds
+    def spawnTick(self):
+        now = globalClock.getFrameTime()
+        if self.countEnemies() + self.numQueuedRegular < self.getValue("maxEnemies", now):
+            self.request(self.chooseEnemyType(now), now, True)
+        self.spawnTimer = self.scheduler.schedule(self.getValue("spawnInterval", now), self.spawnTick)
+
+    def launchBurst(self, burst):
+        self.burstTimers = [timer for timer in self.burstTimers if self.scheduler.isPending(timer)]
+
+        now = globalClock.getFrameTime()
+        for i in range(burst["count"]):
+            enemyType = burst.get("type")
+            if enemyType is None:
+                enemyType = self.chooseEnemyType(now)
+            self.request(enemyType, now, False)
+
+    def request(self, enemyType, now, isRegular):
+        spawnPoint = random.choice(self.spawnPoints)
+        self.queue.append([enemyType, spawnPoint, now, isRegular])
+        if isRegular:
+            self.numQueuedRegular += 1
+
+    # Picks a kind of enemy from those that may appear by now,
+    # by their weights
+    def chooseEnemyType(self, now):
+        elapsed = now - self.startTime
+        choices = [entry for entry in self.enemyMix if entry.get("from", 0) <= elapsed]
+        if len(choices) == 1:
+            return choices[0]["type"]
+        if len(choices) == 0:
+            return self.enemyMix[0]["type"]
+        weights = [entry["weight"] for entry in choices]
+        return random.choices(choices, weights)[0]["type"]
+
+    # Builds what we can of our queue within this frame's budget
+    def update(self):
+        now = globalClock.getFrameTime()
+        startTime = time.perf_counter()
+        deadline = startTime + self.maxSpawnMs / 1000.0
+
+        queue = self.queue
+        numSpawned = 0
+        totalLatency = 0
+        maxLatency = 0
+        while self.queueStart < len(queue) and numSpawned < self.maxSpawnsPerFrame:
+            if numSpawned > 0 and self.useTimeBudget and time.perf_counter() >= deadline:
+                break
+
+            spawn = queue[self.queueStart]
+            queue[self.queueStart] = None
+            self.queueStart += 1
+
+            enemyType, spawnPoint, requestTime, isRegular = spawn
+            if isRegular:
+                self.numQueuedRegular -= 1
+            self.spawnEnemy(enemyType, spawnPoint)
+
+            latency = now - requestTime
+            totalLatency += latency
+            if latency > maxLatency:
+                maxLatency = latency
+            numSpawned += 1
+
+        # Every so often, drop the spawns that we've
+        # built from the front of the queue
+        if self.queueStart > 64 and self.queueStart * 2 > len(queue):
+            del queue[:self.queueStart]
+            self.queueStart = 0
+
+        self.numSpawned = numSpawned
+        self.spawnTime = time.perf_counter() - startTime
+        self.maxLatency = maxLatency
+        self.meanLatency = totalLatency / numSpawned if numSpawned > 0 else 0
+        self.queueDepth = len(queue) - self.queueStart
+
+        self.totalSpawned += numSpawned
+        self.peakQueueDepth = max(self.peakQueueDepth, self.queueDepth + numSpawned)
+        self.peakLatency = max(self.peakLatency, maxLatency)
+
+
+# A curve is one of:
+#  - a number, which is the value at all times,
+#  - {"start": a, "step": b, "every": c, "limit": d}: starts at "a", and
+#    changes by "b" every "c" seconds, until it reaches "d", or
+#  - {"points": [[time, value], ...]}: goes in a straight line from
+#    each point to the next, and holds the first and last values
+#    before and after them.
+def evaluateCurve(curve, elapsed):
+    if isinstance(curve, (int, float)):
+        return curve
+
+    if "points" in curve:
+        points = curve["points"]
+        if elapsed <= points[0][0]:
+            return points[0][1]
+        for (time0, value0), (time1, value1) in zip(points, points[1:]):
+            if elapsed < time1:
+                return value0 + (value1 - value0) * (elapsed - time0) / (time1 - time0)
+        return points[-1][1]
+
+    value = curve["start"] + curve["step"] * int(elapsed // curve["every"])
+    limit = curve.get("limit")
+    if limit is not None:
+        if curve["step"] > 0:
+            value = min(value, limit)
+        else:
+            value = max(value, limit)
+    return value
+
+
+# The largest value that a curve ever reaches
+def getCurvePeak(curve):
+    if isinstance(curve, (int, float)):
+        return curve
+    if "points" in curve:
+        return max(value for time, value in curve["points"])
+    if curve["step"] > 0:
+        return curve.get("limit", curve["start"])
+    return curve["start"]
@@ -0,0 +1,150 @@
+# Measures what our compiled models and textures (see "buildAssets.py")
+# save us in loading time.
+#
+# For each model in the asset-cache we time loading it from its
+# source (".egg" and PNGs) and from its compiled version (".bam" and
+# ".txo"), with nothing of either already loaded.
+#
+# We then time a cold start of the game--from building the game to
+# the end of the first frame of its first game, in a new process--
+# loading from the sources and from the compiled versions. When
+# loading from the sources, Panda normally keeps a cache of its own
+# (in the user's cache-folder) of the models that it's converted; we
+# time a start both with that cache and without it, the latter being
+# what a first run of the game costs.
+#
+# Run "python buildAssets.py" first, then run this from the
+# game's directory like so:
+#   python -m benchmarks.assetLoad
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+from panda3d.core import loadPrcFileData
+
+
+GAME_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COLD_START_MODES = [
+    ("source", "from source, with Panda's model-cache"),
+    ("sourceUncached", "from source, without Panda's model-cache"),
+    ("compiled", "compiled")
+]
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+# Times a single cold start of the game; this is run in a process of its own
+def timeColdStart(mode):
+    startTime = time.perf_counter()
+
+    if mode == "sourceUncached":
+        loadPrcFileData("assetLoad", "model-cache-dir")
+
+    import random
+    from main import Game
+    from AssetCache import assetCache
+
+    if mode != "compiled":
+        assetCache.enabled = False
+    game = Game(headless=True, wavesFile=None)
+    random.seed(1)
+    game.startGame()
+    game.step()
+
+    # Make sure that a walking enemy has been built, too
+    if len(game.enemies) == 0:
+        game.spawnEnemy()
+        game.step()
+
+    print(time.perf_counter() - startTime)
+
+
+def coldStartInNewProcess(mode):
+    output = subprocess.check_output([sys.executable, "-m", "benchmarks.assetLoad",
+                                      "--cold-start", mode],
+                                     cwd=GAME_DIR, stderr=subprocess.DEVNULL)
+    return float(output.decode().split()[-1])
+
+
+def timeModelLoads(repeats):
+    loadPrcFileData("assetLoad", "window-type none\naudio-library-name null")
+
+    from panda3d.core import Filename, Loader, LoaderOptions, ModelPool, TexturePool, getModelPath
+    from AssetCache import assetCache
+
+    getModelPath().prependDirectory(Filename.fromOsSpecific(GAME_DIR))
+    assetCache.load(GAME_DIR)
+    if len(assetCache.assets) == 0:
+        print("No compiled models found; run \"python buildAssets.py\" first")
+        return False
+
+    loader = Loader.getGlobalPtr()
+    options = LoaderOptions(LoaderOptions.LF_no_cache | LoaderOptions.LF_report_errors)
+
+    def timeLoad(modelName):
+        times = []
+        for i in range(repeats):
+            TexturePool.releaseAllTextures()
+            ModelPool.releaseAllModels()
+            startTime = time.perf_counter()
+            loader.loadSync(Filename(modelName), options)
+            times.append(time.perf_counter() - startTime)
+        return median(times)
+
+    totalSourceTime = 0
+    totalCompiledTime = 0
+    for name in sorted(assetCache.assets):
+        entry = assetCache.assets[name]
+        compiledName = assetCache.getModelName(name)
+        if compiledName == name:
+            print("{0:45s} (compiled version is out of date)".format(name))
+            continue
+
+        sourceTime = timeLoad(entry["source"])
+        compiledTime = timeLoad(compiledName)
+        totalSourceTime += sourceTime
+        totalCompiledTime += compiledTime
+        print("{0:45s} {1:2d} textures: {2:8.2f} ms from source, {3:7.2f} ms compiled ({4:5.1f}x)".format(
+            name, len(set(entry["textures"].values())), sourceTime * 1000.0,
+            compiledTime * 1000.0, sourceTime / compiledTime))
+
+    print("{0:45s}             {1:8.2f} ms from source, {2:7.2f} ms compiled ({3:5.1f}x)".format(
+        "All models", totalSourceTime * 1000.0, totalCompiledTime * 1000.0,
+        totalSourceTime / totalCompiledTime))
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark loading our models from source "
+                                                 "and compiled")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--cold-start", choices=[mode for mode, description in COLD_START_MODES],
+                        help="(used internally) time a single cold start")
+    args = parser.parse_args()
+
+    if args.cold_start is not None:
+        timeColdStart(args.cold_start)
+        return
+
+    print("Loading each model:")
+    if not timeModelLoads(args.repeats):
+        return
+
+    print("")
+    print("Cold start, to the end of the first frame (median of {0}):".format(args.repeats))
+    # Make sure that Panda's own cache has every model in it
+    coldStartInNewProcess("source")
+    for mode, description in COLD_START_MODES:
+        times = [coldStartInNewProcess(mode) for i in range(args.repeats)]
+        print("  {0:42s} {1:8.1f} ms".format(description, median(times) * 1000.0))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# Measures how the cost of pushing the horde apart (see
+# "CrowdSeparation.py") grows with the size of the horde.
+#
+# The enemies are scattered at random over a square that grows with
+# the horde, so that they're always as crowded as a tightly-packed
+# horde (by default, two enemies per square unit). The cost per enemy
+# should then stay much the same however many enemies there are. For
+# comparison, we also time the simple way: testing every pair.
+#
+# Run it from the game's directory like so:
+#   python -m benchmarks.crowdSeparation
+
+import argparse
+import time
+
+import numpy as np
+
+from CrowdSeparation import CrowdSeparation
+
+
+DEFAULT_SIZES = [250, 500, 1000, 2000, 4000, 8000]
+
+# Testing every pair gets slow quickly, so
+# we only do so for hordes up to this size
+MAX_PAIRWISE_SIZE = 2000
+
+
+# Finds every overlapping pair by testing every pair,
+# a block of enemies at a time
+def countOverlapsPairwise(positions, radius):
+    points = positions[:, :2]
+    touchDistance = radius * 2.0
+    numOverlaps = 0
+    for start in range(0, len(points), 256):
+        offsets = points[start:start + 256, None, :] - points[None, :, :]
+        distancesSquared = np.einsum("ijk,ijk->ij", offsets, offsets)
+        numOverlaps += np.count_nonzero(distancesSquared < touchDistance*touchDistance)
+    # Each enemy overlaps itself, and each pair is counted twice
+    return (numOverlaps - len(points)) // 2
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pushing-apart of the horde")
+    parser.add_argument("--sizes", default=",".join(str(size) for size in DEFAULT_SIZES),
+                        help="comma-separated horde-sizes to time")
+    parser.add_argument("--density", type=float, default=2.0,
+                        help="enemies per square unit")
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    random = np.random.default_rng(args.seed)
+    separation = CrowdSeparation(0.3)
+
+    for size in [int(size) for size in args.sizes.split(",")]:
+        halfWidth = np.sqrt(size / args.density) / 2.0
+        positions = random.uniform(-halfWidth, halfWidth, (size, 3))
+        positions[:, 2] = 0
+
+        # Each repeat works on a fresh copy, so that every
+        # one has the same overlaps to deal with
+        copies = [positions.copy() for i in range(args.repeats)]
+        startTime = time.perf_counter()
+        for copy in copies:
+            separation.apply(copy)
+        separationTime = (time.perf_counter() - startTime) / args.repeats
+
+        line = "{0:5d} enemies: {1:7.3f} ms per frame, {2:6.2f} us per enemy; " \
+               "{3:5.1f} pairs tested, {4:4.2f} overlaps, per enemy".format(
+                   size, separationTime * 1000.0, separationTime * 1000000.0 / size,
+                   separation.numPairsTested / size, separation.numOverlaps / size)
+
+        if size <= MAX_PAIRWISE_SIZE:
+            startTime = time.perf_counter()
+            numOverlaps = countOverlapsPairwise(positions, separation.radius)
+            pairwiseTime = time.perf_counter() - startTime
+            if numOverlaps != separation.numOverlaps:
+                line += " (MISMATCH: {0} overlaps found pairwise)".format(numOverlaps)
+            line += "; every pair: {0:8.3f} ms".format(pairwiseTime * 1000.0)
+
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+# Measures what each walking enemy costs us on the Python side: how many
+# bytes it holds on to, how long it takes to make one, and how long it
+# takes to read the attributes that the update-loop reads, and to run
+# an enemy's "updateLogic".
+#
+# As a control, we measure the same again for an enemy-class that's
+# just like WalkingEnemy, but without its "__slots__"--so that each
+# enemy keeps its attributes in a dictionary of its own--and show
+# the two side by side.
+#
+# (The bytes counted are those of Python's own objects--the enemy, its
+# attributes, and so on. The scene-graph nodes behind each enemy's
+# Actor are Panda's, and aren't counted.)
+#
+# Run it from the game's directory like so:
+#   python -m benchmarks.entityMemory
+
+import argparse
+import random
+import sys
+import time
+import tracemalloc
+
+from panda3d.core import Vec3
+
+from main import Game
+from GameObject import WalkingEnemy
+
+
+# Makes a copy of the given class (and of the classes that it derives
+# from) with the same methods and class-constants, but with no
+# "__slots__", so that its objects each have a "__dict__"
+def makeUnslottedClass(cls):
+    copies = {object: object}
+
+    def copyClass(original):
+        if original not in copies:
+            slots = getattr(original, "__slots__", ())
+            namespace = {name: value for name, value in original.__dict__.items()
+                         if name not in slots and name not in ("__slots__", "__dict__", "__weakref__")}
+            bases = tuple(copyClass(base) for base in original.__bases__)
+            copies[original] = type(original.__name__, bases, namespace)
+        return copies[original]
+
+    return copyClass(cls)
+
+
+# How many attributes an object has, in its
+# "__dict__" or in its classes' "__slots__"
+def countAttributes(entity):
+    if hasattr(entity, "__dict__"):
+        return len(entity.__dict__)
+    return sum(1 for cls in type(entity).__mro__
+               for name in getattr(cls, "__slots__", ())
+               if hasattr(entity, name))
+
+
+# Python's own size of an object, counting its
+# attribute-dictionary, if it has one
+def getShallowSize(entity):
+    size = sys.getsizeof(entity)
+    if hasattr(entity, "__dict__"):
+        size += sys.getsizeof(entity.__dict__)
+    return size
+
+
+# Reads the attributes that an enemy's update reads, as
+# "GameObject.update" and "WalkingEnemy.runLogic" do
+def readAttributes(enemies):
+    total = 0.0
+    for enemy in enemies:
+        velocity = enemy.velocity
+        if enemy.walking:
+            total += enemy.acceleration
+        total += enemy.maxSpeed + enemy.attackDistance + enemy.colliderRadius
+        if enemy.attackTimer is None and velocity is not None:
+            total += enemy.health
+    return total
+
+
+# Makes walking enemies of the given class at the given positions,
+# and measures them; returns our measurements, by name
+def measure(game, enemyClass, positions, repeats):
+    # Make one first, so that the prototype for its
+    # Actor (see "ActorPrototypes.py") already exists
+    enemyClass(Vec3(0, 0, 0)).cleanup()
+
+    tracemalloc.start()
+    startBytes = tracemalloc.get_traced_memory()[0]
+    startTime = time.perf_counter()
+    enemies = [enemyClass(pos) for pos in positions]
+    creationTime = time.perf_counter() - startTime
+    heldBytes = tracemalloc.get_traced_memory()[0] - startBytes
+    tracemalloc.stop()
+
+    shallowBytes = sum(getShallowSize(enemy) for enemy in enemies)
+
+    startTime = time.perf_counter()
+    for i in range(repeats):
+        readAttributes(enemies)
+    readTime = (time.perf_counter() - startTime) / repeats
+
+    # Run each enemy's own update (without the batched horde),
+    # past its "spawn" animation
+    for enemy in enemies:
+        enemy.animation.stop()
+    dt = 1.0 / 60.0
+    startTime = time.perf_counter()
+    for i in range(repeats):
+        for enemy in enemies:
+            enemy.updateLogic(game.player, dt)
+    updateTime = (time.perf_counter() - startTime) / repeats
+
+    numEnemies = len(enemies)
+    results = {
+        "attributes": countAttributes(enemies[0]),
+        "shallowBytes": shallowBytes / numEnemies,
+        "heldBytes": heldBytes / numEnemies,
+        "creationUs": creationTime * 1000000.0 / numEnemies,
+        "readUs": readTime * 1000000.0 / numEnemies,
+        "updateUs": updateTime * 1000000.0 / numEnemies
+    }
+
+    for enemy in enemies:
+        enemy.cleanup()
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the memory and attribute-costs "
+                                                 "of walking enemies")
+    parser.add_argument("--enemies", type=int, default=500)
+    parser.add_argument("--repeats", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    game = Game(headless=True)
+    random.seed(args.seed)
+    game.numTrapsPerSide = 0
+    game.startGame()
+
+    positions = [Vec3(random.uniform(-7, 7), random.uniform(-7, 7), 0) for i in range(args.enemies)]
+
+    slotted = measure(game, WalkingEnemy, positions, args.repeats)
+    unslotted = measure(game, makeUnslottedClass(WalkingEnemy), positions, args.repeats)
+
+    print("{0:32s} {1:>14s} {2:>14s}".format("{0} walking enemies:".format(len(positions)),
+                                             "with __slots__", "with __dict__"))
+    rows = [
+        ("attributes", "attributes", "{0:14d}"),
+        ("object and attributes (bytes)", "shallowBytes", "{0:14.0f}"),
+        ("all Python memory held (bytes)", "heldBytes", "{0:14.0f}"),
+        ("creation (us)", "creationUs", "{0:14.1f}"),
+        ("attribute reads (us)", "readUs", "{0:14.3f}"),
+        ("updateLogic (us)", "updateUs", "{0:14.2f}")
+    ]
+    for description, name, valueFormat in rows:
+        print("  {0:30s} {1} {2}".format(description, valueFormat.format(slotted[name]),
+                                         valueFormat.format(unslotted[name])))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# Measures what the horde's shared flow-field (see "FlowField.py")
+# costs, against what it would cost for each enemy to search for its
+# own path to the player.
+#
+# With the game's traps standing in the room, we time:
+#  - working the field out afresh, as happens when the player moves
+#    into a new cell,
+#  - changing it as a trap starts to slide (freeing the cells that
+#    it blocked) and then stops again (blocking them once more), and
+#  - looking up the directions for the whole horde, for a range of
+#    horde-sizes.
+# For comparison, a search of our own per enemy is timed by working
+# out a field from that enemy's cell--which is as much as a single
+# search over the grid can cost.
+#
+# Run it from the game's directory like so:
+#   python -m benchmarks.flowField
+
+import argparse
+import random
+import time
+
+import numpy as np
+
+from main import Game
+
+
+def timeCalls(function, numCalls):
+    startTime = time.perf_counter()
+    for i in range(numCalls):
+        function(i)
+    return (time.perf_counter() - startTime) / numCalls
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the horde's flow-field")
+    parser.add_argument("--traps-per-side", type=int, default=8)
+    parser.add_argument("--sizes", default="100,500,2000",
+                        help="comma-separated horde-sizes to look up directions for")
+    parser.add_argument("--repeats", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    game = Game(headless=True)
+    random.seed(args.seed)
+    game.numTrapsPerSide = args.traps_per_side
+    game.startGame()
+    game.step()
+
+    flowField = game.flowField
+    traps = game.trapEnemies
+    numCells = flowField.numCells * flowField.numCells
+    print("{0} traps, blocking {1} of {2} cells".format(
+        len(traps), len(flowField.cellBlockers), numCells))
+
+    # Working the field out afresh, for the player in random cells
+    goalCells = [random.randrange(numCells) for i in range(args.repeats)]
+    def rebuild(i):
+        flowField.goalCell = goalCells[i]
+        flowField.rebuild()
+        flowField.updateDirections()
+        flowField.updateClearWay()
+    rebuildTime = timeCalls(rebuild, args.repeats)
+    print("Rebuilding the field:          {0:7.3f} ms".format(rebuildTime * 1000.0))
+
+    # A trap starting to slide, and then stopping again
+    playerPos = game.player.actor.getPos()
+    flowField.goalCell = flowField.getCell(playerPos.x, playerPos.y)
+    flowField.rebuild()
+    numCellsUpdated = []
+    def toggleTrap(i):
+        trap = traps[(i // 2) % len(traps)]
+        trap.moveDirection = 1 if i % 2 == 0 else 0
+        flowField.update(playerPos, traps)
+        numCellsUpdated.append(flowField.numCellsUpdated)
+    toggleTime = timeCalls(toggleTrap, args.repeats * 2)
+    print("Updating for a trap:           {0:7.3f} ms ({1:.1f} cells changed, on average)".format(
+        toggleTime * 1000.0, sum(numCellsUpdated) / len(numCellsUpdated)))
+
+    # One search per enemy, for comparison
+    enemyCells = [random.randrange(numCells) for i in range(args.repeats)]
+    def search(i):
+        flowField.goalCell = enemyCells[i]
+        flowField.rebuild()
+    searchTime = timeCalls(search, args.repeats)
+    flowField.goalCell = flowField.getCell(playerPos.x, playerPos.y)
+    flowField.rebuild()
+    flowField.updateDirections()
+    flowField.updateClearWay()
+
+    for size in [int(size) for size in args.sizes.split(",")]:
+        positions = np.random.uniform(-7.5, 7.5, (size, 3))
+        sampleTime = timeCalls(lambda i: flowField.getDirections(positions), args.repeats)
+        print("{0:5d} enemies: looking up the field {1:7.3f} ms per frame; "
+              "a search per enemy would take {2:8.1f} ms".format(
+                  size, sampleTime * 1000.0, searchTime * size * 1000.0))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+# Times a set of scripted scenes: a horde of walking enemies of a given
+# size chasing a scripted player, while the traps slide back and forth.
+#
+# For each scene we report the mean, 95th- and 99th- percentile time
+# taken by a frame, the time taken to spawn an enemy, and how many
+# nodes there are in the scene-graph. The results can be saved as JSON,
+# and compared against an earlier set of results (a "baseline"); if any
+# number has grown by more than its threshold, we say so, and exit
+# with an error.
+#
+# Each scene is played in a fresh process, so that none is
+# affected by anything that another left behind.
+#
+# Run it from the game's directory like so:
+#   python -m benchmarks.hordeBenchmark --save-baseline baseline.json
+# ... make some changes, then:
+#   python -m benchmarks.hordeBenchmark --baseline baseline.json
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from main import Game
+
+
+DEFAULT_HORDE_SIZES = [20, 100, 500, 2000]
+
+# How much each number may grow, as a fraction of its baseline
+# value, before we call it a regression
+DEFAULT_THRESHOLDS = {
+    "meanFrameMs": 0.15,
+    "p95FrameMs": 0.25,
+    "p99FrameMs": 0.35,
+    "spawnMs": 0.25,
+    "nodeCount": 0.0,
+    "collisionNodeCount": 0.0
+}
+
+
+def percentile(sortedValues, fraction):
+    index = min(len(sortedValues) - 1, int(round(fraction * (len(sortedValues) - 1))))
+    return sortedValues[index]
+
+
+def playScene(hordeSize, numFrames, numWarmupFrames, seed):
+    game = Game(headless=True)
+    random.seed(seed)
+    game.startGame()
+
+    # We don't want the player to die partway through...
+    game.player.maxHealth = 1000000
+    game.player.health = 1000000
+
+    # ... nor the game to change its own difficulty.
+    game.waveDirector.setCurve("maxEnemies", hordeSize)
+
+    # Spawn the whole horde up front, timing each spawn
+    spawnTimes = []
+    for i in range(hordeSize):
+        startTime = time.perf_counter()
+        game.spawnEnemy()
+        spawnTimes.append(time.perf_counter() - startTime)
+
+    # From here on, replace any enemy that the player
+    # kills on the very next frame.
+    game.waveDirector.setCurve("spawnInterval", 0)
+
+    frameTimes = []
+    for frame in range(numWarmupFrames + numFrames):
+        # Walk in a square, firing now and then; this takes the player
+        # past the traps, so that they slide.
+        phase = (frame // 60) % 4
+        game.keyMap["up"] = phase == 0
+        game.keyMap["right"] = phase == 1
+        game.keyMap["down"] = phase == 2
+        game.keyMap["left"] = phase == 3
+        game.keyMap["shoot"] = (frame // 30) % 2 == 0
+        game.aimPoint.set(4.0 * (phase % 2) - 2.0, 3.0, 0)
+
+        startTime = time.perf_counter()
+        game.step()
+        if frame >= numWarmupFrames:
+            frameTimes.append(time.perf_counter() - startTime)
+
+    frameTimes.sort()
+    return {
+        "hordeSize": hordeSize,
+        "frames": numFrames,
+        "meanFrameMs": sum(frameTimes) * 1000.0 / len(frameTimes),
+        "p95FrameMs": percentile(frameTimes, 0.95) * 1000.0,
+        "p99FrameMs": percentile(frameTimes, 0.99) * 1000.0,
+        # The first spawn also builds the enemies' Actor-prototype,
+        # so we report it separately from the rest.
+        "firstSpawnMs": spawnTimes[0] * 1000.0 if len(spawnTimes) > 0 else 0.0,
+        "spawnMs": sum(spawnTimes[1:]) * 1000.0 / max(1, len(spawnTimes) - 1),
+        "nodeCount": game.render.countNumDescendants(),
+        "collisionNodeCount": game.render.findAllMatches("**/+CollisionNode").getNumPaths(),
+        "liveEnemies": len(game.enemies)
+    }
+
+
+def playInNewProcess(hordeSize, args):
+    outputFile, outputName = tempfile.mkstemp(suffix=".json")
+    os.close(outputFile)
+    try:
+        subprocess.check_call([sys.executable, "-m", "benchmarks.hordeBenchmark",
+                               "--scene", str(hordeSize),
+                               "--frames", str(args.frames),
+                               "--warmup", str(args.warmup),
+                               "--seed", str(args.seed),
+                               "--output", outputName])
+        with open(outputName) as f:
+            return json.load(f)
+    finally:
+        os.remove(outputName)
+
+
+# Returns a list of descriptions of the numbers in "results"
+# that have grown too much since "baseline"
+def findRegressions(results, baseline, thresholds):
+    regressions = []
+    for name, scene in results["scenes"].items():
+        baselineScene = baseline["scenes"].get(name)
+        if baselineScene is None:
+            continue
+        for metric, threshold in thresholds.items():
+            if metric not in scene or metric not in baselineScene:
+                continue
+            before = baselineScene[metric]
+            after = scene[metric]
+            if after > before * (1.0 + threshold):
+                regressions.append("{0} {1}: {2:.3f} -> {3:.3f} (allowed +{4:.0%})".format(
+                    name, metric, before, after, threshold))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark scripted hordes of walking enemies")
+    parser.add_argument("--sizes", default=",".join(str(size) for size in DEFAULT_HORDE_SIZES),
+                        help="comma-separated horde sizes to play")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--warmup", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save-baseline", metavar="FILE",
+                        help="save the results to this file")
+    parser.add_argument("--baseline", metavar="FILE",
+                        help="compare the results with those in this file")
+    parser.add_argument("--threshold", action="append", default=[], metavar="METRIC=FRACTION",
+                        help="how much a metric may grow before it counts as a regression, "
+                             "e.g. p95FrameMs=0.1; may be given more than once")
+    # Used internally, to play one of the scenes
+    parser.add_argument("--scene", type=int)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    if args.scene is not None:
+        result = playScene(args.scene, args.frames, args.warmup, args.seed)
+        with open(args.output, "w") as f:
+            json.dump(result, f)
+        return
+
+    thresholds = dict(DEFAULT_THRESHOLDS)
+    for threshold in args.threshold:
+        metric, fraction = threshold.split("=")
+        thresholds[metric] = float(fraction)
+
+    results = {"scenes": {}}
+    for size in args.sizes.split(","):
+        hordeSize = int(size)
+        scene = playInNewProcess(hordeSize, args)
+        results["scenes"]["horde" + str(hordeSize)] = scene
+        print("{0:5d} enemies: mean {1:7.3f} ms, p95 {2:7.3f} ms, p99 {3:7.3f} ms per frame; "
+              "{4:.3f} ms per spawn; {5} nodes ({6} collision-nodes)".format(
+                  hordeSize, scene["meanFrameMs"], scene["p95FrameMs"], scene["p99FrameMs"],
+                  scene["spawnMs"], scene["nodeCount"], scene["collisionNodeCount"]))
+
+    if args.save_baseline is not None:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = findRegressions(results, baseline, thresholds)
+        for regression in regressions:
+            print("REGRESSION: " + regression)
+        if len(regressions) > 0:
+            raise SystemExit(1)
+        print("No regressions against " + args.baseline)
+
+
+if __name__ == "__main__":
+    main()
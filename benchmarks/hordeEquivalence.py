@@ -0,0 +1,112 @@
+# Checks that the batched horde-update moves our walking enemies
+# just as updating them one at a time does.
+#
+# We play the same scripted game twice--once each way--from the same
+# random seed, and compare the enemies' positions on every frame.
+# Each game is played in a fresh process, so that neither is
+# affected by anything that the other left behind (such as
+# pooled enemies, or Panda's caches).
+#
+# Run it from the game's directory like so:
+#   python -m benchmarks.hordeEquivalence
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+
+from main import Game
+
+
+def playScriptedGame(useBatchedHorde, numFrames, seed):
+    game = Game(headless=True)
+    game.useBatchedHorde = useBatchedHorde
+    # Whether a trap hits an enemy can hang on the tiniest difference
+    # in where that enemy is, so traps would amplify the tiny
+    # rounding-differences between the two ways of updating into
+    # entirely different games. We leave them out.
+    game.numTrapsPerSide = 0
+    random.seed(seed)
+    game.startGame()
+
+    # We want to see plenty of enemies, and to not be interrupted
+    # by the player dying.
+    game.waveDirector.setCurve("maxEnemies", 20)
+    game.player.maxHealth = 1000000
+    game.player.health = 1000000
+
+    positions = []
+    for frame in range(numFrames):
+        # Walk in a slow square, firing now and then
+        phase = (frame // 90) % 4
+        game.keyMap["up"] = phase == 0
+        game.keyMap["right"] = phase == 1
+        game.keyMap["down"] = phase == 2
+        game.keyMap["left"] = phase == 3
+        game.keyMap["shoot"] = (frame // 45) % 2 == 0
+        game.aimPoint.set(4.0 * (phase % 2) - 2.0, 3.0, 0)
+
+        game.step()
+
+        positions.append([list(enemy.actor.getPos()) for enemy in game.enemies])
+
+    return positions
+
+
+def playInNewProcess(mode, args):
+    outputFile, outputName = tempfile.mkstemp(suffix=".json")
+    os.close(outputFile)
+    try:
+        subprocess.check_call([sys.executable, "-m", "benchmarks.hordeEquivalence",
+                               "--mode", mode,
+                               "--frames", str(args.frames),
+                               "--seed", str(args.seed),
+                               "--output", outputName])
+        with open(outputName) as f:
+            return json.load(f)
+    finally:
+        os.remove(outputName)
+
+
+def distance(a, b):
+    return sum((x - y) ** 2 for x, y in zip(a, b)) ** 0.5
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare batched and per-enemy horde updates")
+    parser.add_argument("--frames", type=int, default=1800)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--tolerance", type=float, default=1e-3)
+    # Used internally, to play one of the two games
+    parser.add_argument("--mode", choices=["perEnemy", "batched"])
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    if args.mode is not None:
+        positions = playScriptedGame(args.mode == "batched", args.frames, args.seed)
+        with open(args.output, "w") as f:
+            json.dump(positions, f)
+        return
+
+    perEnemy = playInNewProcess("perEnemy", args)
+    batched = playInNewProcess("batched", args)
+
+    worstDifference = 0
+    for frame, (expected, actual) in enumerate(zip(perEnemy, batched)):
+        if len(expected) != len(actual):
+            print("Frame {0}: {1} enemies one at a time, but {2} batched".format(
+                frame, len(expected), len(actual)))
+            raise SystemExit(1)
+        for expectedPos, actualPos in zip(expected, actual):
+            worstDifference = max(worstDifference, distance(expectedPos, actualPos))
+
+    print("Largest difference in position over {0} frames: {1:.6f}".format(args.frames, worstDifference))
+    if worstDifference > args.tolerance:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
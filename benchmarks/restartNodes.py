@@ -0,0 +1,97 @@
+# Checks that restarting the game doesn't leave anything behind in the
+# scene-graph, and measures how long each restart takes.
+#
+# We play a few frames, restart, and count the nodes under "render"
+# and under "aspect2d" (where the HUD lives), and the lights applied
+# to "render", after each restart. These should stay the same from
+# one restart to the next; if they grow, something made by the last
+# game wasn't removed, and the check fails.
+#
+# Each restart is timed from the call to "startGame" (as when
+# "Restart" is pressed) to the end of the new game's first frame.
+# By default the game's Player and traps are reset in place; with
+# "--cold", every game is built from scratch instead.
+#
+# Run it from the game's directory like so:
+#   python -m benchmarks.restartNodes
+
+import argparse
+import random
+import sys
+import time
+
+from panda3d.core import LightAttrib
+
+from main import Game
+
+
+def countSceneNodes(game):
+    lightAttrib = game.render.getAttrib(LightAttrib)
+    return {
+        "render": game.render.countNumDescendants(),
+        "aspect2d": game.aspect2d.countNumDescendants(),
+        "lights": 0 if lightAttrib is None else lightAttrib.getNumOnLights()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that restarts don't grow the scene-graph")
+    parser.add_argument("--restarts", type=int, default=10)
+    parser.add_argument("--frames", type=int, default=300,
+                        help="frames to play between restarts")
+    parser.add_argument("--traps-per-side", type=int, default=8)
+    parser.add_argument("--cold", action="store_true",
+                        help="build every game from scratch")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    game = Game(headless=True, wavesFile=None)
+    random.seed(args.seed)
+    game.numTrapsPerSide = args.traps_per_side
+    game.warmRestart = not args.cold
+
+    counts = []
+    startTimes = []
+    restartTimes = []
+    enemiesBuilt = []
+    for i in range(args.restarts + 1):
+        numBuilt = sum(pool.misses for pool in game.enemyPools.values()) + game.trapPool.misses
+
+        startTime = time.perf_counter()
+        game.startGame()
+        startTimes.append(time.perf_counter() - startTime)
+
+        # Keep the player alive, so that every game is played in full
+        game.player.maxHealth = 1000
+        game.player.health = 1000
+
+        counts.append(countSceneNodes(game))
+        game.step()
+        restartTimes.append(game.restartTime)
+        enemiesBuilt.append(sum(pool.misses for pool in game.enemyPools.values()) +
+                            game.trapPool.misses - numBuilt)
+        game.step(args.frames - 1)
+
+    for i, count in enumerate(counts):
+        print("{0} {1:2d}: {2:5d} nodes under render, {3:4d} under aspect2d, "
+              "{4} lights; {5:6.2f} ms in startGame, {6:6.2f} ms to first frame, "
+              "{7:3d} enemies and traps built".format(
+                  "start  " if i == 0 else "restart", i, count["render"], count["aspect2d"],
+                  count["lights"], startTimes[i] * 1000.0, restartTimes[i] * 1000.0,
+                  enemiesBuilt[i]))
+
+    numRestarts = len(restartTimes) - 1
+    print("Mean restart to first frame: {0:.2f} ms".format(
+        sum(restartTimes[1:]) * 1000.0 / numRestarts))
+
+    # The first game builds things that later ones reuse, so we
+    # compare each restart against the first restart
+    grown = [name for name in counts[1] if counts[-1][name] > counts[1][name]]
+    if len(grown) > 0:
+        print("FAIL: restarts grew {0}".format(", ".join(grown)))
+        sys.exit(1)
+    print("OK: restarts don't grow the scene-graph")
+
+
+if __name__ == "__main__":
+    main()
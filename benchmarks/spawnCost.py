@@ -0,0 +1,57 @@
+# Measures how long it takes to spawn a WalkingEnemy and a TrapEnemy,
+# with and without our Actor-prototypes.
+#
+# Run it from the game's directory like so:
+#   python -m benchmarks.spawnCost
+
+import argparse
+import time
+
+from panda3d.core import Vec3
+
+from main import Game
+from GameObject import WalkingEnemy, TrapEnemy
+from ActorPrototypes import actorPrototypes
+
+
+def timeSpawns(enemyClass, count):
+    enemies = []
+    startTime = time.perf_counter()
+    for i in range(count):
+        enemies.append(enemyClass(Vec3(0, 0, 0)))
+    elapsed = time.perf_counter() - startTime
+
+    for enemy in enemies:
+        enemy.cleanup()
+
+    # Milliseconds per spawn
+    return elapsed * 1000.0 / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-spawn cost of our enemies")
+    parser.add_argument("--count", type=int, default=100,
+                        help="how many enemies of each kind to spawn")
+    args = parser.parse_args()
+
+    Game(headless=True)
+
+    for enemyClass in (WalkingEnemy, TrapEnemy):
+        # "Before": every spawn loads its model and animations itself.
+        # We spawn one first so that Panda's own model-cache is warm,
+        # and we're comparing like with like.
+        actorPrototypes.enabled = False
+        timeSpawns(enemyClass, 1)
+        before = timeSpawns(enemyClass, args.count)
+
+        # "After": every spawn copies a prototype.
+        actorPrototypes.enabled = True
+        timeSpawns(enemyClass, 1)
+        after = timeSpawns(enemyClass, args.count)
+
+        print("{0}: {1:.3f} ms per spawn without prototypes, {2:.3f} ms with ({3:.1f}x)".format(
+            enemyClass.__name__, before, after, before / after))
+
+
+if __name__ == "__main__":
+    main()
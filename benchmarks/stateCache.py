@@ -0,0 +1,58 @@
+# Plays a long, scripted fight--with the laser firing the whole time--
+# and reports the size of Panda's RenderState and TransformState caches
+# as it goes. If these keep on growing, rather than levelling off,
+# something is making new states on every frame.
+#
+# Run it from the game's directory like so:
+#   python -m benchmarks.stateCache
+
+import argparse
+import math
+import random
+
+from main import Game
+from FrameProfiler import getStateCacheSizes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Watch Panda's state-caches during a long fight")
+    parser.add_argument("--seconds", type=float, default=120.0,
+                        help="how long a fight to play, in game-time")
+    parser.add_argument("--report-every", type=float, default=10.0,
+                        help="how often to report, in game-time")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    game = Game(headless=True)
+    random.seed(args.seed)
+    game.startGame()
+
+    game.player.maxHealth = 1000000
+    game.player.health = 1000000
+    game.waveDirector.setCurve("maxEnemies", 20)
+
+    framesPerSecond = 60
+    framesPerReport = int(args.report_every * framesPerSecond)
+    numFrames = int(args.seconds * framesPerSecond)
+
+    print("{0:>8} {1:>13} {2:>13} {3:>16} {4:>16}".format(
+        "time", "renderStates", "(unused)", "transformStates", "(unused)"))
+    for frame in range(numFrames):
+        # Turn slowly on the spot, firing all the while,
+        # so that the laser sweeps across the horde.
+        angle = frame * 0.01
+        game.aimPoint.set(5.0 * math.cos(angle), 5.0 * math.sin(angle), 0)
+        game.keyMap["shoot"] = True
+
+        game.step()
+
+        if (frame + 1) % framesPerReport == 0:
+            sizes = getStateCacheSizes()
+            print("{0:7.1f}s {1:13d} {2:13d} {3:16d} {4:16d}".format(
+                (frame + 1) / framesPerSecond,
+                sizes["renderStates"], sizes["unusedRenderStates"],
+                sizes["transformStates"], sizes["unusedTransformStates"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+# Measures what it costs to handle the traps' collisions (see
+# "CollisionDispatch.py"), with a dense horde around the player and
+# more and more traps sliding back and forth through it.
+#
+# For each number of traps we report how many contacts there were per
+# frame, how many of those were new (and so were handed to a handler),
+# how long the dispatch took, per frame and per contact, and how long
+# a whole frame took. The cost per contact should stay much the same
+# however many traps there are.
+#
+# Each scene is played in a fresh process, so that none is
+# affected by anything that another left behind.
+#
+# Run it from the game's directory like so:
+#   python -m benchmarks.trapDispatch
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from main import Game
+
+
+DEFAULT_TRAPS_PER_SIDE = [2, 8, 16, 32]
+
+
+def playScene(trapsPerSide, hordeSize, numFrames, numWarmupFrames, seed):
+    game = Game(headless=True)
+    random.seed(seed)
+    game.numTrapsPerSide = trapsPerSide
+    game.startGame()
+
+    game.player.maxHealth = 1000000
+    game.player.health = 1000000
+
+    game.waveDirector.setCurve("maxEnemies", hordeSize)
+    for i in range(hordeSize):
+        game.spawnEnemy()
+    game.waveDirector.setCurve("spawnInterval", 0)
+
+    dispatch = game.collisionDispatch
+    numContacts = 0
+    numNewContacts = 0
+    dispatchTime = 0.0
+    frameTime = 0.0
+    for frame in range(numWarmupFrames + numFrames):
+        # Walk in a small square, so that the horde stays bunched up
+        # around the middle of the room
+        phase = (frame // 30) % 4
+        game.keyMap["up"] = phase == 0
+        game.keyMap["right"] = phase == 1
+        game.keyMap["down"] = phase == 2
+        game.keyMap["left"] = phase == 3
+
+        # Send any trap that has come to a stop back the other way,
+        # so that they keep sliding through the horde.
+        for trap in game.trapEnemies:
+            if trap.moveDirection == 0:
+                pos = trap.actor.getPos()
+                lanePos = pos.x if trap.moveInX else pos.y
+                trap.moveDirection = -1 if lanePos > 0 else 1
+
+        startTime = time.perf_counter()
+        game.step()
+        if frame >= numWarmupFrames:
+            frameTime += time.perf_counter() - startTime
+            numContacts += dispatch.numContacts
+            numNewContacts += dispatch.numNewContacts
+            dispatchTime += dispatch.dispatchTime
+
+    return {
+        "trapsPerSide": trapsPerSide,
+        "traps": len(game.trapEnemies),
+        "hordeSize": hordeSize,
+        "frames": numFrames,
+        "contactsPerFrame": numContacts / numFrames,
+        "newContactsPerFrame": numNewContacts / numFrames,
+        "dispatchMsPerFrame": dispatchTime * 1000.0 / numFrames,
+        "usPerContact": dispatchTime * 1000000.0 / max(1, numContacts),
+        "frameMs": frameTime * 1000.0 / numFrames
+    }
+
+
+def playInNewProcess(trapsPerSide, args):
+    outputFile, outputName = tempfile.mkstemp(suffix=".json")
+    os.close(outputFile)
+    try:
+        subprocess.check_call([sys.executable, "-m", "benchmarks.trapDispatch",
+                               "--scene", str(trapsPerSide),
+                               "--horde", str(args.horde),
+                               "--frames", str(args.frames),
+                               "--warmup", str(args.warmup),
+                               "--seed", str(args.seed),
+                               "--output", outputName])
+        with open(outputName) as f:
+            return json.load(f)
+    finally:
+        os.remove(outputName)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the handling of the traps' collisions")
+    parser.add_argument("--traps-per-side",
+                        default=",".join(str(count) for count in DEFAULT_TRAPS_PER_SIDE),
+                        help="comma-separated numbers of traps per side to play")
+    parser.add_argument("--horde", type=int, default=300)
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--warmup", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=1)
+    # Used internally, to play one of the scenes
+    parser.add_argument("--scene", type=int)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    if args.scene is not None:
+        result = playScene(args.scene, args.horde, args.frames, args.warmup, args.seed)
+        with open(args.output, "w") as f:
+            json.dump(result, f)
+        return
+
+    for count in args.traps_per_side.split(","):
+        scene = playInNewProcess(int(count), args)
+        print("{0:4d} traps, {1} enemies: {2:7.1f} contacts ({3:5.1f} new) per frame; "
+              "{4:7.3f} ms per frame, {5:6.3f} us per contact; {6:7.3f} ms per whole frame".format(
+                  scene["traps"], scene["hordeSize"], scene["contactsPerFrame"],
+                  scene["newContactsPerFrame"], scene["dispatchMsPerFrame"],
+                  scene["usPerContact"], scene["frameMs"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+# Checks that no trap ever gets stuck: trying to slide (its
+# "moveDirection" set), but held where it is, and never stopped.
+#
+# First comes a set-up that once did just that: a trap whose lane runs
+# right alongside a trap in a crossing lane, so that the one only just
+# grazes the other in passing. The player then steps into the first
+# trap's lane on the far side of the second, and again from the other
+# side, and the trap should slide freely each time.
+#
+# Then we play a number of games with the usual layout of traps, with
+# the player popping up here and there about the room, and count the
+# traps that get stuck.
+#
+# Run it from the game's directory like so:
+#   python -m benchmarks.trapStalls
+
+import argparse
+import random
+
+from panda3d.core import Vec3
+
+from main import Game
+
+
+# How long (in frames) a trap may be held still while trying to
+# slide before we count it as stuck
+STUCK_FRAMES = 120
+
+
+# Starts a new game, with only the traps and the player in it
+def startGame(game, trapsPerSide, seed):
+    random.seed(seed)
+    game.numTrapsPerSide = trapsPerSide
+    game.startGame()
+
+    game.player.maxHealth = 1000000
+    game.player.health = 1000000
+
+    game.waveDirector.stop()
+
+
+# Runs the game for the given number of frames, and returns
+# the traps that were held still while trying to slide for
+# "STUCK_FRAMES" frames or more
+def findStuckTraps(game, numFrames, heldFrames):
+    stuckTraps = set()
+    for frame in range(numFrames):
+        game.step()
+        for trap in game.trapEnemies:
+            if trap.moveDirection != 0 and trap.alongPos == trap.previousAlongPos:
+                heldFrames[trap] = heldFrames.get(trap, 0) + 1
+                if heldFrames[trap] >= STUCK_FRAMES:
+                    stuckTraps.add(trap)
+            else:
+                heldFrames[trap] = 0
+    return stuckTraps
+
+
+def checkGrazingTraps(game):
+    startGame(game, 0, 1)
+
+    # One trap sliding in y in the lane x = -6.4, and one sliding in x
+    # in the lane y = -2.4, at x = -7.0: just far enough to one side of
+    # the first's lane that the two can touch, but not overlap
+    slidingTrap = game.trapPool.acquire(Vec3(-6.4, -7.0, 0))
+    sideTrap = game.trapPool.acquire(Vec3(-7.0, -2.4, 0), True)
+    for trap in (slidingTrap, sideTrap):
+        game.trapEnemies.append(trap)
+        game.trapLanes.add(trap)
+
+    heldFrames = {}
+    stuckTraps = set()
+    for playerY in (5.0, -5.0, 5.0):
+        game.player.actor.setPos(-6.4, playerY, 0)
+        stuckTraps |= findStuckTraps(game, 300, heldFrames)
+    passed = slidingTrap.alongPos > -2.4 and len(stuckTraps) == 0
+    print("Grazing traps: the sliding trap ended at y = {0:.2f}; {1}".format(
+        slidingTrap.alongPos, "OK" if passed else "STUCK"))
+    return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that no trap gets stuck")
+    parser.add_argument("--seeds", type=int, default=20)
+    parser.add_argument("--traps-per-side", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=100.0)
+    args = parser.parse_args()
+
+    game = Game(headless=True)
+    passed = checkGrazingTraps(game)
+
+    framesPerSecond = 60
+    numStuckGames = 0
+    for seed in range(args.seeds):
+        startGame(game, args.traps_per_side, seed)
+        heldFrames = {}
+        stuckTraps = set()
+        for second in range(int(args.seconds)):
+            game.player.actor.setPos(random.uniform(-7, 7), random.uniform(-7, 7), 0)
+            stuckTraps |= findStuckTraps(game, framesPerSecond, heldFrames)
+        if len(stuckTraps) > 0:
+            numStuckGames += 1
+
+    print("Games with a stuck trap: {0} of {1} ({2} traps per side, {3:.0f} s each)".format(
+        numStuckGames, args.seeds, args.traps_per_side, args.seconds))
+    if passed and numStuckGames == 0:
+        print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+# Measures what a burst-wave of enemies costs the frames around it,
+# with and without the wave-director's spawn-budget (see
+# "WaveDirector.py").
+#
+# Without a budget, every enemy in the burst is built on the frame on
+# which the burst arrives; with one, the burst waits in the spawn-queue
+# and is built a few enemies per frame. For each we report the longest
+# frame, the longest frame but one (to show whether the worst was a
+# one-off), how deep the spawn-queue got, and the longest that any
+# spawn waited in it.
+#
+# Each scene is played in a fresh process, so that none is
+# affected by anything that another left behind.
+#
+# Run it from the game's directory like so:
+#   python -m benchmarks.waveBurst
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from main import Game
+
+
+# A budget so large as to be no budget at all
+UNBUDGETED = {"maxPerFrame": 1000000, "maxMs": 1000000}
+
+
+def playScene(budget, burstSize, numFrames, numWarmupFrames, seed):
+    game = Game(headless=True)
+    director = game.waveDirector
+
+    # A small, steady horde, and then the burst, a second
+    # after our warm-up frames
+    director.setCurve("maxEnemies", 20)
+    director.setCurve("spawnInterval", 0.2)
+    director.bursts = [{"time": 1.0 + numWarmupFrames / 60.0,
+                        "count": burstSize, "type": "walkingEnemy"}]
+    director.maxSpawnsPerFrame = budget["maxPerFrame"]
+    director.maxSpawnMs = budget["maxMs"]
+
+    random.seed(seed)
+    game.numTrapsPerSide = 0
+    game.startGame()
+
+    game.player.maxHealth = 1000000
+    game.player.health = 1000000
+
+    frameTimes = []
+    maxQueueDepth = 0
+    framesToDrain = 0
+    for frame in range(numWarmupFrames + numFrames):
+        phase = (frame // 60) % 4
+        game.keyMap["up"] = phase == 0
+        game.keyMap["right"] = phase == 1
+        game.keyMap["down"] = phase == 2
+        game.keyMap["left"] = phase == 3
+
+        startTime = time.perf_counter()
+        game.step()
+        if frame < numWarmupFrames:
+            continue
+        frameTimes.append(time.perf_counter() - startTime)
+
+        maxQueueDepth = max(maxQueueDepth, director.queueDepth + director.numSpawned)
+        if director.queueDepth > 0:
+            framesToDrain += 1
+
+    frameTimes.sort()
+    return {
+        "budget": budget,
+        "burstSize": burstSize,
+        "enemies": len(game.enemies),
+        "maxFrameMs": frameTimes[-1] * 1000.0,
+        "secondFrameMs": frameTimes[-2] * 1000.0,
+        "medianFrameMs": frameTimes[len(frameTimes) // 2] * 1000.0,
+        "maxQueueDepth": maxQueueDepth,
+        "framesToDrain": framesToDrain,
+        "maxLatencyMs": director.peakLatency * 1000.0
+    }
+
+
+def playInNewProcess(budget, args):
+    outputFile, outputName = tempfile.mkstemp(suffix=".json")
+    os.close(outputFile)
+    try:
+        subprocess.check_call([sys.executable, "-m", "benchmarks.waveBurst",
+                               "--scene", json.dumps(budget),
+                               "--burst", str(args.burst),
+                               "--frames", str(args.frames),
+                               "--warmup", str(args.warmup),
+                               "--seed", str(args.seed),
+                               "--output", outputName])
+        with open(outputName) as f:
+            return json.load(f)
+    finally:
+        os.remove(outputName)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark a burst-wave of enemies, "
+                                                 "with and without a spawn-budget")
+    parser.add_argument("--burst", type=int, default=400)
+    parser.add_argument("--per-frame", type=int, default=4,
+                        help="the most enemies to build in one frame, when budgeted")
+    parser.add_argument("--ms", type=float, default=2.0,
+                        help="the most milliseconds to spend building enemies in one frame, "
+                             "when budgeted")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--warmup", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=1)
+    # Used internally, to play one of the scenes
+    parser.add_argument("--scene")
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    if args.scene is not None:
+        result = playScene(json.loads(args.scene), args.burst, args.frames, args.warmup, args.seed)
+        with open(args.output, "w") as f:
+            json.dump(result, f)
+        return
+
+    budgeted = {"maxPerFrame": args.per_frame, "maxMs": args.ms}
+    for name, budget in (("unbudgeted", UNBUDGETED), ("budgeted", budgeted)):
+        scene = playInNewProcess(budget, args)
+        print("{0:>10}: burst of {1}; longest frame {2:7.2f} ms (next {3:6.2f}, median {4:5.2f}); "
+              "queue up to {5} deep, drained in {6} frames; longest wait {7:6.1f} ms".format(
+                  name, scene["burstSize"], scene["maxFrameMs"], scene["secondFrameMs"],
+                  scene["medianFrameMs"], scene["maxQueueDepth"], scene["framesToDrain"],
+                  scene["maxLatencyMs"]))
+
+
+if __name__ == "__main__":
+    main()
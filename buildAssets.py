@@ -0,0 +1,282 @@
+# Compiles our models ahead of time, so that the game needn't parse
+# them every time that it starts.
+#
+# Our models and animations are kept as text ".egg" files, which are
+# slow to parse, and their textures as PNGs, which are slow to decode
+# (and have their mipmaps worked out afresh on every load). This
+# script loads each of them just once, and writes out:
+#  - a ".bam" file for each model and animation--Panda's own binary
+#    format, which loads much more quickly, and
+#  - a ".txo" file for each texture--a Panda texture-object, already
+#    decoded, with its mipmaps already worked out.
+#
+# Everything is written to the "assetCache" folder, along with a
+# manifest, which the game reads at start-up (see "AssetCache.py").
+# The manifest records a hash of each model's contents (the model
+# itself and the textures that it uses), so that running this again
+# only rebuilds the models whose files have changed. Textures are
+# named by the hash of their contents, so a texture that's shared
+# by several models is only written once.
+#
+# Run it from the game's directory like so:
+#   python buildAssets.py
+# or, for smaller files (that are rather slower to load):
+#   python buildAssets.py --compress
+
+import argparse
+import hashlib
+import json
+import os
+import time
+
+from panda3d.core import loadPrcFileData
+# We load every model fresh from its source, and want the paths
+# in the ".bam" files that we write to be relative ones, so that
+# the cache may be moved (along with the rest of the game).
+loadPrcFileData("buildAssets", "model-cache-dir\n"
+                               "window-type none\n"
+                               "audio-library-name null\n"
+                               "bam-texture-mode relative")
+
+from panda3d.core import Filename, Loader, LoaderOptions, NodePath, TexturePool, getModelPath
+
+from AssetCache import CACHE_DIR_NAME, MANIFEST_NAME, MANIFEST_VERSION, getFileStamp
+
+
+GAME_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Where our source-models are kept, and the extensions that they have
+SOURCE_DIRS = ["models"]
+SOURCE_EXTENSIONS = [".egg", ".egg.pz"]
+
+
+def hashFile(path):
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+# The hash of a model's contents: that of the model-file itself,
+# and those of the image-files that its textures come from
+# (by their paths). (A texture's own hash is made the same way,
+#  from the hashes of its image-files.)
+def hashModel(sourceHash, textureHashes):
+    hasher = hashlib.sha256(sourceHash.encode("ascii"))
+    for texturePath in sorted(textureHashes):
+        hasher.update(texturePath.encode("utf-8"))
+        hasher.update(textureHashes[texturePath].encode("ascii"))
+    return hasher.hexdigest()
+
+
+# Paths in the manifest are relative to the game's folder,
+# and use forward slashes on every platform
+def getRelativePath(path):
+    return os.path.relpath(path, GAME_DIR).replace(os.sep, "/")
+
+
+# Finds our source-models, and the names by which the game
+# loads them (their paths, less their extensions)
+def findSources():
+    sources = {}
+    for sourceDir in SOURCE_DIRS:
+        for dirPath, dirNames, fileNames in os.walk(os.path.join(GAME_DIR, sourceDir)):
+            dirNames.sort()
+            for fileName in sorted(fileNames):
+                for extension in SOURCE_EXTENSIONS:
+                    if fileName.endswith(extension):
+                        sourcePath = getRelativePath(os.path.join(dirPath, fileName))
+                        sources[sourcePath[:-len(extension)]] = sourcePath
+    return sources
+
+
+class AssetBuilder:
+    def __init__(self, cacheDir, compress):
+        self.cacheDir = cacheDir
+        # If set, our ".bam" and ".txo" files are compressed
+        # (as ".bam.pz" and ".txo.pz" files)
+        self.compress = compress
+        self.suffix = ".pz" if compress else ""
+
+        self.loader = Loader.getGlobalPtr()
+        self.loaderOptions = LoaderOptions(LoaderOptions.LF_no_cache | LoaderOptions.LF_report_errors)
+
+        self.manifest = {"version": MANIFEST_VERSION, "assets": {}}
+        self.numBuilt = 0
+        self.numUpToDate = 0
+
+    def loadManifest(self):
+        path = os.path.join(self.cacheDir, MANIFEST_NAME)
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            manifest = json.load(f)
+        if manifest.get("version") != MANIFEST_VERSION:
+            return {}
+        return manifest["assets"]
+
+    def saveManifest(self):
+        path = os.path.join(self.cacheDir, MANIFEST_NAME)
+        with open(path, "w") as f:
+            json.dump(self.manifest, f, indent=2, sort_keys=True)
+
+    def getOutputPath(self, relativePath):
+        return os.path.join(self.cacheDir, relativePath.replace("/", os.sep))
+
+    # Whether the compiled model in the given (old) manifest-entry
+    # is still good for its source
+    def isUpToDate(self, entry, sourcePath):
+        if entry is None or entry["source"] != sourcePath:
+            return False
+        if not entry["output"].endswith(".bam" + self.suffix):
+            return False
+
+        outputs = [entry["output"]] + list(entry["textures"].values())
+        if not all(os.path.exists(self.getOutputPath(output)) for output in outputs):
+            return False
+
+        try:
+            textureHashes = {path: hashFile(os.path.join(GAME_DIR, path)) for path in entry["textures"]}
+        except OSError:
+            return False
+        return entry["hash"] == hashModel(hashFile(os.path.join(GAME_DIR, sourcePath)), textureHashes)
+
+    # Writes out the given texture as a ".txo" file (if it
+    # hasn't been already). Returns the path of the ".txo" file,
+    # and the hashes of the image-files that it came from, by
+    # their paths (there being two if its alpha-channel comes
+    # from a file of its own).
+    def buildTexture(self, texture):
+        sourceHashes = {}
+        sourcePath = getRelativePath(texture.getFullpath().toOsSpecific())
+        sourceHashes[sourcePath] = hashFile(os.path.join(GAME_DIR, sourcePath))
+        if texture.hasAlphaFilename():
+            alphaPath = getRelativePath(texture.getAlphaFullpath().toOsSpecific())
+            sourceHashes[alphaPath] = hashFile(os.path.join(GAME_DIR, alphaPath))
+        textureHash = hashModel("", sourceHashes)
+
+        name = os.path.splitext(os.path.basename(sourcePath))[0]
+        outputPath = "textures/{0}-{1}.txo{2}".format(name, textureHash[:16], self.suffix)
+        output = Filename.fromOsSpecific(self.getOutputPath(outputPath))
+        if not os.path.exists(output.toOsSpecific()):
+            # If the texture will be mipmapped, work out
+            # its mipmaps now, rather than at every load
+            if texture.usesMipmaps():
+                texture.generateRamMipmapImages()
+            output.makeDir()
+            if not texture.write(output):
+                raise IOError("couldn't write {0}".format(outputPath))
+
+        # Have the ".bam" file refer to the ".txo" file.
+        # (The ".txo" file already holds any alpha-channel
+        #  that came from a separate file.)
+        texture.setFilename(output)
+        texture.setFullpath(output)
+        texture.clearAlphaFilename()
+
+        return outputPath, sourceHashes
+
+    def buildModel(self, name, sourcePath):
+        # Textures are shared between the models that use them, so
+        # we start each model with fresh ones, named for their sources
+        TexturePool.releaseAllTextures()
+
+        node = self.loader.loadSync(Filename(sourcePath), self.loaderOptions)
+        if node is None:
+            print("  couldn't load {0}; skipping it".format(sourcePath))
+            return None
+        model = NodePath(node)
+
+        textureHashes = {}
+        textureOutputs = {}
+        for texture in model.findAllTextures():
+            outputPath, sourceHashes = self.buildTexture(texture)
+            for texturePath, textureHash in sourceHashes.items():
+                textureHashes[texturePath] = textureHash
+                textureOutputs[texturePath] = outputPath
+
+        outputPath = name + ".bam" + self.suffix
+        output = Filename.fromOsSpecific(self.getOutputPath(outputPath))
+        output.makeDir()
+        if not model.writeBamFile(output):
+            print("  couldn't write {0}; skipping it".format(outputPath))
+            return None
+        model.removeNode()
+
+        return {
+            "source": sourcePath,
+            "hash": hashModel(hashFile(os.path.join(GAME_DIR, sourcePath)), textureHashes),
+            "output": outputPath,
+            "textures": textureOutputs,
+            "stamps": self.getStamps(sourcePath, textureOutputs)
+        }
+
+    # The sizes and modification-times of the files that went into a
+    # model, by which the game can quickly tell whether they've changed
+    def getStamps(self, sourcePath, textureOutputs):
+        return {path: getFileStamp(os.path.join(GAME_DIR, path))
+                for path in [sourcePath] + sorted(textureOutputs)}
+
+    def build(self, force=False):
+        oldAssets = {} if force else self.loadManifest()
+
+        for name, sourcePath in sorted(findSources().items()):
+            entry = oldAssets.get(name)
+            if self.isUpToDate(entry, sourcePath):
+                # Our files' times may have changed even if their
+                # contents haven't (as when checked out afresh)
+                entry["stamps"] = self.getStamps(sourcePath, entry["textures"])
+                self.manifest["assets"][name] = entry
+                self.numUpToDate += 1
+                continue
+
+            startTime = time.perf_counter()
+            entry = self.buildModel(name, sourcePath)
+            if entry is None:
+                continue
+            self.manifest["assets"][name] = entry
+            self.numBuilt += 1
+            print("  built {0} ({1} textures) in {2:.0f} ms".format(
+                entry["output"], len(entry["textures"]), (time.perf_counter() - startTime) * 1000.0))
+
+        self.saveManifest()
+        self.removeUnusedFiles()
+
+    # Removes anything in the cache that the manifest no longer refers to
+    def removeUnusedFiles(self):
+        usedPaths = {MANIFEST_NAME}
+        for entry in self.manifest["assets"].values():
+            usedPaths.add(entry["output"])
+            usedPaths.update(entry["textures"].values())
+
+        for dirPath, dirNames, fileNames in os.walk(self.cacheDir, topdown=False):
+            for fileName in fileNames:
+                path = os.path.join(dirPath, fileName)
+                if os.path.relpath(path, self.cacheDir).replace(os.sep, "/") not in usedPaths:
+                    os.remove(path)
+            if dirPath != self.cacheDir and len(os.listdir(dirPath)) == 0:
+                os.rmdir(dirPath)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile our models and textures for faster loading")
+    parser.add_argument("--cache-dir", default=os.path.join(GAME_DIR, CACHE_DIR_NAME))
+    parser.add_argument("--compress", action="store_true",
+                        help="write compressed files (smaller, but slower to load)")
+    parser.add_argument("--force", action="store_true",
+                        help="rebuild everything, even if it's up to date")
+    args = parser.parse_args()
+
+    getModelPath().prependDirectory(Filename.fromOsSpecific(GAME_DIR))
+    os.makedirs(args.cache_dir, exist_ok=True)
+
+    startTime = time.perf_counter()
+    builder = AssetBuilder(args.cache_dir, args.compress)
+    builder.build(args.force)
+    print("{0} models built, {1} up to date, in {2:.1f} s".format(
+        builder.numBuilt, builder.numUpToDate, time.perf_counter() - startTime))
+
+
+if __name__ == "__main__":
+    main()
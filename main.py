@@ -1,7 +1,26 @@
 import panda3d
+import numpy as np
+import os
 import random
+import time
 from GameObject import *
-from panda3d.core import loadPrcFile
+from EnemyPool import EnemyPool
+from SoundBank import SoundBank
+from HordeKinematics import HordeKinematics
+from SpatialGrid import SpatialGrid
+from FrameProfiler import FrameProfiler, RenderChangeMonitor, getStateCacheSizes
+from InputRecorder import InputRecorder, InputReplay
+from AnimationBudget import AnimationBudget
+from Scheduler import Scheduler
+from EntityRegistry import EntityRegistry
+from CollisionDispatch import CollisionDispatch
+from TrapLanes import TrapLanes
+from WaveDirector import WaveDirector
+from FlowField import FlowField
+from CrowdSeparation import CrowdSeparation
+from PlayerPrefab import PlayerPrefab
+from AssetCache import assetCache
+from panda3d.core import loadPrcFile, loadPrcFileData
 # Load configuration settings from config.py
 loadPrcFile("Panda3D2/config.prc")
 
@@ -10,7 +29,8 @@ from direct.showbase.ShowBaseGlobal import globalClock
 from direct.task.TaskManagerGlobal import taskMgr
 from panda3d.core import WindowProperties, BoundingSphere
 from panda3d.core import AmbientLight, DirectionalLight
-from panda3d.core import Vec4, Vec3
+from panda3d.core import Vec4, Vec3, Point3
+from panda3d.core import ClockObject, Filename, getModelPath, PStatClient
 from panda3d.core import CollisionTraverser, CollisionHandlerPusher, CollisionTube
 from panda3d.core import CollisionNode, CollisionSphere
 
@@ -18,16 +38,59 @@ from direct.gui.DirectGui import *
 
 class Game(ShowBase):
 
-    def __init__(self):
+    def __init__(self, headless=False, wavesFile=None):
+        # In headless mode we open no window and no audio device,
+        # so that the game can run on machines without a GPU or
+        # sound-card--such as our CI boxes--and faster than real time.
+        # "window-type none" keeps ShowBase from opening a window, and
+        # the "null" audio library gives us silent sounds that can
+        # still be played and stopped as usual.
+        self.headless = headless
+        if self.headless:
+            loadPrcFileData("headless", "window-type none\naudio-library-name null")
+
         ShowBase.__init__(self)
 
-        self.disableMouse()
+        # Our models, sounds and so on are found relative to this file,
+        # so that the game can also be driven from other scripts
+        # (such as benchmarks) that don't live alongside it.
+        gameDir = os.path.dirname(os.path.abspath(__file__))
+        getModelPath().prependDirectory(Filename.fromOsSpecific(gameDir))
+
+        # Our models are loaded from their compiled versions where
+        # we have them (see "buildAssets.py" and "AssetCache.py").
+        assetCache.load(gameDir)
 
-        properties = WindowProperties()
-        properties.setSize(950, 600)
-        self.win.requestProperties(properties)
+        self.disableMouse()
 
-        self.exitFunc = self.cleanup
+        if self.win is not None:
+            properties = WindowProperties()
+            properties.setSize(950, 600)
+            self.win.requestProperties(properties)
+
+        # Without a window there's no mouse to aim with, so
+        # the Player aims at this point on the ground instead.
+        # The caller of a headless game is free to move it around.
+        self.aimPoint = None
+        if self.headless:
+            self.aimPoint = Point3(0, 1, 0)
+
+            # We want "dt" to be whatever the caller asks for,
+            # not however long the frame actually took. A non-real-time
+            # clock advances by exactly 1/frame-rate on every tick,
+            # and since our Actors' animations run from the same clock,
+            # they stay in step with the simulation too.
+            # Starting the clock from zero also means that two headless
+            # runs see exactly the same frame-times, and so
+            # play out exactly the same way.
+            globalClock.setMode(ClockObject.MNonRealTime)
+            globalClock.reset()
+            self.setFixedDt(1.0 / 60.0)
+
+        # However we come to exit--via the "quit" button, or by
+        # the window being closed--we shut everything down first
+        self.exitFunc = self.shutDownGame
+        self.isGameShutDown = False
 
         mainLight = DirectionalLight("main light")
         self.mainLightNodePath = self.render.attachNewNode(mainLight)
@@ -46,11 +109,13 @@ class Game(ShowBase):
 
 
         # Setting up the environment using the loadModel method
-        self.environment = self.loader.loadModel("models/Environment/environment")
+        self.environment = self.loader.loadModel(assetCache.getModelName("models/Environment/environment"))
         self.environment.reparentTo(self.render)
 
-        self.camera.setPos(0, 0, 32)
-        self.camera.setP(-90)
+        # (There's no camera if we have no window.)
+        if self.camera is not None:
+            self.camera.setPos(0, 0, 32)
+            self.camera.setP(-90)
 
         self.keyMap = {
             "up": False,
@@ -81,15 +146,14 @@ class Game(ShowBase):
         # (not 3D because we're playing on a flat surface)
         self.pusher.setHorizontal(True)
 
-        # We ask pusher to "in"-pattern of the form “%fn-into-%in”.
-        # "%fn" will be replaced with "from" collision object and "%in" will be replaced with "into" collision object.
-        self.pusher.add_in_pattern("%fn-into-%in")
-
-        # receiving those events (works similar to key-events)
-        self.accept("trapEnemy-into-wall", self.stopTrap)
-        self.accept("trapEnemy-into-trapEnemy", self.stopTrap)
-        self.accept("trapEnemy-into-player", self.trapHitsSomething)
-        self.accept("trapEnemy-into-walkingEnemy", self.trapHitsSomething)
+        # Our traps' collisions don't go through the pusher, or through
+        # events: they're found by our "TrapLanes" (see below), and handed
+        # straight to the methods below. See "CollisionDispatch.py".
+        self.collisionDispatch = CollisionDispatch()
+        self.collisionDispatch.addHandler("trapEnemy", "wall", self.stopTrap)
+        self.collisionDispatch.addHandler("trapEnemy", "trapEnemy", self.stopTrap)
+        self.collisionDispatch.addHandler("trapEnemy", "player", self.trapHitsSomething)
+        self.collisionDispatch.addHandler("trapEnemy", "walkingEnemy", self.trapHitsSomething)
 
 
         # Tubes are defined by their start-points, end-points, and radius.
@@ -119,17 +183,50 @@ class Game(ShowBase):
         wall = self.render.attachNewNode(wallNode)
         wall.setX(-8.0)
 
+        # The same walls, as seen from above: each is a line-segment,
+        # given by its start- and end- points, with a thickness.
+        # (The player's laser checks these directly.)
+        self.walls = [
+            (-8.0, 8.0, 8.0, 8.0, 0.2),
+            (-8.0, -8.0, 8.0, -8.0, 0.2),
+            (8.0, -8.0, 8.0, 8.0, 0.2),
+            (-8.0, -8.0, -8.0, 8.0, 0.2)
+        ]
+
         # Adding task to task manager
         self.updateTask = taskMgr.add(self.update, "update")
 
+        # Timing each phase of our frames; see "FrameProfiler.py".
+        # The collision-traverser is run by ShowBase in a task of its own
+        # (with a "sort" of 30), so we time it with a pair of tasks that
+        # run just before and just after that one.
+        self.profiler = FrameProfiler(["Grid", "Player", "Timers", "Spawn", "FlowField",
+                                       "AI", "Animation", "Traps", "DeadSweep", "Collision",
+                                       "CollisionDispatch"])
+        taskMgr.add(self.beginCollisionProfile, "beginCollisionProfile", sort=29)
+        taskMgr.add(self.endCollisionProfile, "endCollisionProfile", sort=31)
+
+        # Once all of the frame's collisions have been found,
+        # the collision-dispatch moves on to the next frame
+        taskMgr.add(self.dispatchCollisions, "dispatchCollisions", sort=32)
+
+        # The last of our work in each frame: finishing
+        # the profiler's record of the frame
+        taskMgr.add(self.endProfileFrame, "endProfileFrame", sort=33)
+
         # We start with no Player character
         self.player = None
 
         # Our enemies, traps, and "dead enemies"
-        self.enemies = []
+        # (See "EntityRegistry.py" for why these aren't simple lists.)
+        self.enemies = EntityRegistry()
         self.trapEnemies = []
 
-        self.deadEnemies = []
+        self.deadEnemies = EntityRegistry()
+
+        # Enemies that have died since we last checked; each is added
+        # here by "enemyDied" at the moment that it dies.
+        self.newlyDeadEnemies = []
 
         # Setting up some spawn points
         # These spawn points are positions spaced evenly along the walls,
@@ -143,22 +240,111 @@ class Game(ShowBase):
             self.spawnPoints.append(Vec3(coord, -7.0, 0))
             self.spawnPoints.append(Vec3(coord, 7.0, 0))
 
-        # Values to control when to spawn enemies, and
-        # how many enemies there may be at once
-        self.initialSpawnInterval = 1.0
-        self.minimumSpawnInterval = 0.2
-        self.spawnInterval = self.initialSpawnInterval
-        self.spawnTimer = self.spawnInterval
-        self.maxEnemies = 2
-        self.maximumMaxEnemies = 20
+        # Everything that's to happen after a delay--spawns, attacks,
+        # clearing away corpses and so on--is kept here; see "Scheduler.py".
+        # It only runs while a game is being played.
+        self.scheduler = Scheduler()
+
+        # When to spawn enemies, how many there may be at once, and
+        # of which kinds, are all read from a config-file ("waves.json",
+        # unless another is given); see "WaveDirector.py".
+        if wavesFile is None:
+            wavesFile = os.path.join(os.path.dirname(os.path.abspath(__file__)), "waves.json")
+        self.waveDirector = WaveDirector(self.scheduler, self.spawnPoints,
+                                         self.spawnEnemy, lambda: len(self.enemies))
+        self.waveDirector.loadConfig(wavesFile)
+
+        # The classes of enemy that the waves may call for,
+        # by the names used in the config-file
+        self.enemyClasses = {
+            "walkingEnemy": WalkingEnemy
+        }
+
+        # Dead enemies are kept here to be re-used for
+        # later spawns, rather than being destroyed;
+        # there's a pool for each kind of enemy.
+        peakEnemies = self.waveDirector.getPeakEnemies()
+        self.enemyPools = {}
+        for enemyType, enemyClass in self.enemyClasses.items():
+            self.enemyPools[enemyType] = EnemyPool(enemyClass, peakEnemies)
+
+        # Rather than updating our walking enemies one by one,
+        # we move the whole horde at once; see "HordeKinematics.py".
+        # (Setting this to False before starting a game
+        # goes back to updating each enemy by itself.)
+        self.useBatchedHorde = True
+        # Enemies with a trap in their way find their way around it
+        # by a single "flow-field", shared by the whole horde; see
+        # "FlowField.py". (Its cells are a unit across, and a trap and
+        # an enemy may come within 0.6 units--their radii--of each other.)
+        self.flowField = FlowField(8.0, 1.0, 0.6)
+        # Our walking enemies are pushed apart where they overlap,
+        # rather than by the pusher; see "CrowdSeparation.py".
+        # (Their collision-spheres have a radius of 0.3, and the
+        #  walls' inside faces are 7.8 units from the middle.)
+        self.crowdSeparation = CrowdSeparation(0.3, 0.5, 7.5)
+        self.horde = HordeKinematics(self.flowField, self.crowdSeparation)
+
+        # Where everything is, rebuilt once per frame, so that
+        # short-range checks (like enemy attacks) needn't involve
+        # the collision-traverser; see "SpatialGrid.py".
+        self.entityGrid = SpatialGrid(1.0)
+
+        # Our traps, kept by the lanes that they slide along, so that
+        # we can tell what they run into without the collision-traverser;
+        # see "TrapLanes.py". (The walls' inside faces are 7.8 units
+        # from the middle of the room.)
+        self.trapLanes = TrapLanes(self.collisionDispatch, self.entityGrid, 7.8)
+
+        # Only the enemies nearest to the player animate at full rate;
+        # see "AnimationBudget.py".
+        self.animationBudget = AnimationBudget()
 
         self.numTrapsPerSide = 2
 
-        self.difficultyInterval = 5.0
-        self.difficultyTimer = self.difficultyInterval
+        # The places along each side of the room at which a trap may
+        # be put; each game chooses from among these at random.
+        self.trapSlots = []
+        trapSlotDistance = 0.4
+        slotPos = -8 + trapSlotDistance
+        while slotPos < 8:
+            if abs(slotPos) > 1.0:
+                self.trapSlots.append(slotPos)
+            slotPos += trapSlotDistance
 
-        # setting up the sound effect for enemy spawning
-        self.enemySpawnSound = self.loader.loadSfx("sounds/enemySpawn.ogg")
+        # When a game is restarted, its traps and Player are kept and
+        # reset in place for the next game (as its enemies are, via
+        # their pools), rather than being destroyed and built again.
+        # (Setting this to False builds every game from scratch,
+        #  which is mostly useful for measuring what this saves us.)
+        self.warmRestart = True
+        self.trapPool = EnemyPool(TrapEnemy, len(self.trapSlots) * 4)
+        self.sparePlayer = None
+
+        # When the current game was started, until its first frame is
+        # done, and how long the last game took to get that far
+        self.restartStartTime = None
+        self.restartTime = 0
+
+        # Recording our games, or playing back a recorded game;
+        # see "InputRecorder.py". Neither is used by default.
+        self.inputRecorder = None
+        self.inputReplay = None
+
+        # Loading all of our sound-effects once, up front.
+        # The number given for each is how many copies of that
+        # sound may play at once; see "SoundBank.py".
+        self.soundBank = SoundBank(self.loader)
+        self.soundBank.register("enemySpawn", "sounds/enemySpawn.ogg", 2)
+        self.soundBank.register("enemyDie", "sounds/enemyDie.ogg", 4)
+        self.soundBank.register("enemyAttack", "sounds/enemyAttack.ogg", 4)
+        self.soundBank.register("trapHitsSomething", "sounds/trapHitsSomething.ogg", 3)
+        self.soundBank.register("trapStop", "sounds/trapStop.ogg", 3)
+        self.soundBank.register("trapSlide", "sounds/trapSlide.ogg", 4, loop=True)
+        self.soundBank.register("laserHit", "sounds/laserHit.ogg", loop=True)
+        self.soundBank.register("laserNoHit", "sounds/laserNoHit.ogg", loop=True)
+        self.soundBank.register("playerHurt", "sounds/FemaleDmgNoise.ogg")
+        self.soundBank.register("uiClick", "sounds/UIClick.ogg")
 
         # Creating a dialogue box for "game over" menu
         #
@@ -185,6 +371,14 @@ class Game(ShowBase):
         # loading the font
         self.font = self.loader.loadFont("font/wbx_komik/Wbxkomik.ttf")
 
+        # The player-character's laser-beam, hit-effects, light and HUD,
+        # built once here and reused by every game's Player
+        self.playerPrefab = PlayerPrefab(Player.defaultMaxHealth)
+
+        # Watching for changes to the scene's lights, and for
+        # new shaders being generated; see "FrameProfiler.py"
+        self.renderChangeMonitor = RenderChangeMonitor(render)
+
         # A set of images, one for each button-state,
         # in the order that Panda expects
         buttonImages = (
@@ -230,7 +424,7 @@ class Game(ShowBase):
                            parent=self.gameOverScreen,
                            scale=0.07,
                            text_font=self.font,
-                           clickSound=self.loader.loadSfx("sounds/UIClick.ogg"),
+                           clickSound=self.soundBank.getSound("uiClick"),
                            frameTexture=buttonImages,
                            frameSize=(-4, 4, -1, 1),
                            text_scale=0.75,
@@ -244,7 +438,7 @@ class Game(ShowBase):
                            parent=self.gameOverScreen,
                            scale=0.07,
                            text_font=self.font,
-                           clickSound=self.loader.loadSfx("sounds/UIClick.ogg"),
+                           clickSound=self.soundBank.getSound("uiClick"),
                            frameTexture=buttonImages,
                            frameSize=(-4, 4, -1, 1),
                            text_scale=0.75,
@@ -289,7 +483,7 @@ class Game(ShowBase):
                            parent=self.titleMenu,
                            scale=0.1,
                            text_font=self.font,
-                           clickSound=self.loader.loadSfx("sounds/UIClick.ogg"),
+                           clickSound=self.soundBank.getSound("uiClick"),
                            frameTexture=buttonImages,
                            frameSize=(-4, 4, -1, 1),
                            text_scale=0.75,
@@ -303,7 +497,7 @@ class Game(ShowBase):
                            parent=self.titleMenu,
                            scale=0.1,
                            text_font=self.font,
-                           clickSound=self.loader.loadSfx("sounds/UIClick.ogg"),
+                           clickSound=self.soundBank.getSound("uiClick"),
                            frameTexture=buttonImages,
                            frameSize=(-4, 4, -1, 1),
                            text_scale=0.75,
@@ -326,103 +520,169 @@ class Game(ShowBase):
         # game, hide the game-over screen!
         self.gameOverScreen.hide()
 
-        self.cleanup()
+        self.restartStartTime = time.perf_counter()
 
-        self.player = Player()
-
-        self.maxEnemies = 2
-        self.spawnInterval = self.initialSpawnInterval
+        self.cleanup()
 
-        self.difficultyTimer = self.difficultyInterval
+        # Everything random about a game follows from this seed,
+        # so a recording need only store the seed to reproduce it.
+        if self.inputReplay is not None:
+            random.seed(self.inputReplay.seed)
+        elif self.inputRecorder is not None:
+            seed = random.getrandbits(63)
+            random.seed(seed)
+            self.inputRecorder.begin(seed, globalClock.getFrameTime())
+
+        if self.sparePlayer is not None:
+            self.player = self.sparePlayer
+            self.sparePlayer = None
+            self.player.reset(Vec3(0, 0, 0))
+        else:
+            self.player = Player()
+
+        # How quickly this machine builds enemies mustn't change
+        # when they appear in a game that's recorded or played back
+        self.waveDirector.useTimeBudget = self.inputRecorder is None and self.inputReplay is None
+        self.waveDirector.start()
 
         sideTrapSlots = [
-            [],
-            [],
-            [],
-            []
+            list(self.trapSlots),
+            list(self.trapSlots),
+            list(self.trapSlots),
+            list(self.trapSlots)
         ]
-        trapSlotDistance = 0.4
-        slotPos = -8 + trapSlotDistance
-        while slotPos < 8:
-            if abs(slotPos) > 1.0:
-                sideTrapSlots[0].append(slotPos)
-                sideTrapSlots[1].append(slotPos)
-                sideTrapSlots[2].append(slotPos)
-                sideTrapSlots[3].append(slotPos)
-            slotPos += trapSlotDistance
 
         # Create one trap on each side, repeating
         # for however many traps there should be
-        # per side.
-        for i in range(self.numTrapsPerSide):
+        # per side (or for as many as there's room for).
+        for i in range(min(self.numTrapsPerSide, len(sideTrapSlots[0]))):
             # Note that we "pop" the chosen location,
             # so that it won't be chosen again.
             slot = sideTrapSlots[0].pop(random.randint(0, len(sideTrapSlots[0]) - 1))
-            trap = TrapEnemy(Vec3(slot, 7.0, 0))
+            trap = self.trapPool.acquire(Vec3(slot, 7.0, 0))
             self.trapEnemies.append(trap)
+            self.trapLanes.add(trap)
 
             slot = sideTrapSlots[1].pop(random.randint(0, len(sideTrapSlots[1]) - 1))
-            trap = TrapEnemy(Vec3(slot, -7.0, 0))
+            trap = self.trapPool.acquire(Vec3(slot, -7.0, 0))
             self.trapEnemies.append(trap)
+            self.trapLanes.add(trap)
 
             slot = sideTrapSlots[2].pop(random.randint(0, len(sideTrapSlots[2]) - 1))
-            trap = TrapEnemy(Vec3(7.0, slot, 0))
-            trap.moveInX = True
+            trap = self.trapPool.acquire(Vec3(7.0, slot, 0), True)
             self.trapEnemies.append(trap)
+            self.trapLanes.add(trap)
 
             slot = sideTrapSlots[3].pop(random.randint(0, len(sideTrapSlots[3]) - 1))
-            trap = TrapEnemy(Vec3(-7.0, slot, 0))
-            trap.moveInX = True
+            trap = self.trapPool.acquire(Vec3(-7.0, slot, 0), True)
             self.trapEnemies.append(trap)
+            self.trapLanes.add(trap)
+
+
+    # Sets the amount of time that each frame of a headless game simulates
+    def setFixedDt(self, dt):
+        globalClock.setFrameRate(1.0 / dt)
+
+
+    # Runs the game for a number of frames without waiting on a window.
+    # Each step runs all of our tasks--including "update" and the
+    # collision-traverser--just as a frame of the interactive game does.
+    def step(self, numFrames=1):
+        for i in range(numFrames):
+            taskMgr.step()
+
+
+    # Records every game played from here on to the given file.
+    # (Each new game replaces the last one's recording.)
+    def startInputRecording(self, fileName):
+        self.inputRecorder = InputRecorder(fileName)
+
+
+    # Plays back a game recorded by "startInputRecording", frame by frame,
+    # exactly as it happened--including how long each frame took.
+    # This may be done with or without a window.
+    def playReplay(self, fileName):
+        self.inputReplay = InputReplay(fileName)
+
+        # Rather than following the real time, the clock
+        # will take each frame's time from the recording.
+        globalClock.setMode(ClockObject.MSlave)
+        globalClock.setFrameTime(self.inputReplay.startFrameTime)
+        self.startGame()
+
+        while not self.inputReplay.isFinished():
+            frameTime, dt, keyMap, aimPos = self.inputReplay.nextFrame()
+            globalClock.setFrameTime(frameTime)
+            globalClock.setDt(dt)
+            self.keyMap.update(keyMap)
+            self.aimPoint = aimPos
+            taskMgr.step()
+
+        self.inputReplay = None
 
 
     # updating the state of the game with key press and release
     def updateKeyMap(self, controlName, controlState):
+        # While playing back a recording, the
+        # recording decides which keys are held.
+        if self.inputReplay is not None:
+            return
         self.keyMap[controlName] = controlState
         print(controlName, "set to", controlState)
 
 
-    def spawnEnemy(self):
-        if len(self.enemies) < self.maxEnemies:
+    # Called by the scheduler once a dead enemy has
+    # finished its "die" animation: return it to the pool.
+    def removeDeadEnemy(self, enemy):
+        self.deadEnemies.remove(enemy)
+        self.enemyPools[enemy.colliderName].release(enemy)
+
+
+    # Called by an enemy at the moment that it dies. We don't deal with it
+    # straight away (as this might be in the middle of updating our enemies),
+    # but in "update", once our enemies have all been updated.
+    def enemyDied(self, enemy):
+        self.newlyDeadEnemies.append(enemy)
+
+
+    # Builds an enemy straight away. This is called by our wave-director
+    # when it's time for a spawn; if no spawn-point is given, one is
+    # chosen at random.
+    def spawnEnemy(self, enemyType="walkingEnemy", spawnPoint=None):
+        if spawnPoint is None:
             spawnPoint = random.choice(self.spawnPoints)
 
-            newEnemy = WalkingEnemy(spawnPoint)
+        newEnemy = self.enemyPools[enemyType].acquire(spawnPoint)
+        newEnemy.deathCallback = self.enemyDied
 
-            self.enemySpawnSound.play()
+        self.soundBank.play("enemySpawn")
 
-            self.enemies.append(newEnemy)
+        self.enemies.add(newEnemy)
+        if self.useBatchedHorde:
+            self.horde.add(newEnemy)
 
 
-    def stopTrap(self, entry):
-        collider = entry.getFromNodePath()
-        if collider.hasPythonTag("owner"):
-            trap = collider.getPythonTag("owner")
-            trap.moveDirection = 0
-            trap.ignorePlayer = False
-            trap.movementSound.stop()
-            trap.stopSound.play()
+    def stopTrap(self, trap, other):
+        trap.moveDirection = 0
+        trap.ignorePlayer = False
+        self.soundBank.stop("trapSlide", trap)
+        self.soundBank.play("trapStop", trap)
 
 
-    def trapHitsSomething(self, entry):
-        collider = entry.getFromNodePath()
-        if collider.hasPythonTag("owner"):
-            trap = collider.getPythonTag("owner")
-            # We don't want stationary traps to do damage,
-            # so ignore the collision if the "moveDirection" is 0
-            if trap.moveDirection == 0:
-                return
+    def trapHitsSomething(self, trap, obj):
+        # We don't want stationary traps to do damage,
+        # so ignore the collision if the "moveDirection" is 0
+        if trap.moveDirection == 0:
+            return
 
-            collider = entry.getIntoNodePath()
-            if collider.hasPythonTag("owner"):
-                obj = collider.getPythonTag("owner")
-                if isinstance(obj, Player):
-                    if not trap.ignorePlayer:
-                        obj.alterHealth(-1)
-                        trap.ignorePlayer = True
-                else:
-                    obj.alterHealth(-10)
-                # playing the impact sound
-                trap.impactSound.play()
+        if isinstance(obj, Player):
+            if not trap.ignorePlayer:
+                obj.alterHealth(-1)
+                trap.ignorePlayer = True
+        else:
+            obj.alterHealth(-10)
+        # playing the impact sound
+        self.soundBank.play("trapHitsSomething", trap)
 
 
     # Method that accepts a task and returns a "looping task"....? I don't know how to frame it
@@ -436,63 +696,97 @@ class Game(ShowBase):
         # playing yet, ignore this logic.
         if self.player is not None:
             if self.player.health > 0:
-                self.player.update(self.keyMap, dt)
+                profiler = self.profiler
 
-                # Wait to spawn an enemy...
-                self.spawnTimer -= dt
-                if self.spawnTimer <= 0:
-                    # Spawn one!
-                    self.spawnTimer = self.spawnInterval
-                    self.spawnEnemy()
+                profiler.begin("Grid")
+                self.updateEntityGrid()
+                profiler.end("Grid")
 
-                # Update all enemies and traps
-                [enemy.update(self.player, dt) for enemy in self.enemies]
-                [trap.update(self.player, dt) for trap in self.trapEnemies]
-
-                # Find the enemies that have just
-                # died, if any
-                newlyDeadEnemies = [enemy for enemy in self.enemies if enemy.health <= 0]
-                # And re-build the enemy-list to exclude
-                # those that have just died.
-                self.enemies = [enemy for enemy in self.enemies if enemy.health > 0]
+                profiler.begin("Player")
+                self.player.update(self.keyMap, dt)
+                profiler.end("Player")
+
+                if self.inputRecorder is not None and self.inputRecorder.isRecording():
+                    self.inputRecorder.recordFrame(globalClock.getFrameTime(), dt,
+                                                   self.keyMap, self.player.aimPos)
+
+                # Run any timers that are due: calling for
+                # spawns, enemy attacks, clearing away dead
+                # enemies, and so on
+                profiler.begin("Timers")
+                self.scheduler.update(globalClock.getFrameTime())
+                profiler.end("Timers")
+
+                # Build as many of the spawns called for
+                # as this frame's budget allows
+                profiler.begin("Spawn")
+                self.waveDirector.update()
+                profiler.end("Spawn")
+
+                # Find the enemies' ways around any stationary traps
+                profiler.begin("FlowField")
+                self.flowField.update(self.player.actor.getPos(), self.trapEnemies)
+                profiler.end("FlowField")
 
+                # Update all enemies and traps
+                profiler.begin("AI")
+                if self.useBatchedHorde:
+                    self.horde.update(self.player, dt)
+                else:
+                    for enemy in self.enemies:
+                        enemy.updateLogic(self.player, dt)
+                    self.separateEnemies()
+                profiler.end("AI")
+
+                profiler.begin("Animation")
+                for enemy in self.enemies:
+                    enemy.updateAnimation()
+                profiler.end("Animation")
+
+                profiler.begin("Traps")
+                self.trapLanes.update(self.player, dt)
+                for trap in self.trapEnemies:
+                    trap.updateAnimation()
+                profiler.end("Traps")
+
+                profiler.begin("DeadSweep")
+
+                # Move the enemies that have just died (if any) from
+                # our living enemies to our "dead enemies".
                 # Newly-dead enemies should have no collider,
                 # and should play their "die" animation.
                 # In addition, increase the player's score.
+                newlyDeadEnemies = self.newlyDeadEnemies
                 for enemy in newlyDeadEnemies:
-                    enemy.collider.removeNode()
-                    enemy.actor.play("die")
+                    self.enemies.remove(enemy)
+                    self.deadEnemies.add(enemy)
+                    if enemy.hordeIndex is not None:
+                        self.horde.remove(enemy)
+                    enemy.cancelAttack()
+                    enemy.collider.stash()
+                    enemy.animation.play("die")
                     self.player.score += enemy.scoreValue
+                    # Once the "die" animation is done,
+                    # we can clear the enemy away.
+                    self.scheduler.schedule(enemy.animation.getDuration("die"),
+                                            self.removeDeadEnemy, enemy)
                 if len(newlyDeadEnemies) > 0:
                     self.player.updateScore()
+                    newlyDeadEnemies.clear()
+                profiler.end("DeadSweep")
+
+                profiler.begin("Animation")
+                self.updateAnimationBudget()
+                profiler.end("Animation")
 
-                self.deadEnemies += newlyDeadEnemies
-
-                # Check our "dead enemies" to see
-                # whether they're still animating their
-                # "die" animation. In not, clean them up,
-                # and drop them from the "dead enemies" list.
-                enemiesAnimatingDeaths = []
-                for enemy in self.deadEnemies:
-                    deathAnimControl = enemy.actor.getAnimControl("die")
-                    if deathAnimControl is None or not deathAnimControl.isPlaying():
-                        enemy.cleanup()
-                    else:
-                        enemiesAnimatingDeaths.append(enemy)
-                self.deadEnemies = enemiesAnimatingDeaths
-
-                # Make the game more difficult over time!
-                self.difficultyTimer -= dt
-                if self.difficultyTimer <= 0:
-                    self.difficultyTimer = self.difficultyInterval
-                    if self.maxEnemies < self.maximumMaxEnemies:
-                        self.maxEnemies += 1
-                    if self.spawnInterval > self.minimumSpawnInterval:
-                        self.spawnInterval -= 0.1
 
             else:
                 # If the game-over screen isn't showing...
                 if self.gameOverScreen.isHidden():
+                    # The game is over, so any recording of it is complete
+                    if self.inputRecorder is not None:
+                        self.inputRecorder.save()
+
                     # Show the game-over screen, and set the
                     # text of the "finalScoreLabel" object to
                     # reflect the player's score.
@@ -504,33 +798,236 @@ class Game(ShowBase):
         return task.cont
 
 
+    def beginCollisionProfile(self, task):
+        self.profiler.begin("Collision")
+        return task.cont
+
+
+    def endCollisionProfile(self, task):
+        self.profiler.end("Collision")
+        return task.cont
+
+    def dispatchCollisions(self, task):
+        self.profiler.begin("CollisionDispatch")
+        self.collisionDispatch.dispatch()
+        self.profiler.end("CollisionDispatch")
+        return task.cont
+
+    def endProfileFrame(self, task):
+        dispatch = self.collisionDispatch
+        counters = {
+            "contacts": dispatch.numContacts,
+            "newContacts": dispatch.numNewContacts,
+            "dispatchUsPerContact": 0,
+            "enemies": len(self.enemies),
+            "deadEnemies": len(self.deadEnemies),
+            "traps": len(self.trapEnemies),
+            "movingTraps": self.trapLanes.numMovingTraps,
+            "animFullRate": self.animationBudget.numFullRate,
+            "animReducedRate": self.animationBudget.numReducedRate,
+            "animFrozen": self.animationBudget.numFrozen,
+            "animPosed": self.animationBudget.numPosed,
+            "beamHitLightToggles": 0,
+            "sceneLightChangesPerSecond": 0,
+            "shadersPerSecond": 0,
+            "spawnQueueDepth": self.waveDirector.queueDepth,
+            "spawned": self.waveDirector.numSpawned,
+            "spawnLatencyMs": "{0:.1f}".format(self.waveDirector.maxLatency * 1000.0),
+            "flowRebuilt": int(self.flowField.rebuilt),
+            "flowCellsUpdated": self.flowField.numCellsUpdated,
+            "enemyOverlaps": self.crowdSeparation.numOverlaps,
+            "restartMs": 0
+        }
+        if dispatch.numContacts > 0:
+            counters["dispatchUsPerContact"] = "{0:.3f}".format(
+                dispatch.dispatchTime * 1000000.0 / dispatch.numContacts)
+        if self.player is not None:
+            counters["beamHitLightToggles"] = self.player.numBeamHitLightToggles
+        gsg = None
+        if self.win is not None:
+            gsg = self.win.getGsg()
+        monitor = self.renderChangeMonitor
+        monitor.update(globalClock.getFrameTime(), gsg)
+        counters["sceneLightChangesPerSecond"] = monitor.lightChangesPerSecond
+        counters["shadersPerSecond"] = monitor.shadersPerSecond
+        # This is the end of the first frame of a new game
+        if self.restartStartTime is not None:
+            self.restartTime = time.perf_counter() - self.restartStartTime
+            self.restartStartTime = None
+            counters["restartMs"] = "{0:.2f}".format(self.restartTime * 1000.0)
+        if self.profiler.isRecording():
+            counters.update(getStateCacheSizes())
+        self.profiler.endFrame(globalClock.getFrameTime(), globalClock.getDt(), counters)
+        return task.cont
+
+
+    # Writes the time taken by each phase of each frame to the given
+    # CSV-file, until "stopProfileRecording" is called
+    def startProfileRecording(self, fileName):
+        self.profiler.startRecording(fileName, ["enemies", "deadEnemies", "traps", "movingTraps",
+                                                "animFullRate", "animReducedRate",
+                                                "animFrozen", "animPosed",
+                                                "beamHitLightToggles", "sceneLightChangesPerSecond",
+                                                "shadersPerSecond",
+                                                "contacts", "newContacts", "dispatchUsPerContact",
+                                                "spawnQueueDepth", "spawned", "spawnLatencyMs",
+                                                "flowRebuilt", "flowCellsUpdated", "enemyOverlaps", "restartMs",
+                                                "renderStates", "unusedRenderStates",
+                                                "transformStates", "unusedTransformStates"])
+
+
+    def stopProfileRecording(self):
+        self.profiler.stopRecording()
+
+
+    # Decides which enemies (living or dying) and
+    # traps to animate at full rate this frame
+    def updateAnimationBudget(self):
+        if self.useBatchedHorde:
+            enemies = self.horde.enemies
+            positions = self.horde.positions[:len(self.horde)]
+        else:
+            enemies = self.enemies
+            positions = np.array([tuple(enemy.actor.getPos()) for enemy in enemies]).reshape(-1, 3)
+
+        if len(self.deadEnemies) > 0:
+            deadPositions = np.array([tuple(enemy.actor.getPos()) for enemy in self.deadEnemies])
+            positions = np.concatenate((positions, deadPositions))
+
+        self.animationBudget.update(self.player.actor.getPos(), enemies, self.deadEnemies,
+                                    positions, self.trapEnemies)
+
+
+    # Pushes apart overlapping enemies, when they're
+    # updated one by one rather than as a horde
+    def separateEnemies(self):
+        if len(self.enemies) < 2:
+            return
+        positions = np.array([tuple(enemy.actor.getPos()) for enemy in self.enemies])
+        self.crowdSeparation.apply(positions)
+        for enemy, (x, y, z) in zip(self.enemies, positions.tolist()):
+            enemy.actor.setPos(x, y, z)
+
+
+    # Re-fills our spatial grid with the current
+    # positions of the player, traps and enemies
+    def updateEntityGrid(self):
+        grid = self.entityGrid
+        grid.clear()
+
+        pos = self.player.actor.getPos()
+        grid.insert(self.player, pos.x, pos.y, self.player.colliderRadius, self.player.collideMaskBits)
+
+        for trap in self.trapEnemies:
+            pos = trap.actor.getPos()
+            grid.insert(trap, pos.x, pos.y, trap.colliderRadius, trap.collideMaskBits)
+
+        if self.useBatchedHorde:
+            # The horde already has its positions to hand
+            enemyPositions = self.horde.positions[:len(self.horde)].tolist()
+            for enemy, (x, y, z) in zip(self.horde.enemies, enemyPositions):
+                grid.insert(enemy, x, y, enemy.colliderRadius, enemy.collideMaskBits)
+        else:
+            for enemy in self.enemies:
+                pos = enemy.actor.getPos()
+                grid.insert(enemy, pos.x, pos.y, enemy.colliderRadius, enemy.collideMaskBits)
+
+
     def cleanup(self):
         # Call our various cleanup methods,
         # empty the various lists,
         # and make the player "None" again.
 
         for enemy in self.enemies:
-            enemy.cleanup()
-        self.enemies = []
+            if enemy.hordeIndex is not None:
+                self.horde.remove(enemy)
+            self.enemyPools[enemy.colliderName].release(enemy)
+        self.enemies.clear()
 
         for enemy in self.deadEnemies:
-            enemy.cleanup()
-        self.deadEnemies = []
+            self.enemyPools[enemy.colliderName].release(enemy)
+        self.deadEnemies.clear()
+
+        self.newlyDeadEnemies.clear()
 
         for trap in self.trapEnemies:
-            trap.cleanup()
+            if self.warmRestart:
+                self.trapPool.release(trap)
+            else:
+                trap.cleanup()
         self.trapEnemies = []
+        self.trapLanes.clear()
+        self.flowField.clear()
 
         if self.player is not None:
-            self.player.cleanup()
+            if self.warmRestart:
+                self.player.deactivate()
+                self.sparePlayer = self.player
+            else:
+                self.player.cleanup()
             self.player = None
 
+        self.waveDirector.stop()
+        self.scheduler.clear()
+        self.collisionDispatch.clear()
 
-    def quit(self):
-        # Clean up, then exit
+
+    # Cleans up everything--including the things that are kept
+    # from game to game--and finishes off any profile- or
+    # input-recording.
+    # This is our "exitFunc", and so is called by "userExit".
+    def shutDownGame(self):
+        if self.isGameShutDown:
+            return
+        self.isGameShutDown = True
 
         self.cleanup()
+        for pool in self.enemyPools.values():
+            pool.cleanup()
+        self.trapPool.cleanup()
+        if self.sparePlayer is not None:
+            self.sparePlayer.cleanup()
+            self.sparePlayer = None
+        self.playerPrefab.cleanup()
+        self.profiler.stopRecording()
+        if self.inputRecorder is not None:
+            self.inputRecorder.save()
+
 
+    def quit(self):
+        # Exit, shutting everything down along the way
         base.userExit()
-game = Game()
-game.run()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Play the game")
+    parser.add_argument("--profile-csv", metavar="FILE",
+                        help="write the time taken by each phase of each frame to this CSV-file")
+    parser.add_argument("--pstats", action="store_true",
+                        help="connect to a running PStats server")
+    parser.add_argument("--record", metavar="FILE",
+                        help="record each game played to this file")
+    parser.add_argument("--replay", metavar="FILE",
+                        help="play back a recorded game, then exit")
+    parser.add_argument("--headless", action="store_true",
+                        help="open no window (useful with --replay)")
+    parser.add_argument("--waves", metavar="FILE",
+                        help="read the waves of enemies from this file, rather than waves.json")
+    args = parser.parse_args()
+
+    game = Game(headless=args.headless, wavesFile=args.waves)
+    if args.pstats:
+        PStatClient.connect()
+    if args.profile_csv is not None:
+        game.startProfileRecording(args.profile_csv)
+    if args.record is not None:
+        game.startInputRecording(args.record)
+
+    if args.replay is not None:
+        game.playReplay(args.replay)
+        print("Replay finished; final score:", game.player.score)
+        game.quit()
+    else:
+        game.run()
@@ -8,6 +8,7 @@ setup(
             #  * All of our image-files (.png)
             #  * All of our sound- and music-files (.ogg)
             #  * All of our text-files (.txt)
+            #  * Our waves of enemies (waves.json)
             #  * All of our 3D models (.egg)
             #    - These will be automatically converted
             #      to .bam files
@@ -16,6 +17,7 @@ setup(
                 "**/*.png",
                 "**/*.ogg",
                 "**/*.txt",
+                "waves.json",
                 "**/*.egg",
                 "Fonts/*"
             ],